@@ -0,0 +1,114 @@
+"""Measure how long the run cache takes to do its work, and how much memory it keeps.
+
+This builds a synthetic archive of runs in a temporary folder, out of
+the test run files, so it can be run anywhere:
+
+    python benchmark.py ingest --runs 3000 --workers 4
+    python benchmark.py memory --runs 500
+"""
+
+import argparse
+import asyncio
+import tempfile
+import pathlib
+import random
+import shutil
+import time
+import tracemalloc
+import json
+import os
+
+import src.config
+
+# same as main.py, this needs to happen before anything else is imported
+src.config.load()
+
+from src.config import config
+from src import server # this needs to be imported before the runs, to avoid circular imports
+from src import runs
+from src import events
+
+base = pathlib.Path.cwd() / "test" / "static"
+
+_chars = ("IRONCLAD", "THE_SILENT", "DEFECT", "WATCHER")
+
+def make_corpus(count: int):
+    """Write the runs to data/runs/0, in the current folder."""
+    with (base / "run_matched.json").open() as f:
+        template = json.load(f)
+    folder = os.path.join("data", "runs", "0")
+    os.makedirs(folder)
+    rng = random.Random(0) # always the same corpus
+    for i in range(count):
+        data = dict(template)
+        data["timestamp"] = timestamp = 1_600_000_000 + i * 3600
+        data["character_chosen"] = _chars[i % 4]
+        data["victory"] = rng.random() < 0.6
+        with open(os.path.join(folder, f"{timestamp}.run"), "w") as f:
+            json.dump(data, f)
+
+def time_ingest(workers: int) -> float:
+    runs._reset_cache()
+    config.server.runs.ingest_workers = workers
+    start = time.perf_counter()
+    runs._update_cache()
+    return time.perf_counter() - start
+
+def ingest(args: argparse.Namespace):
+    print(f"Ingesting {args.runs} runs, best of {args.repeat}")
+    time_ingest(0) # warm up the imports and the filesystem cache
+    serial = min(time_ingest(0) for _ in range(args.repeat))
+    parallel = min(time_ingest(args.workers) for _ in range(args.repeat))
+    print(f"  serial:                 {serial:.3f}s")
+    print(f"  parallel ({args.workers:>2} processes): {parallel:.3f}s ({serial / parallel:.2f}x)")
+
+def memory(args: argparse.Namespace):
+    print(f"Building the path, relics and deck of {args.runs} runs")
+    runs._reset_cache()
+    config.server.runs.ingest_workers = 0
+    loaded = runs._update_cache()
+    for parser in loaded:
+        parser._data # only count what we build on top of the raw run file
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for parser in loaded:
+        for node in parser.path:
+            node.description()
+        for relic in parser.relics:
+            relic.description()
+        for card in parser.get_cards():
+            card.name
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    nodes = sum(len(parser.path) for parser in loaded)
+    print(f"  retained:  {(after - before) / 1024:.0f} KiB")
+    print(f"  per run:   {(after - before) / len(loaded) / 1024:.1f} KiB")
+    print(f"  per node:  {(after - before) / nodes:.0f} bytes")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("benchmark", choices=("ingest", "memory"))
+    parser.add_argument("--runs", type=int, default=3000, help="How many runs to generate.")
+    parser.add_argument("--workers", type=int, default=4, help="How many processes to use in parallel.")
+    parser.add_argument("--repeat", type=int, default=3, help="How many times to run each measurement.")
+    args, _ = parser.parse_known_args()
+
+    if args.benchmark == "memory": # descriptions need the game data
+        asyncio.run(events.invoke("setup_init"))
+
+    orig = os.getcwd()
+    tmp = tempfile.mkdtemp()
+    os.chdir(tmp)
+    try:
+        make_corpus(args.runs)
+        match args.benchmark:
+            case "ingest":
+                ingest(args)
+            case "memory":
+                memory(args)
+    finally:
+        os.chdir(orig)
+        shutil.rmtree(tmp)
+
+if __name__ == "__main__":
+    main()
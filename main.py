@@ -18,7 +18,7 @@ from src.webpage import webpage
 from src.logger import logger
 from src.config import config, __version__
 
-from src import server, events
+from src import server, events, runs, analytics
 
 if config.server.debug:
     logging.basicConfig(
@@ -98,6 +98,7 @@ async def main():
     if config.youtube.archive_id not in ("<not set>", ""):
         tasks.add(loop.create_task(server.Archive_startup()))
 
+    tasks.add(loop.create_task(runs.Runs_startup()))
     tasks.add(loop.create_task(web._run_app(webpage)))
 
     try:
@@ -270,7 +270,7 @@ class Bot(_ConfigMapping):
         self.spire_mods = spire_mods
 
 class Server(_ConfigMapping):
-    def __init__(self, debug: bool, secret: str, url: str, host: str, port: int, json_indent: int, business_email: str, websocket_client: dict, webhook: dict, steam_id: str):
+    def __init__(self, debug: bool, secret: str, url: str, host: str, port: int, json_indent: int, business_email: str, websocket_client: dict, webhook: dict, steam_id: str, runs: dict):
         """Hold server-related configuration.
 
         :param debug: Whether we are in debug mode.
@@ -293,6 +293,8 @@ class Server(_ConfigMapping):
         :type webhook: dict
         :param steam_id: The Steam ID of the streamer.
         :type steam_id: str
+        :param runs: How the run files are kept in memory.
+        :type runs: dict
         """
 
         self.debug = debug
@@ -310,6 +312,7 @@ class Server(_ConfigMapping):
 
         self.websocket_client = _WebsocketClient(**websocket_client)
         self.webhook = _Webhook(**webhook)
+        self.runs = _Runs(**runs)
 
 class _WebsocketClient(_ConfigMapping):
     def __init__(self, id: str, secret: str):
@@ -334,6 +337,22 @@ class _Webhook(_ConfigMapping):
 
         self.secret = secret
 
+class _Runs(_ConfigMapping):
+    def __init__(self, memory_budget: int, ingest_workers: int, refresh_interval: int):
+        """Hold run file caching information.
+
+        :param memory_budget: How many megabytes of run files stay loaded.
+        :type memory_budget: int
+        :param ingest_workers: How many processes read run files in bulk.
+        :type ingest_workers: int
+        :param refresh_interval: How often to check for new run files, in seconds.
+        :type refresh_interval: int
+        """
+
+        self.memory_budget = memory_budget
+        self.ingest_workers = ingest_workers
+        self.refresh_interval = refresh_interval
+
 class Spotify(_ConfigMapping):
     def __init__(self, enabled: bool, id: str, secret: str, code: str):
         """Hold information for the Spotify "Now Playing" feature.
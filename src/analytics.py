@@ -0,0 +1,312 @@
+"""Aggregates of per-floor values across every run of a profile.
+
+Each value is packed into a padded 2-D array, with a row for each run, in
+the order of the run index, and a column for each floor (floor 0 is Neow).
+Floors that a run never reached are NaN. The aggregates are then computed
+over whole columns at once, which keeps them fast with thousands of runs.
+
+Reading the values needs the full run file, so a run is only read the first
+time its profile is asked about, and never again after that. This happens in
+a thread, into a new table, so that the server keeps answering meanwhile."""
+
+from __future__ import annotations
+
+from array import array
+from collections import defaultdict
+from typing import Iterable, TYPE_CHECKING
+import warnings
+import asyncio
+import json
+import math
+
+from aiohttp.web import Request, Response, HTTPForbidden, HTTPNotFound, HTTPNotImplemented
+
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    np = None
+
+from src.cache.cache_helpers import RunIndex, find_char_code
+from src.gamedata import FileParser, draw_graph
+from src.runs import _get_run_index, _falsey
+from src.sts_profile import parse_profile_key
+from src.webpage import router
+from src.logger import logger
+
+if TYPE_CHECKING:
+    from src.runs import RunParser, Run2Parser
+
+__all__ = ["floor_summary", "act_time_summary"]
+
+# the values which can be aggregated, as the graphs of a single run call them
+_VARIABLES = ("current_hp", "max_hp", "gold", "floor_time", "card_count", "relic_count", "potion_count")
+# Spire 1 runs store these directly, one for every floor
+_COUNTS = {"current_hp": "current_hp_counts", "max_hp": "max_hp_counts", "gold": "gold_counts"}
+
+_PERCENTILES = (25, 50, 75)
+
+class _FloorTable:
+    """The per-floor values of every run of a profile, and the arrays built from them.
+
+    Handlers may be reading a table at any time, so a table is never changed
+    once it's in use; `updated` returns a new one instead."""
+
+    def __init__(self):
+        self.rows: dict[str, dict[str, array]] = {} # run name: {variable: values by floor}
+        self.index: RunIndex = RunIndex()
+        self.graphs: dict[tuple, str | bytes] = {}
+        self._arrays: dict[str, np.ndarray] = {}
+
+    def updated(self, index: RunIndex) -> _FloorTable:
+        """Return a table of the runs of the index, only reading the runs which are new since this one."""
+        new = _FloorTable()
+        new.rows = dict(self.rows)
+        for run in index.runs:
+            if run.name not in new.rows:
+                new.rows[run.name] = _floor_values(run)
+        new.index = index
+        count = len(self.index)
+        if self.index.runs == index.runs[:count]: # the new runs all came after these, so keep the rows we have
+            for name, found in self._arrays.items():
+                new._arrays[name] = _stack(found, _pack([new.rows[run.name][name] for run in index.runs[count:]]))
+        for name in _VARIABLES + ("act",): # build the rest now, rather than in a handler
+            new.array(name)
+        return new
+
+    def array(self, name: str) -> np.ndarray:
+        """Return the values of every run, as a (runs, floors) array padded with NaN."""
+        found = self._arrays.get(name)
+        if found is None:
+            found = self._arrays[name] = _pack([self.rows[run.name][name] for run in self.index.runs])
+        return found
+
+def _pack(rows: list[array]) -> np.ndarray:
+    """Return the rows as a single array, padded with NaN to the longest one."""
+    width = max((len(x) for x in rows), default=0)
+    found = np.full((len(rows), width), np.nan)
+    for i, row in enumerate(rows):
+        if row:
+            found[i, :len(row)] = np.frombuffer(row, dtype=np.float64)
+    return found
+
+def _stack(top: np.ndarray, bottom: np.ndarray) -> np.ndarray:
+    """Return the rows of both arrays, padded with NaN to the widest one."""
+    if not len(bottom):
+        return top
+    found = np.full((len(top) + len(bottom), max(top.shape[1], bottom.shape[1])), np.nan)
+    found[:len(top), :top.shape[1]] = top
+    found[len(top):, :bottom.shape[1]] = bottom
+    return found
+
+_tables: dict[int, _FloorTable] = {}
+_locks: defaultdict[int, asyncio.Lock] = defaultdict(asyncio.Lock) # so a profile is only read once at a time
+
+def _floor_values(run: RunParser | Run2Parser) -> dict[str, array]:
+    """Read every value of the run by floor, along with the act each floor is in."""
+    values = {name: array("d") for name in _VARIABLES + ("act",)}
+
+    def put(name: str, floor: int, value):
+        if not isinstance(value, (int, float)):
+            return
+        row = values[name]
+        while len(row) <= floor:
+            row.append(math.nan)
+        row[floor] = value
+
+    from_path = _VARIABLES
+    try:
+        if run.game_version == 1:
+            from_path = tuple(x for x in _VARIABLES if x not in _COUNTS)
+            for name, attr in _COUNTS.items():
+                for floor, value in enumerate(getattr(run, attr)):
+                    put(name, floor, value)
+
+        # this is where the graphs of a single run take their values from, too
+        neow = getattr(run, "neow_bonus", None)
+        for name in from_path:
+            put(name, 0, getattr(neow, name, None))
+        act = 1
+        put("act", 0, act)
+        for node in run.path:
+            put("act", node.floor, act)
+            for name in from_path:
+                value = getattr(node, name, None)
+                if name == "floor_time" and value is not None and value < 0:
+                    continue # the last floor has no exit time, so it can't be known
+                put(name, node.floor, value)
+            if node.end_of_act:
+                act += 1
+    except (KeyError, IndexError, TypeError, ValueError):
+        logger.warning(f"Could not read the floors of run {run.name}, some of them will be missing")
+
+    return values
+
+def _get_table(profile: int) -> _FloorTable:
+    """Return the table of the profile, as it was last loaded."""
+    if np is None:
+        raise HTTPNotImplemented(reason="numpy is not installed, run analytics cannot be used")
+    table = _tables.get(profile)
+    if table is None:
+        table = _FloorTable()
+    return table
+
+async def _load_table(profile: int):
+    """Bring the table of the profile up to date with its runs, reading the new ones in a thread."""
+    if np is None:
+        raise HTTPNotImplemented(reason="numpy is not installed, run analytics cannot be used")
+    async with _locks[profile]:
+        table = _get_table(profile)
+        index = _get_run_index(profile)
+        if index is not None and index is not table.index:
+            _tables[profile] = await asyncio.to_thread(table.updated, index)
+
+def _to_list(values: np.ndarray) -> list[float | None]:
+    return [None if math.isnan(x) else round(x, 2) for x in values.tolist()]
+
+def _groups(table: _FloorTable, split: bool, characters: Iterable[str]) -> dict[str, np.ndarray]:
+    """Return which rows go in each group, as boolean masks."""
+    columns = table.index.columns
+    rows = np.ones(len(table.index), dtype=bool)
+    characters = list(characters)
+    if characters: # a name no run was played as matches nothing
+        codes = [code for code in map(find_char_code, characters) if code is not None]
+        rows &= np.isin(np.asarray(columns.character), codes)
+    groups = {"all": rows}
+    if split:
+        won = np.asarray(columns.won).astype(bool)
+        groups["wins"] = rows & won
+        groups["losses"] = rows & ~won
+    return groups
+
+def _summarize(values: np.ndarray, percentiles: tuple[int, ...], key: str, first: int) -> dict:
+    """Aggregate the columns of values, leaving out the ones no row has a value for."""
+    counts = np.count_nonzero(~np.isnan(values), axis=0)
+    reached = np.flatnonzero(counts)
+    width = int(reached[-1]) + 1 if len(reached) else 0
+    values = values[:, :width]
+    res = {key: list(range(first, first + width)), "runs": counts[:width].tolist(), "mean": [], "percentiles": {}}
+    if not width:
+        return res
+
+    with warnings.catch_warnings(): # the columns some rows didn't reach
+        warnings.simplefilter("ignore", RuntimeWarning)
+        res["mean"] = _to_list(np.nanmean(values, axis=0))
+        found = np.nanpercentile(values, percentiles, axis=0)
+    for pct, row in zip(percentiles, found):
+        res["percentiles"][str(pct)] = _to_list(row)
+    return res
+
+def floor_summary(profile: int, name: str, *, split: bool = True, characters: Iterable[str] = (), percentiles: tuple[int, ...] = _PERCENTILES) -> dict:
+    """Return the mean and percentiles of a value at every floor, for all runs, wins and losses."""
+    if name not in _VARIABLES:
+        raise ValueError(f"Cannot aggregate {name!r}")
+    table = _get_table(profile)
+    values = table.array(name)
+    return {
+        "label": FileParser._variables_map.get(name, name),
+        "groups": {group: _summarize(values[rows], percentiles, "floors", 0) for group, rows in _groups(table, split, characters).items()},
+    }
+
+def act_time_summary(profile: int, *, split: bool = True, characters: Iterable[str] = (), percentiles: tuple[int, ...] = _PERCENTILES) -> dict:
+    """Return the mean and percentiles of the time spent in each act, for all runs, wins and losses."""
+    table = _get_table(profile)
+    times = table.array("floor_time")
+    acts = table.array("act")
+    width = min(times.shape[1], acts.shape[1])
+    times, acts = times[:, :width], acts[:, :width]
+
+    count = int(np.nanmax(acts)) if acts.size and not np.isnan(acts).all() else 0
+    per_act = np.full((len(times), count), np.nan)
+    known = ~np.isnan(times)
+    for act in range(1, count + 1):
+        floors = (acts == act) & known
+        total = np.where(floors, times, 0).sum(axis=1)
+        per_act[:, act - 1] = np.where(floors.any(axis=1), total, np.nan)
+
+    return {
+        "label": "Time spent in the act (seconds)",
+        "groups": {group: _summarize(per_act[rows], percentiles, "acts", 1) for group, rows in _groups(table, split, characters).items()},
+    }
+
+def _profile_from_request(req: Request) -> int:
+    try:
+        return parse_profile_key(req.match_info["profile"])
+    except ValueError:
+        raise HTTPNotFound()
+
+def _params_from_request(req: Request) -> dict:
+    try:
+        percentiles = tuple(int(x) for x in req.query.get("percentiles", "25,50,75").split(","))
+    except ValueError:
+        raise HTTPForbidden(reason="percentiles must be a comma-separated list of integers")
+    if not all(0 <= x <= 100 for x in percentiles):
+        raise HTTPForbidden(reason="percentiles must be between 0 and 100")
+    return {
+        "split": _falsey(req.query.get("split")),
+        "characters": [x.title() for x in req.query.getall("character", ())],
+        "percentiles": percentiles,
+    }
+
+def _views_from_request(req: Request) -> list[str]:
+    if "view" not in req.query:
+        raise HTTPForbidden(reason="Needs 'view' param")
+    views = req.query["view"].split(",")
+    for name in views:
+        if name not in _VARIABLES:
+            raise HTTPForbidden(reason=f"Cannot aggregate {name!r}. Use one of {', '.join(_VARIABLES)}")
+    return views
+
+@router.get("/analytics/{profile}/floors")
+async def floors_json(req: Request) -> Response:
+    profile = _profile_from_request(req)
+    views = _views_from_request(req)
+    params = _params_from_request(req)
+    await _load_table(profile)
+    variables = {name: floor_summary(profile, name, **params) for name in views}
+    data = {"profile": profile, "runs": len(_get_table(profile).index), "variables": variables}
+    return Response(text=json.dumps(data), content_type="application/json")
+
+@router.get("/analytics/{profile}/acts")
+async def acts_json(req: Request) -> Response:
+    profile = _profile_from_request(req)
+    params = _params_from_request(req)
+    await _load_table(profile)
+    data = {"profile": profile, "runs": len(_get_table(profile).index), "time": act_time_summary(profile, **params)}
+    return Response(text=json.dumps(data), content_type="application/json")
+
+@router.get("/analytics/{profile}/graph/{type}")
+async def floors_graph(req: Request) -> Response:
+    """Draw the average of values by floor, with one line for each group."""
+    profile = _profile_from_request(req)
+    views = _views_from_request(req)
+    params = _params_from_request(req)
+    if req.query.get("type") not in FileParser._graph_types:
+        raise HTTPNotImplemented(reason=f"Display type {req.query.get('type')} is undefined")
+    await _load_table(profile)
+
+    graph_type = req.match_info["type"]
+    display_type = req.query["type"]
+    label = req.query.get("label")
+    title = req.query.get("title")
+    table = _get_table(profile)
+    to_cache = (graph_type, display_type, tuple(views), label, title, params["split"], tuple(params["characters"]))
+    if to_cache not in table.graphs:
+        lines = {}
+        for name in views:
+            summary = floor_summary(profile, name, **params)
+            for group, values in summary["groups"].items():
+                if len(summary["groups"]) > 1:
+                    key = f"{summary['label']} ({group})"
+                else:
+                    key = summary["label"]
+                lines[key] = (values["floors"], [math.nan if x is None else x for x in values["mean"]])
+        if label is None and len(views) == 1:
+            label = FileParser._variables_map.get(views[0], views[0])
+        try:
+            table.graphs[to_cache] = draw_graph(graph_type, display_type, lines, (), label, title)
+        except ValueError as e:
+            raise HTTPForbidden(reason=e.args[0])
+        except TypeError:
+            raise HTTPNotFound()
+
+    return Response(body=table.graphs[to_cache], content_type=FileParser._graph_types[display_type])
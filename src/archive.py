@@ -13,7 +13,7 @@ import re
 from src.config import config
 from src.events import add_listener
 from src.utils import getfile
-from src.runs import get_parser, RunParser, _cache
+from src.runs import get_parser, get_all_runs, RunParser
 
 _date_re = re.compile(r"(\d\d\d\d\-\d\d\-\d\d)")
 _chapter_re = re.compile(r"^(\d\d?):(\d\d):(\d\d) Slay the Spire( 2)? - (\w+)( \(.*\))?$")
@@ -148,7 +148,7 @@ class _ArchiveHandler:
             return
         res: dict[VOD, list[RunParser]] = {}
         # map all the vods to the runs that match
-        for run in _cache.values():
+        for run in get_all_runs():
             if (d := run.timestamp.date()) in self.unparsed:
                 for vod in self.unparsed[d]:
                     if vod not in res:
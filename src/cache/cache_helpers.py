@@ -1,16 +1,47 @@
 from __future__ import annotations
 
 from collections import defaultdict
+from array import array
 from enum import Enum
 
 import datetime # TODO: UTC?
+import bisect
+import copy
+import json
 import math
+import sys
 
-from typing import TYPE_CHECKING
+from typing import Any, Iterable, Iterator, TYPE_CHECKING
+
+try:
+    import numpy as np
+except ModuleNotFoundError:
+    np = None
 
 if TYPE_CHECKING:
     from src.runs import RunParser, Run2Parser
 
+def read_run_header(path: str, keys: tuple[str, ...]) -> dict[str, Any]:
+    """Decode a run file, and only return the given keys.
+
+    This runs in worker processes, so it must not need anything else to be loaded."""
+    with open(path, "rb") as f:
+        data = json.loads(f.read())
+    return {key: data[key] for key in keys if key in data}
+
+def make_term(kind: str, value: Any) -> str:
+    """Return the key the inverted indexes use for a value, such as 'relic:Vajra'.
+
+    Kinds are 'relic', 'card' (picked), 'neow', 'seed', 'killed_by',
+    'character', 'profile' and 'won'."""
+    value = str(value)
+    if kind == "killed_by":
+        value = value.lower()
+    elif kind == "seed":
+        value = value.upper()
+    # the same few hundred terms appear in every run, so only keep one copy of each
+    return sys.intern(f"{kind}:{value}")
+
 class Character(Enum):
     IRONCLAD = "Ironclad"
     SILENT = "Silent"
@@ -19,6 +50,25 @@ class Character(Enum):
     NECROBINDER = "Necrobinder"
     REGENT = "Regent"
 
+# characters are stored as small integers in the run columns
+_char_names: list[str] = [char.value for char in Character]
+_char_codes: dict[str, int] = {name: i for i, name in enumerate(_char_names)}
+
+def char_code(name: str) -> int:
+    """Return the code for a character name, giving modded characters one as needed."""
+    code = _char_codes.get(name)
+    if code is None:
+        code = _char_codes[name] = len(_char_names)
+        _char_names.append(name)
+    return code
+
+def find_char_code(name: str) -> int | None:
+    """Return the code for a character name, or None if no run was played as them."""
+    return _char_codes.get(name)
+
+def char_name(code: int) -> str:
+    return _char_names[code]
+
 class CharDict(defaultdict):
     def __missing__(self, key):
         return self[Character(key)]
@@ -82,13 +132,29 @@ class RunStats:
         self._increment_stat(self.all_losses, char)
         self._increment_stat(self.year_losses[date.year], char)
 
+    def add_results(self, char: str, year: int, *, wins: int, losses: int):
+        """Add many wins and losses of a character at once, all from the same year."""
+        character = Character(char)
+        for count, total, by_year in ((wins, self.all_wins, self.year_wins), (losses, self.all_losses, self.year_losses)):
+            if not count:
+                continue
+            if year not in by_year:
+                by_year[year] = Statistic(set_default=True)
+            for stat in (total, by_year[year]):
+                stat.character_counts[character] += count
+                stat.all_character_count += count
+
     def check_pb(self, run: RunParser):
+        self.add_pb(run, run.rotating_streak.streak, run.character_streak.streak)
+
+    def add_pb(self, run: RunParser, rotating: int, character_streak: int):
+        """Keep the streaks the run ended on, if they are the best so far."""
         if not run.modded:
-            if self.pb.all_character_count < run.rotating_streak.streak:
-                self.pb.all_character_count = run.rotating_streak.streak
+            if self.pb.all_character_count < rotating:
+                self.pb.all_character_count = rotating
             character = Character(run.character)
-            if self.pb.character_counts[character] < run.character_streak.streak:
-                self.pb.character_counts[character] = run.character_streak.streak
+            if self.pb.character_counts[character] < character_streak:
+                self.pb.character_counts[character] = character_streak
 
     def _increment_stat(self, stat: Statistic, char: str):
         character = Character(char)
@@ -98,6 +164,10 @@ class RunStats:
     def clear(self):
         self.__init__()
 
+    def copy(self) -> RunStats:
+        """Return a copy, which can count more runs without changing this one."""
+        return copy.deepcopy(self) # only counters and dates, no runs
+
 class RunStatsByDate(RunStats):
     def __init__(self):
         super().__init__()
@@ -141,29 +211,446 @@ class RunLinkedListNode:
             else:
                 return self.next
 
+class StreakTable:
+    """The streak of every run in a RunIndex, stored by position."""
+
+    def __init__(self):
+        self.streak = array("i")
+        self.position = array("i")
+        self.ongoing = array("b")
+
+    def __len__(self) -> int:
+        return len(self.streak)
+
+    def insert(self, i: int):
+        """Make room for a run at position i. It starts with no streak."""
+        self.streak.insert(i, 0)
+        self.position.insert(i, 0)
+        self.ongoing.insert(i, 0)
+
+    def set(self, i: int, streak: int, position: int, ongoing: bool):
+        self.streak[i] = streak
+        self.position[i] = position
+        self.ongoing[i] = ongoing
+
+    def get(self, i: int) -> tuple[int, int, bool]:
+        return self.streak[i], self.position[i], bool(self.ongoing[i])
+
+    def copy(self) -> StreakTable:
+        new = StreakTable()
+        new.streak = array("i", self.streak)
+        new.position = array("i", self.position)
+        new.ongoing = array("b", self.ongoing)
+        return new
+
+def _column(values: array, start: int, end: int):
+    """Return a slice of a column, sharing its memory as a NumPy array if we can."""
+    if np is None:
+        return values[start:end]
+    if not values:
+        return np.zeros(0, dtype=values.typecode)
+    return np.frombuffer(values, dtype=values.typecode)[start:end]
+
+class RunColumns:
+    """A summary of every run in a RunIndex, with one typed array per field.
+
+    Statistics filter and count these with masks, instead of going through
+    the properties of every run. NumPy is used if it's installed."""
+
+    _typecodes = {
+        "character": "h",
+        "won": "b",
+        "ascension": "b",
+        "floor": "h",
+        "score": "i",
+        "playtime": "i",
+        "modded": "b", # modded character
+        "custom": "b", # custom or daily modifiers
+    }
+
+    def __init__(self):
+        for name, typecode in self._typecodes.items():
+            setattr(self, name, array(typecode))
+        self._totals: tuple[dict[int, array], dict[int, array]] | None = None
+
+    def insert(self, i: int, run: RunParser | Run2Parser):
+        self._totals = None
+        summary = run.summary
+        self.character.insert(i, char_code(run.character))
+        self.won.insert(i, summary.won)
+        self.ascension.insert(i, summary.ascension)
+        self.floor.insert(i, summary.floor)
+        self.score.insert(i, summary.score)
+        self.playtime.insert(i, summary.playtime)
+        self.modded.insert(i, run.modded)
+        self.custom.insert(i, bool(summary.modifiers))
+
+    def copy(self) -> RunColumns:
+        new = RunColumns()
+        for name, typecode in self._typecodes.items():
+            setattr(new, name, array(typecode, getattr(self, name)))
+        return new
+
+    def totals(self) -> tuple[dict[int, array], dict[int, array]]:
+        """Return the running totals of wins and losses for each character.
+
+        totals[won][code][i] is how many of the first i runs were of that
+        character and outcome. They are built the first time they're needed
+        after a change."""
+        if self._totals is None:
+            size = len(self.won)
+            res: tuple[dict[int, array], dict[int, array]] = ({}, {})
+            if np is not None:
+                chars = _column(self.character, 0, size)
+                won = _column(self.won, 0, size)
+                for code in np.unique(chars).tolist():
+                    is_char = chars == code
+                    for outcome in (0, 1):
+                        total = np.zeros(size + 1, dtype="i")
+                        np.cumsum(is_char & (won == outcome), out=total[1:])
+                        res[outcome][code] = array("i", total.tobytes())
+            else:
+                for code in set(self.character):
+                    res[0][code] = array("i", [0]) * (size + 1)
+                    res[1][code] = array("i", [0]) * (size + 1)
+                for i, (char, won) in enumerate(zip(self.character, self.won), 1):
+                    for outcome in (0, 1):
+                        for code, total in res[outcome].items():
+                            total[i] = total[i-1] + (code == char and won == outcome)
+            self._totals = res
+        return self._totals
+
+    def count_by_character(self, start: int, end: int, *, won: bool) -> dict[int, int]:
+        """Count the wins or losses of each character, between positions start and end."""
+        if start >= end:
+            return {}
+        res = {}
+        for code, total in self.totals()[won].items():
+            if count := total[end] - total[start]:
+                res[code] = count
+        return res
+
+    def count(self, start: int, end: int, **where: int) -> int:
+        """Count the runs between start and end where the columns have these values."""
+        if np is not None:
+            mask = np.ones(max(end - start, 0), dtype=bool)
+            for name, value in where.items():
+                mask &= _column(getattr(self, name), start, end) == value
+            return int(mask.sum())
+        columns = [(_column(getattr(self, name), start, end), value) for name, value in where.items()]
+        return sum(all(col[i] == value for col, value in columns) for i in range(max(end - start, 0)))
+
+    def max_by_character(self, values: array, start: int, end: int) -> tuple[int, dict[int, int]]:
+        """Return the highest of values among unmodded runs, overall and for each character."""
+        chars = _column(self.character, start, end)
+        values = _column(values, start, end)
+        modded = _column(self.modded, start, end)
+        if np is not None:
+            keep = modded == 0
+            chars, values = chars[keep], values[keep]
+            if not len(values):
+                return 0, {}
+            best = np.zeros(int(chars.max()) + 1, dtype=values.dtype)
+            np.maximum.at(best, chars, values)
+            return int(values.max()), {code: int(value) for code, value in enumerate(best) if value}
+        overall = 0
+        res: dict[int, int] = {}
+        for code, value, m in zip(chars, values, modded):
+            if not m:
+                overall = max(overall, value)
+                if value > res.get(code, 0):
+                    res[code] = value
+        return overall, res
+
+    def newest_by_character(self, start: int, end: int, **where: int) -> dict[int, int]:
+        """Return the position of the newest run of each character between start and end,
+        only looking at the runs where the columns have these values."""
+        chars = _column(self.character, start, end)
+        if np is not None:
+            mask = np.ones(len(chars), dtype=bool)
+            for name, value in where.items():
+                mask &= _column(getattr(self, name), start, end) == value
+            positions = np.flatnonzero(mask)[::-1]
+            codes, first = np.unique(chars[positions], return_index=True)
+            return {int(code): int(positions[i]) + start for code, i in zip(codes, first)}
+        columns = [(_column(getattr(self, name), start, end), value) for name, value in where.items()]
+        res: dict[int, int] = {}
+        for i in range(len(chars) - 1, -1, -1):
+            if chars[i] not in res and all(col[i] == value for col, value in columns):
+                res[chars[i]] = i + start
+        return res
+
+    def positions(self, start: int, end: int, **where: int) -> list[int]:
+        """Return the positions between start and end where the columns have these values."""
+        if np is not None:
+            mask = np.ones(max(end - start, 0), dtype=bool)
+            for name, value in where.items():
+                mask &= _column(getattr(self, name), start, end) == value
+            return (np.flatnonzero(mask) + start).tolist()
+        columns = [(_column(getattr(self, name), start, end), value) for name, value in where.items()]
+        return [i + start for i in range(max(end - start, 0)) if all(col[i] == value for col, value in columns)]
+
+class RunIndex:
+    """The runs of a single profile, sorted from oldest to newest.
+
+    The timestamps are kept in a parallel array, so that counting, paging
+    and finding runs in a time range never need to look at the runs. The
+    rotating and per-character streaks, and the run summaries, are kept in
+    parallel as well."""
+
+    def __init__(self):
+        self.epochs = array("q")
+        self.runs: list[RunParser | Run2Parser] = []
+        self.rotating = StreakTable()
+        self.character = StreakTable()
+        self.columns = RunColumns()
+
+    def __repr__(self):
+        return f"RunIndex of {len(self)} runs"
+
+    def __len__(self) -> int:
+        return len(self.runs)
+
+    def __getitem__(self, i: int) -> RunParser | Run2Parser:
+        return self.runs[i]
+
+    def __iter__(self):
+        return iter(self.runs)
+
+    def insert(self, run: RunParser | Run2Parser) -> int:
+        """Insert the run at its sorted position, and return that position."""
+        i = bisect.bisect(self.epochs, run.epoch)
+        self.epochs.insert(i, run.epoch)
+        self.runs.insert(i, run)
+        self.rotating.insert(i)
+        self.character.insert(i)
+        self.columns.insert(i, run)
+        return i
+
+    def copy(self) -> RunIndex:
+        """Return a copy, which will not see runs inserted into this one."""
+        new = RunIndex()
+        new.epochs = array("q", self.epochs)
+        new.runs = list(self.runs)
+        new.rotating = self.rotating.copy()
+        new.character = self.character.copy()
+        new.columns = self.columns.copy()
+        return new
+
+    def index(self, run: RunParser | Run2Parser) -> int:
+        """Return the position of the run, or raise ValueError if it's not here."""
+        i = bisect.bisect_left(self.epochs, run.epoch)
+        while i < len(self.runs) and self.epochs[i] == run.epoch:
+            if self.runs[i] is run:
+                return i
+            i += 1
+        raise ValueError(f"{run!r} is not in the index")
+
+    def newest(self, start: int, end: int) -> list[RunParser | Run2Parser]:
+        """Return runs from start to end (exclusive), counting from the most recent."""
+        total = len(self.runs)
+        res = self.runs[max(total - end, 0):max(total - start, 0)]
+        res.reverse()
+        return res
+
+    def span(self, start: datetime.datetime | None, end: datetime.datetime | None) -> tuple[int, int]:
+        """Return the positions of the runs between start and end (inclusive), as a slice.
+
+        Either of them may be None, to not have a limit on that side."""
+        lo = 0 if start is None else bisect.bisect_left(self.epochs, start.timestamp())
+        hi = len(self.runs) if end is None else bisect.bisect_right(self.epochs, end.timestamp())
+        return lo, max(lo, hi)
+
+    def between(self, start: int | float, end: int | float) -> list[RunParser | Run2Parser]:
+        """Return the runs that happened between start and end (inclusive), most recent first."""
+        res = self.runs[bisect.bisect_left(self.epochs, start):bisect.bisect_right(self.epochs, end)]
+        res.reverse()
+        return res
+
 class MasteryStats:
+    """The cards and relics mastered in one game, and the first run to master each of them."""
+
     def __init__(self) -> None:
-        self.mastered_cards: dict[str, RunParser] = {}
-        self.mastered_relics: dict[str, RunParser] = {}
+        self.mastered_cards: dict[str, RunParser | Run2Parser] = {}
+        self.mastered_relics: dict[str, RunParser | Run2Parser] = {}
         self.colors: dict[str, str] = {}
-        self.last_run_timestamp: datetime.datetime = None
+        self.seen: set[str] = set() # the runs which were already counted
+        self.index: RunIndex | None = None # the last index we went through
+        self.pending: list[RunParser | Run2Parser] = [] # runs the maintenance task has yet to count
+        self.generation = 0 # goes up every time something new is mastered
+
+    def master(self, found: dict[str, RunParser | Run2Parser], name: str, run: RunParser | Run2Parser):
+        """Mark name as mastered by run, unless an older run already mastered it."""
+        current = found.get(name)
+        if current is None or run.epoch < current.epoch:
+            found[name] = run
+        if current is None:
+            self.generation += 1
+
+    def copy(self) -> MasteryStats:
+        """Return a copy, which can count more runs without changing this one."""
+        new = MasteryStats()
+        new.mastered_cards = dict(self.mastered_cards)
+        new.mastered_relics = dict(self.mastered_relics)
+        new.colors = dict(self.colors)
+        new.seen = set(self.seen)
+        new.index = self.index
+        new.pending = list(self.pending)
+        new.generation = self.generation
+        return new
 
+    def clear(self):
+        """Forget every run, so they can all be counted again."""
+        self.mastered_cards.clear()
+        self.mastered_relics.clear()
+        self.colors.clear()
+        self.seen.clear()
+        self.index = None
+        self.pending.clear()
+        self.generation += 1
+
+class CounterTable:
+    """The same few counters for many names, all kept in a single flat array.
+
+    There are several hundred cards and relics, and a dict or list for each
+    of them costs more than the numbers themselves."""
+
+    def __init__(self, *columns: str):
+        self.columns = columns
+        self.rows: dict[str, int] = {} # name: where its counters start
+        self.counts = array("I")
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.rows
+
+    def add(self, name: str, *values: int):
+        start = self.rows.get(name)
+        if start is None:
+            start = self.rows[name] = len(self.counts)
+            self.counts.extend([0] * len(self.columns))
+        for i, value in enumerate(values):
+            self.counts[start + i] += value
+
+    def get(self, name: str) -> dict[str, int]:
+        """Return the counters of name by column, all 0 if it was never counted."""
+        start = self.rows.get(name)
+        if start is None:
+            return dict.fromkeys(self.columns, 0)
+        return dict(zip(self.columns, self.counts[start:start + len(self.columns)]))
+
+    def copy(self) -> CounterTable:
+        new = CounterTable(*self.columns)
+        new.rows = dict(self.rows)
+        new.counts = array("I", self.counts)
+        return new
+
+    def clear(self):
+        self.rows.clear()
+        self.counts = array("I")
+
+class PickRates:
+    """How often each card was offered and picked, and each relic obtained, in one profile.
+
+    The 'won' counters are how many of the picks (or relics) were in a run that was won."""
+
+    def __init__(self):
+        self.cards = CounterTable("offered", "picked", "won")
+        self.relics = CounterTable("obtained", "won")
+        self.runs = 0
+        self.wins = 0
+
+    def add_run(self, run: RunParser | Run2Parser):
+        summary = run.summary
+        won = int(summary.won)
+        self.runs += 1
+        self.wins += won
+        for card, (offered, picked) in summary.choices.items():
+            self.cards.add(card, offered, picked, picked * won)
+        prefix = make_term("relic", "")
+        for term in summary.terms:
+            if term.startswith(prefix):
+                self.relics.add(term[len(prefix):], 1, won)
+
+    def rebuild(self, runs: Iterable[RunParser | Run2Parser]):
+        self.clear()
+        for run in runs:
+            self.add_run(run)
+
+    def copy(self) -> PickRates:
+        """Return a copy, which can count more runs without changing this one."""
+        new = PickRates()
+        new.cards = self.cards.copy()
+        new.relics = self.relics.copy()
+        new.runs = self.runs
+        new.wins = self.wins
+        return new
+
+    def clear(self):
+        self.cards.clear()
+        self.relics.clear()
+        self.runs = 0
+        self.wins = 0
+
+
+class StreakGroup:
+    """Consecutive runs of the same character, which all won or all lost."""
+
+    def __init__(self, run: RunParser | Run2Parser):
+        self.won = run.won
+        self.runs = [run]
+        self.container: StreakContainer | None = None
 
 class StreakCache:
     """
     A streak superclass that contains StreakContainer objects.
 
+    Runs are added one at a time, oldest first, with `add_run`. Each one
+    extends the group of its character, or starts a new one, and only the
+    containers which changed are refreshed.
+
     """
 
     def __init__(self, since: datetime.datetime):
         self.since = since
-        self.containers = []
+        self.containers: list[StreakContainer] = []
+        self._open: dict[str, StreakGroup] = {} # the latest group of each character
+        self.count = 0 # how many runs were added
+        self.last: RunParser | Run2Parser | None = None
 
     def __repr__(self):
         return f"StreakCache of {len(self.containers)}: {self.containers}"
 
     def clear(self):
         self.containers = []
+        self._open.clear()
+        self.count = 0
+        self.last = None
+        self.prepend(StreakContainer(False, []))
+        self.latest.ongoing = True
+        self.latest.refresh()
+
+    def copy(self) -> StreakCache:
+        """Return a copy, which can take newer runs without changing this one.
+
+        Adding a run only ever changes the latest container, and the ones
+        holding the latest group of a character, so only those are copied,
+        along with their groups. The others are shared."""
+        new = StreakCache(self.since)
+        new.count = self.count
+        new.last = self.last
+        live = {id(group.container) for group in self._open.values()}
+        if self.containers:
+            live.add(id(self.latest))
+        groups: dict[int, StreakGroup] = {} # id of the original: copy
+        for container in self.containers:
+            if id(container) in live:
+                container = container.copy(groups)
+            new.containers.append(container)
+        new._open = {char: groups[id(group)] for char, group in self._open.items()}
+        return new
 
     def prepend(self, containers):
         self.containers.insert(0, containers)
@@ -172,6 +659,73 @@ class StreakCache:
     def latest(self):
         return self.containers[0]
 
+    def rebuild(self, runs: list[RunParser | Run2Parser]):
+        """Start over with these runs, oldest first."""
+        self.clear()
+        for run in runs:
+            self.add_run(run, refresh=False)
+        for container in self.containers:
+            container.refresh()
+
+    def add_run(self, run: RunParser | Run2Parser, *, refresh: bool = True):
+        """Add a run newer than every run added so far."""
+        latest = self.latest
+        touched = {id(latest): latest}
+        group = self._open.get(run.character)
+        if group is not None:
+            # the last run of this group now has a next run, which may be shown
+            touched[id(group.container)] = group.container
+
+        if group is not None and group.won == run.won:
+            group.runs.append(run)
+            if group.won and len(group.runs) == 3:
+                # We have a winning streak! Yay!  It gets its own container,
+                # splitting the one of runs which didn't streak it was in.
+                for container in self._promote(group):
+                    touched[id(container)] = container
+        else:
+            group = StreakGroup(run)
+            self._open[run.character] = group
+            if latest.winning_streak:
+                # The latest container is for wins, so we need to make a new
+                # one that contains losses instead.
+                self.prepend(StreakContainer(False, [group]))
+            else:
+                latest.append(group)
+            touched[id(group.container)] = group.container
+
+        # Mark the latest streak as the ongoing one.  The UI wants to know this for
+        # display purposes.
+        latest.ongoing = False
+        self.latest.ongoing = True
+        touched[id(self.latest)] = self.latest
+
+        self.count += 1
+        self.last = run
+        if refresh:
+            for container in touched.values():
+                container.refresh()
+
+    def _promote(self, group: StreakGroup) -> list[StreakContainer]:
+        """Move a group which just became a streak into its own container, and return the new ones."""
+        old = group.container
+        i = self.containers.index(old)
+        pos = old.groups.index(group)
+        before, after = old.groups[:pos], old.groups[pos+1:]
+        new = [StreakContainer(True, [group])]
+        if after:
+            new.insert(0, StreakContainer(False, after))
+        old.groups = []
+        for g in before:
+            old.append(g)
+        # the oldest container is always there, but otherwise streaks follow each other directly
+        if not before and i != len(self.containers) - 1:
+            del self.containers[i]
+        else:
+            new.append(old)
+        self.containers[i:i] = [x for x in new if x is not old]
+        return new
+
 class StreakContainer:
     """
     Collection of runs that form a winning or losing streak.
@@ -187,21 +741,70 @@ class StreakContainer:
     streak is over, the losing run that broke it should be in there as
     well so it can be shown in the UI as the one that broke it.
 
+    The runs come from the groups, and are only gathered again when
+    `refresh` is called.
+
     """
 
-    def __init__(self, winning_streak: bool, runs: list[RunParser | Run2Parser]):
+    def __init__(self, winning_streak: bool, groups: list[StreakGroup]):
         self.winning_streak = winning_streak
         self.ongoing = False
-        self.runs = runs
+        self.groups: list[StreakGroup] = []
+        self.runs: list[RunParser | Run2Parser] = []
+        self.streak = 0
+        self._display_runs: list[RunParser | Run2Parser] = []
+        for group in groups:
+            self.append(group)
 
     def __repr__(self):
         return f"Streaks<{self.character} {self.verb} of {self.length}>"
 
-    def append(self, runs):
-        self.runs += runs
+    def append(self, group: StreakGroup):
+        self.groups.append(group)
+        group.container = self
+
+    def copy(self, groups: dict[int, StreakGroup]) -> StreakContainer:
+        """Return a copy with copies of the groups, which are added to groups by the id of the original."""
+        new = StreakContainer(self.winning_streak, [])
+        new.ongoing = self.ongoing
+        new.runs = self.runs
+        new.streak = self.streak
+        new._display_runs = self._display_runs
+        for group in self.groups:
+            copied = groups[id(group)] = StreakGroup(group.runs[0])
+            copied.won = group.won
+            copied.runs = list(group.runs)
+            new.append(copied)
+        return new
+
+    def refresh(self):
+        """Gather the runs from the groups, and count them."""
+        self.runs = [run for group in self.groups for run in group.runs]
+        # Counts the amount of runs that were the actual streak.
+        #
+        # Without this, the streak would show one too many once it's over
+        # since we care to show the losing run inside the streak
+        # collection.
+        self.streak = sum(run.won for run in self.runs)
+        if self.ongoing or not self.runs:
+            self._display_runs = self.runs
+        else:
+            from src.runs import _links # circular imports otherwise
+            self._display_runs = self.runs + [_links(self.runs[-1]).next_char]
 
     def get_run(self, x):
-        return self.display_runs[x]
+        if x == len(self._display_runs):
+            return self._live_run()
+        return self._display_runs[x]
+
+    def _live_run(self):
+        """Return the current run if we are live and the stream is ongoing, else None."""
+        if self.ongoing:
+            from src.save import _savefile
+
+            if _savefile.character is not None and _savefile.character == self.character:
+                return _savefile
+        return None
 
     @property
     def display_runs(self):
@@ -211,13 +814,10 @@ class StreakContainer:
         - The current run if we are live and the stream is ongoing.
 
         """
-        if self.ongoing:
-            from src.save import _savefile
-
-            if _savefile.character is not None and _savefile.character == self.character:
-                return self.runs + [_savefile]
-            return self.runs
-        return self.runs + [self.runs[-1].matched.next_char]
+        live = self._live_run()
+        if live is not None:
+            return self._display_runs + [live]
+        return self._display_runs
 
     @property
     def start(self):
@@ -245,7 +845,7 @@ class StreakContainer:
 
     @property
     def length(self):
-        return len(self.display_runs)
+        return len(self._display_runs) + (self._live_run() is not None)
 
     @property
     def target(self):
@@ -259,14 +859,121 @@ class StreakContainer:
             return 20
         return 10 * (math.floor(self.length / 10) + 1)
 
-    @property
-    def streak(self):
-        """
-        Counts the amount of runs that were the actual streak.
+class TermIndex:
+    """Inverted indexes from what the runs contain to the runs themselves.
 
-        Without this, the streak would show one too many once it's over
-        since we care to show the losing run inside the streak
-        collection.
+    Every run gets an id when it's added, and each term (see `make_term`)
+    maps to the ids of the runs which have it, as a bitset stored in an int.
+    Combining filters is then a matter of & and |. The time, outcome, floor
+    and score of each run are also kept by id, to filter and sum over."""
 
-        """
-        return len([x for x in self.runs if x.won])
+    def __init__(self):
+        self.size = 0
+        self.runs: list[RunParser | Run2Parser] = [] # by id
+        self.epochs = array("q")
+        self.won = array("b")
+        self.floors = array("h")
+        self.scores = array("i")
+        self.terms: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, run: RunParser | Run2Parser, terms: Iterable[str]):
+        summary = run.summary
+        bit = 1 << self.size
+        self.runs.append(run)
+        self.epochs.append(summary.epoch)
+        self.won.append(summary.won)
+        self.floors.append(summary.floor)
+        self.scores.append(summary.score)
+        self.size += 1
+        for term in terms:
+            self.terms[term] = self.terms.get(term, 0) | bit
+
+    def copy(self) -> TermIndex:
+        new = TermIndex()
+        # ids are only ever appended, and the copy never looks past its own
+        # size, so both can share the same per-id lists
+        new.size = self.size
+        new.runs = self.runs
+        new.epochs = self.epochs
+        new.won = self.won
+        new.floors = self.floors
+        new.scores = self.scores
+        new.terms = dict(self.terms)
+        return new
+
+    def get(self, term: str) -> int:
+        return self.terms.get(term, 0)
+
+    def any_of(self, terms: Iterable[str]) -> int:
+        bits = 0
+        for term in terms:
+            bits |= self.get(term)
+        return bits
+
+    def everything(self) -> int:
+        return (1 << self.size) - 1
+
+class RunSet:
+    """A set of runs selected from a TermIndex."""
+
+    def __init__(self, index: TermIndex, bits: int):
+        self.index = index
+        self.bits = bits
+
+    def __len__(self) -> int:
+        return self.bits.bit_count()
+
+    def __and__(self, other: RunSet) -> RunSet:
+        return RunSet(self.index, self.bits & other.bits)
+
+    def __or__(self, other: RunSet) -> RunSet:
+        return RunSet(self.index, self.bits | other.bits)
+
+    def __iter__(self) -> Iterator[RunParser | Run2Parser]:
+        """Iterate over the runs, newest first."""
+        runs = self.index.runs
+        return (runs[i] for i in self.select())
+
+    def ids(self) -> Iterator[int]:
+        """Iterate over the ids of the runs, in no particular order."""
+        bits = bin(self.bits)[:1:-1] # lowest bit first
+        i = bits.find("1")
+        while i != -1:
+            yield i
+            i = bits.find("1", i + 1)
+
+    def select(self, *, start: int | None = None, end: int | None = None, min_score: int = 0) -> list[int]:
+        """Return the ids of the runs between start and end (inclusive) with at
+        least min_score, newest first, and by name when they finished at once."""
+        epochs, scores, runs = self.index.epochs, self.index.scores, self.index.runs
+        res = []
+        for i in self.ids():
+            if start is not None and epochs[i] < start:
+                continue
+            if end is not None and epochs[i] > end:
+                continue
+            if scores[i] < min_score:
+                continue
+            res.append(i)
+        res.sort(key=lambda i: (-epochs[i], runs[i].name))
+        return res
+
+    @property
+    def wins(self) -> int:
+        return (self.bits & self.index.get(make_term("won", 1))).bit_count()
+
+    @property
+    def winrate(self) -> float:
+        if not self.bits:
+            return 0.0
+        return self.wins / len(self)
+
+    def newest(self) -> RunParser | Run2Parser | None:
+        epochs = self.index.epochs
+        i = max(self.ids(), key=epochs.__getitem__, default=None)
+        if i is None:
+            return None
+        return self.index.runs[i]
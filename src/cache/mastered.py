@@ -3,63 +3,174 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 from collections import Counter
+from datetime import datetime, UTC
 
-from src.cache.cache_helpers import MasteryStats
-from src.nameinternal import get
-from src.sts_profile import get_profile
+from src.cache.cache_helpers import MasteryStats, RunIndex
+from src.nameinternal import get, _internal_cache
+from src import sts_profile
 
 if TYPE_CHECKING:
-    from src.runs import RunParser
-    from src.save import Savefile
+    from src.runs import RunParser, Run2Parser
+    from src.save import Savefile, Save2
 
-_mastery_stats = MasteryStats()
+# one for each profile
+_mastery_stats: dict[int, MasteryStats] = {}
 
-__all__ = ["update_mastery_stats", "get_mastered", "get_current_masteries"]
+# the profile we master things on unless asked otherwise, the Ascension it's done at, and since when, for each game
+_rules: dict[int, tuple[int, int, datetime | None]] = {
+    1: (0, 20, datetime(2023, 1, 1, tzinfo=UTC)), # BaalorA20 profile
+    2: (11, 10, None),
+}
 
-def update_mastery_stats():
-    profile = get_profile(0, 1)
+# the cards that can be mastered in each game, and how many things were loaded when we found them
+_candidates: dict[int, tuple[int, list[str]]] = {}
+# the cards left to master on each profile, and the (stats, candidates) they were made from
+_unmastered: dict[int, tuple[tuple[MasteryStats, int], list[str]]] = {}
+
+__all__ = ["update_mastery_stats", "count_mastery_stats", "publish_mastery_stats", "get_mastered", "get_unmastered", "get_current_masteries"]
+
+def _default_version() -> int:
+    return 2 if sts_profile._SPIRE_2 else 1
+
+def _version(profile: int) -> int:
+    return 2 if profile >= 10 else 1 # Spire 2 profiles are offset by 10
+
+def _get_profile(version: int | None, profile: int | None) -> int:
     if profile is None:
-        runs = []
-    else:
-        runs = list(profile.runs)
+        profile = _rules[version or _default_version()][0]
+    return profile
 
-    if _mastery_stats.last_run_timestamp is None:
-        for run in runs:
-            _update_mastery_stats_from_run(run)
-    else:
-        if runs and _mastery_stats.last_run_timestamp != runs[0].timestamp:
-            _update_mastery_stats_from_run(runs[0])
+def _get_stats(profile: int) -> MasteryStats:
+    """Return the mastery stats of the profile, with the runs the maintenance task counted so far."""
+    stats = _mastery_stats.get(profile)
+    if stats is None: # no runs on this profile (yet)
+        return MasteryStats()
+    return stats
 
-def _update_mastery_stats_from_run(run: RunParser):
-    if run.timestamp.year < 2023:
-        return
-    if run.ascension_level != 20: # just in case
-        return
-    if not run.won:
+def update_mastery_stats(profile: int, index: RunIndex, start: int) -> MasteryStats:
+    """Return the mastery stats of the profile with the runs of the index from start on queued.
+
+    The current stats are copied, so the commands can keep reading them
+    until the new ones are published. With start at 0, every run of the
+    profile which wasn't counted yet is queued; masteries don't depend on
+    the order of the runs, so the ones already seen are kept as they are."""
+    current = _mastery_stats.get(profile)
+    if current is None:
+        stats = MasteryStats()
+        _update_from_index(stats, index, _version(profile))
+        return stats
+
+    stats = current.copy()
+    if not start:
+        stats.pending = [] # the index has every run still queued, so queue them from there
+        stats.index = None
+        _update_from_index(stats, index, _version(profile))
+        return stats
+
+    for run in index.runs[start:]:
+        _, ascension, since = _rules[run.game_version]
+        if run.won and run.ascension_level == ascension and (since is None or run.timestamp >= since):
+            stats.pending.append(run)
+    return stats
+
+def count_mastery_stats() -> dict[int, MasteryStats]:
+    """Return copies of the mastery stats with their queued runs counted, for the profiles which have any.
+
+    This reads the files of the runs, so it's done by the maintenance task,
+    in a thread, and the commands keep reading the current stats meanwhile."""
+    counted = {}
+    for profile, stats in list(_mastery_stats.items()):
+        if stats.pending:
+            stats = stats.copy()
+            _flush(stats)
+            counted[profile] = stats
+    return counted
+
+def publish_mastery_stats(stats: dict[int, MasteryStats]):
+    """Replace the mastery stats the commands see, for every profile at once."""
+    _mastery_stats.update(stats)
+
+def _update_from_index(stats: MasteryStats, index: RunIndex, version: int):
+    """Queue every run of the index which could master something, and wasn't counted yet.
+
+    Only the summary is looked at here; the runs are parsed later by the
+    maintenance task, so they can be restored without loading them."""
+    if index is stats.index: # nothing changed since last time
         return
+    stats.index = index
+    _, ascension, since = _rules[version]
+    # only the wins at the right Ascension can master anything, so skip straight to them
+    start, end = index.span(since, None)
+    for pos in index.columns.positions(start, end, ascension=ascension, won=1):
+        run = index.runs[pos]
+        if run.name not in stats.seen:
+            stats.pending.append(run)
 
-    _mastery_stats.last_run_timestamp = run.timestamp
+def _flush(stats: MasteryStats):
+    """Count the queued runs we haven't seen yet, in whichever order they came in."""
+    pending, stats.pending = stats.pending, []
+    for run in pending:
+        if run.name not in stats.seen:
+            stats.seen.add(run.name)
+            _update_mastery_stats_from_run(stats, run)
+
+def _update_mastery_stats_from_run(stats: MasteryStats, run: RunParser | Run2Parser):
     for relic in run.relics:
-        if relic.name not in _mastery_stats.mastered_relics:
-            _mastery_stats.mastered_relics[relic.name] = run
+        stats.master(stats.mastered_relics, relic.name, run)
 
-    totals = Counter([get(x.partition("+")[0]) for x in run._master_deck])
+    if run.game_version == 1:
+        totals = Counter([get(x.partition("+")[0]) for x in run._master_deck])
+    else:
+        totals = Counter([x.card for x in run.deck])
     for card, count in totals.items():
-        if count >= 2 and card not in _mastery_stats.mastered_cards:
-            _mastery_stats.mastered_cards[card.name] = run
-            _mastery_stats.colors[card.name] = card.color
+        if count >= 2:
+            stats.master(stats.mastered_cards, card.name, run)
+            stats.colors[card.name] = card.color
+
+def get_mastered(version: int | None = None, *, profile: int | None = None) -> MasteryStats:
+    """Return what was mastered on the profile, or on the main profile of the game."""
+    return _get_stats(_get_profile(version, profile))
 
-def get_mastered():
-    return _mastery_stats
+def _get_candidates(version: int) -> list[str]:
+    """Return every card that can be mastered in this game."""
+    size, names = _candidates.get(version, (None, None))
+    if size != len(_internal_cache): # the game data was (re)loaded
+        names = []
+        for value in _internal_cache.values():
+            if value.cls_name != "card" or value.v != version:
+                continue
+            if value.mod is not None:
+                continue
+            if value.type == "Status" or value.rarity == "Special": # all "special" ones are already mastered
+                continue
+            names.append(value.name)
+        _candidates[version] = (len(_internal_cache), names)
+    return names
 
-def get_current_masteries(save: Savefile):
+def get_unmastered(version: int | None = None, *, profile: int | None = None) -> list[str]:
+    """Return the cards which are left to master."""
+    profile = _get_profile(version, profile)
+    version = _version(profile)
+    stats = _get_stats(profile)
+    candidates = _get_candidates(version)
+    (counted, size), names = _unmastered.get(profile, ((None, None), None))
+    if counted is not stats or size != len(candidates): # published stats are never changed, only replaced
+        names = [x for x in candidates if x not in stats.mastered_cards]
+        _unmastered[profile] = ((stats, len(candidates)), names)
+    return names
+
+def get_current_masteries(save: Savefile | Save2, *, profile: int | None = None):
     if save is None:
         return ([], [], [])
-    deck = Counter([get(x.partition("+")[0]).name for x in save.deck_card_ids])
+    stats = _get_stats(_get_profile(save.game_version, profile))
+    if save.game_version == 1:
+        deck = Counter([get(x.partition("+")[0]).name for x in save.deck_card_ids])
+    else:
+        deck = Counter([x.card.name for x in save.deck])
     one_ofs: list[str] = []
     cards_can_master: list[str] = []
     for card, count in deck.items():
-        if card not in _mastery_stats.mastered_cards:
+        if card not in stats.mastered_cards:
             if count == 1:
                 one_ofs.append(card)
                 cards_can_master.append(card)
@@ -68,7 +179,7 @@ def get_current_masteries(save: Savefile):
     
     relics_can_master: list[str] = []
     for relic in save.relics:
-        if relic.name not in _mastery_stats.mastered_relics:
+        if relic.name not in stats.mastered_relics:
             relics_can_master.append(relic.name)
 
     return (one_ofs, cards_can_master, relics_can_master)
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from src.logger import logger
+
+from src.cache.cache_helpers import RunIndex, PickRates
+
+# one for each profile
+_pick_rates: dict[int, PickRates] = {}
+
+__all__ = ["update_pick_rates", "publish_pick_rates", "get_pick_rates"]
+
+def update_pick_rates(profile: int, index: RunIndex, start: int) -> PickRates:
+    """Return the pick rates of the profile with the runs of the index from start on counted.
+
+    The current counts are copied, so the commands can keep reading them
+    until the new ones are published. With start at 0, every run of the
+    profile is counted again, from scratch."""
+    current = _pick_rates.get(profile)
+    if not start or current is None:
+        rates = PickRates()
+        logger.info("Counting cards and relics of %s runs on profile %s", len(index), profile)
+        rates.rebuild(index.runs)
+        return rates
+
+    rates = current.copy()
+    for run in index.runs[start:]:
+        rates.add_run(run)
+    return rates
+
+def publish_pick_rates(rates: dict[int, PickRates]):
+    """Replace the pick rates the commands see, for every profile at once."""
+    _pick_rates.update(rates)
+
+def get_pick_rates(profile: int) -> PickRates:
+    rates = _pick_rates.get(profile)
+    if rates is None: # no runs on this profile (yet)
+        rates = PickRates()
+    return rates
@@ -1,8 +1,9 @@
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, UTC
+import bisect
 import json
 import os
-from src.cache.cache_helpers import Character, RunStats, RunStatsByDate
-from src.sts_profile import get_profile
+from src.cache.cache_helpers import Character, RunIndex, RunStats, RunStatsByDate, char_code, char_name
 from src.logger import logger
 from src.utils import parse_date_range, _parse_dates_with_optional_month_day
 
@@ -15,26 +16,79 @@ class _RangeCache():
             "start_date": None,
             "end_date": None
         }
+        self.start_date: datetime | None = None
+        self.end_date: datetime | None = None
 
 _range = _RangeCache()
-_all_run_stats = RunStats()
-_run_stats_by_date = RunStatsByDate()
+# the all-time stats of every profile, which are counted one run at a time
+_all_run_stats: dict[int, RunStats] = {}
+
+# stats of the most recently asked ranges, along with the index they were counted from
+_RANGE_CACHE_SIZE = 16
+_range_stats: OrderedDict[tuple[int, datetime | None, datetime | None], tuple[RunIndex, RunStatsByDate]] = OrderedDict()
+
+# the profile whose stats are shown when nobody asks for a specific one
+# this used to be the main profile of Spire 1 (the BaalorA20 profile, 0)
+_DEFAULT_PROFILE = 11 # Spire 2 A10
+
+# the Ascension a run has to be on to count towards the character streaks, for each game
+# FIXME: this is temporary until we can implement a better fix (or it's been long enough that it doesn't matter)
+_STREAK_ASCENSION = {1: 20, 2: 10}
 
 __all__ = [
-    "update_all_run_stats", 
+    "update_run_stats",
+    "publish_run_stats",
     "get_all_run_stats", 
     "get_run_stats_by_date", 
     "get_run_stats_by_date_string",
     "Character",
 ]
 
-def update_all_run_stats():
-    _update_run_stats(_all_run_stats)
-    _update_run_stats(_run_stats_by_date)
+def update_run_stats(profile: int, index: RunIndex, start: int) -> RunStats:
+    """Return the stats of the profile with the runs of the index from start on counted.
+
+    The current stats are copied, so the commands can keep reading them
+    until the new ones are published. With start at 0, every run of the
+    profile is counted again, from scratch."""
+    current = _all_run_stats.get(profile)
+    if not start or current is None:
+        run_stats = RunStats()
+        run_stats.is_loaded = True
+        _load_run_stats(run_stats, index, None, None)
+        return run_stats
+
+    run_stats = current.copy()
+    for pos in range(start, len(index)):
+        _add_run(run_stats, index, pos)
+    return run_stats
+
+def publish_run_stats(stats: dict[int, RunStats]):
+    """Replace the stats the commands see, for every profile at once."""
+    _all_run_stats.update(stats)
+
+def _add_run(run_stats: RunStats, index: RunIndex, pos: int):
+    """Count the run at pos, which is newer than every run counted so far."""
+    run = index.runs[pos]
+    run_stats.last_timestamp = run.timestamp
+    # the newest run has the current streaks
+    # these come from the index, as the one the runs see may not be published yet
+    rotating, character_streak = index.rotating.streak[pos], index.character.streak[pos]
+    run_stats.streaks.all_character_count = rotating
+    if char_code(run.character) >= len(Character): # modded character
+        return
+    run_stats.add_pb(run, rotating, character_streak)
+    if run.won:
+        run_stats.add_win(run.character, run.timestamp)
+    else:
+        run_stats.add_loss(run.character, run.timestamp)
+    if run.ascension_level == _STREAK_ASCENSION[run.game_version]:
+        run_stats.streaks.character_counts[Character(run.character)] = character_streak
 
 def _write_range_to_file(start_date: datetime | None, end_date: datetime | None):
     _range.dateDict["start_date"] = start_date.strftime("%Y/%m/%d") if start_date is not None else None
     _range.dateDict["end_date"] = end_date.strftime("%Y/%m/%d") if end_date is not None else None
+    _range.start_date = start_date
+    _range.end_date = end_date
     _range.is_loaded = True
     jsonObj = json.dumps(_range.dateDict)
     with open(os.path.join("data", "range.json"), "w") as f:
@@ -50,92 +104,123 @@ def _set_range_from_file():
         dateDict["end_date"] = None
     _range.dateDict["start_date"] = dateDict["start_date"]
     _range.dateDict["end_date"] = dateDict["end_date"]
-    _range.is_loaded = True
-    _run_stats_by_date.clear()
+    _range.start_date = _range.end_date = None
     if _range.dateDict["start_date"] is not None:
-        _run_stats_by_date.start_date = _parse_dates_with_optional_month_day(_range.dateDict["start_date"])
+        _range.start_date = _parse_dates_with_optional_month_day(_range.dateDict["start_date"])
     if _range.dateDict["end_date"] is not None:
-        _run_stats_by_date.end_date = _parse_dates_with_optional_month_day(_range.dateDict["end_date"])
-    _update_run_stats(_run_stats_by_date, _run_stats_by_date.start_date, _run_stats_by_date.end_date)
+        _range.end_date = _parse_dates_with_optional_month_day(_range.dateDict["end_date"])
+    _range.is_loaded = True
 
 def update_range(start_date: datetime | None, end_date: datetime | None):
+    # the stats of the new range are counted the next time someone asks for them
     _write_range_to_file(start_date, end_date)
-    _run_stats_by_date.clear()
-    _run_stats_by_date.start_date = start_date
-    _run_stats_by_date.end_date = end_date
-    _update_run_stats(_run_stats_by_date, _run_stats_by_date.start_date, _run_stats_by_date.end_date)
 
-def get_run_stats_by_date_string(date_string: str) -> RunStatsByDate:
+def get_run_stats_by_date_string(date_string: str, *, profile: int | None = None) -> RunStatsByDate:
     date_tuple = parse_date_range(date_string)
     start_date = date_tuple[0]
     end_date = date_tuple[1]
-    return get_run_stats_by_date(start_date, end_date)
+    return get_run_stats_by_date(start_date, end_date, profile=profile)
 
-def get_run_stats_by_date(start_date: datetime | None = None, end_date: datetime | None = None) -> RunStatsByDate:
-    # return the cached range stats if dates are the exact same or both are none
-    if (start_date is None and end_date is None) or (start_date == _run_stats_by_date.start_date and end_date == _run_stats_by_date.end_date):
-        if start_date is None and end_date is None and not _range.is_loaded:
+def get_run_stats_by_date(start_date: datetime | None = None, end_date: datetime | None = None, *, profile: int | None = None) -> RunStatsByDate:
+    # no dates means the range which was set with the range command
+    if start_date is None and end_date is None:
+        if not _range.is_loaded:
             _set_range_from_file()
-        return _run_stats_by_date
+        start_date, end_date = _range.start_date, _range.end_date
+    if profile is None:
+        profile = _DEFAULT_PROFILE
+
+    # the counts come from running totals, so this is cheap, but many people
+    # tend to ask for the same range in a row, so keep them around until a new run comes in
+    index = _get_stats_index(profile)
+    key = (profile, start_date, end_date)
+    cached = _range_stats.get(key)
+    if cached is not None and cached[0] is index:
+        _range_stats.move_to_end(key)
+        return cached[1]
+
     run_stats_by_date = RunStatsByDate()
     run_stats_by_date.start_date = start_date
     run_stats_by_date.end_date = end_date
-    _update_run_stats(run_stats_by_date, run_stats_by_date.start_date, run_stats_by_date.end_date)
+    run_stats_by_date.is_loaded = True
+    _load_run_stats(run_stats_by_date, index, start_date, end_date)
+    _range_stats[key] = (index, run_stats_by_date)
+    _range_stats.move_to_end(key)
+    while len(_range_stats) > _RANGE_CACHE_SIZE:
+        _range_stats.popitem(last=False)
     return run_stats_by_date
 
-def _update_run_stats(run_stats: RunStats, start_date: datetime | None = None, end_date: datetime | None = None):
-    # we should only have to load this one time this way, after that we can just use the most recent run to update values
-    # XXX: this is only the main profile of Spire 1
-    try:
-        #runs = list(get_profile(0, 1).runs) # BaalorA20 profile
-        runs = list(get_profile(1, 2).runs) # Spire 2 A10
-    except:
-        runs = []
-
-    if runs:
-        if not run_stats.is_loaded:
-            run_stats.is_loaded =  True
-            run_stats.streaks.all_character_count = 0
-            for run in runs[1:]:
-                if run.modded or run.modifiers:
-                    logger.info(f"Found modded or custom run in stats: {run.name}")
-                elif run.ascension_level < 20:
-                    logger.info(f"Found non-A20 run in stats: {run.name}")
-
-                if start_date is not None and run.timestamp < start_date:
-                    continue
-                if end_date is not None and run.timestamp > end_date:
-                    continue
-
-                run_stats.check_pb(run)
-                if run.won:
-                    run_stats.add_win(run.character, run.timestamp)
-                else:
-                    run_stats.add_loss(run.character, run.timestamp)
-                if run.ascension_level != 10: # do not add to streaks if not on A10
-                    continue # FIXME: this is temporary until we can implement a better fix (or it's been long enough that it doesn't matter)
-                character = Character(run.character)
-                if run_stats.streaks.character_counts[character] is None:
-                    run_stats.streaks.character_counts[character] = run.character_streak.streak
-
-        # set the stats from most recent run's rotating streak and character streak
-        last_run = runs[0]
-        if start_date is not None and last_run.timestamp < start_date:
-            return
-        if end_date is not None and last_run.timestamp > end_date:
-            return
-        if run_stats.last_timestamp != last_run.timestamp and not last_run.modded:
-            run_stats.last_timestamp = last_run.timestamp # if this happens to get called multiple times between runs, we want to make sure we don't continually increment
-            run_stats.check_pb(last_run)
-            if last_run.won:
-                run_stats.add_win(last_run.character, last_run.timestamp)
-            else:
-                run_stats.add_loss(last_run.character, last_run.timestamp)
-            run_stats.streaks.all_character_count = last_run.rotating_streak.streak
-            last_run_char = Character(last_run.character)
-            run_stats.streaks.character_counts[last_run_char] = last_run.character_streak.streak
-    else:
-        run_stats.streaks.character_counts = {char: 0 for char in Character}
+def _get_stats_index(profile: int) -> RunIndex:
+    from src.runs import _get_run_index # circular imports otherwise
+    index = _get_run_index(profile)
+    if index is None:
+        return RunIndex()
+    return index
+
+def _load_run_stats(run_stats: RunStats, index: RunIndex, start_date: datetime | None, end_date: datetime | None):
+    """Count every run between the dates, along with the streaks they ended on.
+
+    The wins and losses come from the running totals of the index, so they
+    only need a search for each end of the range and of every year in it."""
+    # characters which never played have no streak going on
+    run_stats.streaks.all_character_count = 0
+    for character in Character:
+        run_stats.streaks.character_counts[character] = 0
+
+    columns = index.columns
+    total = len(index)
+    if not total:
+        return
+
+    modded = columns.count(0, total, modded=1)
+    custom = columns.count(0, total, custom=1)
+    if modded or custom:
+        logger.info(f"Found {modded} modded and {custom} custom runs in stats")
+    ascension = _STREAK_ASCENSION[index.runs[0].game_version]
+    others = total - columns.count(0, total, ascension=ascension)
+    if others:
+        logger.info(f"Found {others} non-A{ascension} runs in stats")
+
+    start, end = index.span(start_date, end_date)
+    if start >= end:
+        return
+    run_stats.last_timestamp = index.runs[end-1].timestamp
+
+    # the stats are split by year, so count each year on its own
+    first_year = datetime.fromtimestamp(index.epochs[start], UTC).year
+    last_year = datetime.fromtimestamp(index.epochs[end-1], UTC).year
+    for year in range(first_year, last_year + 1):
+        lo = max(start, bisect.bisect_left(index.epochs, datetime(year, 1, 1, tzinfo=UTC).timestamp()))
+        hi = min(end, bisect.bisect_left(index.epochs, datetime(year + 1, 1, 1, tzinfo=UTC).timestamp()))
+        if lo >= hi:
+            continue
+        wins = columns.count_by_character(lo, hi, won=True)
+        losses = columns.count_by_character(lo, hi, won=False)
+        for code in wins.keys() | losses.keys():
+            if code >= len(Character): # modded character
+                continue
+            run_stats.add_results(char_name(code), year, wins=wins.get(code, 0), losses=losses.get(code, 0))
+
+    pb = run_stats.pb
+    best, _ = columns.max_by_character(index.rotating.streak, start, end)
+    pb.all_character_count = max(pb.all_character_count, best)
+    _, by_char = columns.max_by_character(index.character.streak, start, end)
+    for code, streak in by_char.items():
+        if code < len(Character):
+            character = Character(char_name(code))
+            pb.character_counts[character] = max(pb.character_counts[character], streak)
+
+    # the newest run has the current streaks
+    run_stats.streaks.all_character_count = index.rotating.streak[end-1]
+    for code, pos in columns.newest_by_character(start, end, ascension=ascension).items():
+        if code < len(Character):
+            run_stats.streaks.character_counts[Character(char_name(code))] = index.character.streak[pos]
 
-def get_all_run_stats():
-    return _all_run_stats
+def get_all_run_stats(profile: int | None = None) -> RunStats:
+    if profile is None:
+        profile = _DEFAULT_PROFILE
+    run_stats = _all_run_stats.get(profile)
+    if run_stats is None: # no runs on this profile (yet)
+        run_stats = RunStats()
+        _load_run_stats(run_stats, RunIndex(), None, None)
+    return run_stats
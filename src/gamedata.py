@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Any, Generator, Iterable, NamedTuple, Optional, TYPE_CHECKING
+from typing import Any, Generator, Iterable, NamedTuple, Optional, Sequence, TYPE_CHECKING
 
 import urllib.parse
 import collections
@@ -42,6 +42,7 @@ __all__ = [
     "BottleRelic",
 
     "FileParser",
+    "draw_graph",
 
     "BaseNode",
     "NeowBonus",
@@ -110,6 +111,11 @@ class BaseNode(ABC):
 
     """
 
+    __slots__ = (
+        "parser", "floor_time", "card_count", "relic_count",
+        "potion_count", "fights_count", "turns_count",
+    )
+
     game_version: int = 1       #: Which game version this mapping is for.
 
     room_type: str = ""         #: The display name of map nodes.
@@ -148,23 +154,17 @@ class BaseNode(ABC):
     @property
     def potions(self) -> list[Potion]:
         """Potions obtained on this node."""
-        return self.parser.potions[self.floor]
+        return list(self.parser._floor_events[self.floor].potions)
 
     @property
     def picked(self) -> list[SingleCard]:
         """Cards picked this floor."""
-        ret = []
-        for card in self.parser.card_choices[0][self.floor]:
-            ret.append(card)
-        return ret
+        return list(self.parser._floor_events[self.floor].picked)
 
     @property
     def skipped(self) -> list[SingleCard]:
         """Cards skipped this floor."""
-        ret = []
-        for card in self.parser.card_choices[1][self.floor]:
-            ret.append(card)
-        return ret
+        return list(self.parser._floor_events[self.floor].skipped)
 
     @property
     def cards_obtained(self) -> list[SingleCard]:
@@ -189,7 +189,7 @@ class BaseNode(ABC):
     @property
     def relics(self) -> list[Relic]:
         """Relics obtained on this floor."""
-        return self.parser.relics_obtained[self.floor]
+        return list(self.parser._floor_events[self.floor].relics)
 
     @property
     def relics_lost(self) -> list[Relic]:
@@ -199,22 +199,22 @@ class BaseNode(ABC):
     @property
     def used_potions(self) -> list[Potion]:
         """Potions used on this floor."""
-        return self.parser.potions_use[self.floor]
+        return list(self.parser._floor_events[self.floor].potions_use)
 
     @property
     def potions_from_alchemize(self) -> list[Potion]:
         """Potions obtained through Alchemize on this floor."""
-        return self.parser.potions_alchemize[self.floor]
+        return list(self.parser._floor_events[self.floor].potions_alchemize)
 
     @property
     def potions_from_entropic(self) -> list[Potion]:
         """Potions obtained through Entropic Brew on this floor."""
-        return self.parser.potions_entropic[self.floor]
+        return list(self.parser._floor_events[self.floor].potions_entropic)
 
     @property
     def discarded_potions(self) -> list[Potion]:
         """Potions which were mercilessly discarded on this floor."""
-        return self.parser.potions_discarded[self.floor]
+        return list(self.parser._floor_events[self.floor].potions_discarded)
 
     @property
     def all_potions_received(self) -> list[Potion]:
@@ -229,12 +229,12 @@ class BaseNode(ABC):
     @property
     def skipped_relics(self) -> list[Relic]:
         """List of relics that were offered but skipped here."""
-        return self.parser.skipped_rewards[0][self.floor]
+        return list(self.parser._floor_events[self.floor].skipped_relics)
 
     @property
     def skipped_potions(self) -> list[Potion]:
         """List of potions that were offered but skipped here."""
-        return self.parser.skipped_rewards[1][self.floor]
+        return list(self.parser._floor_events[self.floor].skipped_potions)
 
     @property
     def name(self) -> str:
@@ -312,6 +312,7 @@ class BaseNode(ABC):
             to_append[0].append(self.name)
 
 class NeowBonus(BaseNode):
+    __slots__ = ()
 
     all_bonuses = {
         "THREE_CARDS": "Choose one of three cards to obtain.",
@@ -912,6 +913,22 @@ _enemies = { # Downfall bosses
     "downfall:NeowBossFinal": "Neow, Goddess of Life",
 }
 
+def seed_to_str(seed: int) -> str:
+    """Convert a seed to the way the game displays it."""
+    c = "0123456789ABCDEFGHIJKLMNPQRSTUVWXYZ"
+
+    # this is a bit weird, but lets us convert a negative number, if any, into a positive one
+    num = int.from_bytes(seed.to_bytes(20, "big", signed=True).lstrip(b"\xff"), "big")
+    s = []
+
+    while num:
+        num, i = divmod(num, 35)
+        s.append(c[i])
+
+    s.reverse() # everything's backwards, for some reason... but this works
+
+    return "".join(s)
+
 class ShopContents:
     """Contains one floor's shop contents.
 
@@ -934,6 +951,90 @@ class ShopContents:
         """Add a potion to this floor's contents."""
         self.potions.append(get(potion))
 
+class FloorEvents:
+    """Everything the run file records as happening on one floor.
+
+    The nodes of the path read from these, so that building the path
+    doesn't need to go through the whole run file again for every node."""
+
+    __slots__ = (
+        "picked", "skipped", "relics", "potions", "potions_use", "potions_alchemize",
+        "potions_entropic", "potions_discarded", "skipped_relics", "skipped_potions",
+        "bought", "shop", "removals", "events", "campfire", "damage",
+    )
+
+    def __init__(self):
+        self.picked: list[SingleCard] = []
+        self.skipped: list[SingleCard] = []
+        self.relics: list[Relic] = []
+        self.potions: list[Potion] = []
+        self.potions_use: list[Potion] = []
+        self.potions_alchemize: list[Potion] = []
+        self.potions_entropic: list[Potion] = []
+        self.potions_discarded: list[Potion] = []
+        self.skipped_relics: list[Relic] = []
+        self.skipped_potions: list[Potion] = []
+        self.bought = ShopContents()
+        self.shop = ShopContents()
+        self.removals: list[str] = []
+        self.events: list[dict[str, Any]] = []
+        self.campfire: list[dict[str, Any]] = []
+        self.damage: list[dict[str, Any]] = []
+
+
+def draw_graph(graph_type: str, display_type: str, lines: dict[str, tuple[list[int], list[float]]], ends: Iterable[int], ylabel: str | None, title: str | None) -> str | bytes:
+    """Draw values by floor, one line for each label, with the act ends marked.
+
+    graph_type is 'plot', 'scatter', 'bar' or 'stem', and display_type is
+    one of the keys of FileParser._graph_types."""
+    if plt is None:
+        raise ValueError("matplotlib is not installed, graphs cannot be used")
+
+    fig, ax = plt.subplots()
+    match graph_type:
+        case "plot":
+            func = ax.plot
+        case "scatter":
+            func = ax.scatter
+        case "bar":
+            func = ax.bar
+        case "stem":
+            func = ax.stem
+        case a:
+            plt.close(fig)
+            raise TypeError(f"Could not understand graph type {a}")
+
+    if display_type != "embed":
+        for num in ends:
+            plt.axvline(num, color="black", linestyle="dashed")
+
+    for label, (floors, values) in lines.items():
+        func(floors, values, label=label)
+    ax.legend()
+
+    plt.xlabel("Floor")
+    if ylabel is not None:
+        plt.ylabel(ylabel)
+    plt.xlim(left=0)
+    plt.ylim(bottom=0)
+    if title is not None: # doesn't appear to work with mpld3
+        plt.suptitle(title)
+
+    match display_type:
+        case "embed":
+            if fig_to_html is None:
+                plt.close(fig)
+                raise ValueError("mpld3 isn't installed, cannot embed graphs. Use 'image' display type")
+            value: str = fig_to_html(fig)
+            plt.close(fig)
+            return value
+
+        case "image":
+            with io.BytesIO() as file:
+                plt.savefig(file, format="png", transparent=True)
+                plt.close(fig)
+                return file.getvalue()
+
 
 class FileParser(ABC):
     _variables_map = {
@@ -1052,51 +1153,12 @@ class FileParser(ABC):
                 else:
                     d.append(val)
 
-        fig, ax = plt.subplots()
-        match graph_type:
-            case "plot":
-                func = ax.plot
-            case "scatter":
-                func = ax.scatter
-            case "bar":
-                func = ax.bar
-            case "stem":
-                func = ax.stem
-            case a:
-                raise TypeError(f"Could not understand graph type {a}")
-
-        if display_type != "embed":
-            for num in ends:
-                plt.axvline(num, color="black", linestyle="dashed")
-
-        for name, d in totals.items():
-            func(floors, d, label=self._variables_map.get(name, name))
-        ax.legend()
-
-        plt.xlabel("Floor")
-        if ylabel is not None:
-            plt.ylabel(ylabel)
-        elif len(totals) == 1:
+        if ylabel is None and len(totals) == 1:
             label = tuple(totals)[0]
-            plt.ylabel(self._variables_map.get(label, label))
-        plt.xlim(left=0)
-        plt.ylim(bottom=0)
-        if title is not None: # doesn't appear to work with mpld3
-            plt.suptitle(title)
-
-        match display_type:
-            case "embed":
-                if fig_to_html is None:
-                    raise ValueError("mpld3 isn't installed, cannot embed graphs. Use 'image' display type")
-                value: str = fig_to_html(fig)
-                plt.close(fig)
-                return value
+            ylabel = self._variables_map.get(label, label)
 
-            case "image":
-                with io.BytesIO() as file:
-                    plt.savefig(file, format="png", transparent=True)
-                    plt.close(fig)
-                    return file.getvalue()
+        lines = {self._variables_map.get(name, name): (floors, d) for name, d in totals.items()}
+        return draw_graph(graph_type, display_type, lines, ends, ylabel, title)
 
     def get_char_portrait(self):
         c = self.character.lower()
@@ -1229,33 +1291,37 @@ class FileParser(ABC):
         return res
 
     def _handle_potions(self, key: str) -> PotionRewards:
-        final = collections.defaultdict(list)
         if key not in self._potion_mapping:
             raise ValueError(f"Key {key} is not a valid potion action.")
-        mapping = self._data
-        idx = 1
-        if self.prefix == "metric_": # savefile
-            mapping = mapping["basemod:mod_saves"]
-            idx = 0
-        mapkey = self._potion_mapping[key][idx]
-        # this needs RHP, so it might not be present
-        # but we want a list anyway, which is why we iterate like this
-        for i in range(self.floor):
-            potions = []
-            try:
-                # it's possible the key doesn't exist, but we don't want it to error
-                for x in mapping[mapkey][i]:
-                    potions.append(get(x))
-            except (KeyError, IndexError):
-                # Either we don't have RHP, or the floor isn't stored somehow
-                pass
-
-            if potions:
-                # we add one here because the internal list starts at floor 1
-                # so index 0 is floor 1, which we need to correct for here
-                final[i+1] = potions
-
-        return final
+        return self._potion_logs[key]
+
+    @property
+    def _potion_logs(self) -> dict[str, PotionRewards]:
+        """Every potion log, decoded together and cached. For internal use only."""
+        if "potion_logs" not in self._cache:
+            mapping = self._data
+            idx = 1
+            if self.prefix == "metric_": # savefile
+                mapping = mapping["basemod:mod_saves"]
+                idx = 0
+            floor = self.floor
+            resolved: dict[str, Potion] = {} # the same few potions show up all the time
+            logs = {}
+            for key, mapkeys in self._potion_mapping.items():
+                logs[key] = final = collections.defaultdict(list)
+                # this needs RHP, so it might not be present
+                for i, potions in enumerate(mapping.get(mapkeys[idx], ())[:floor]):
+                    if not potions:
+                        continue
+                    for x in potions:
+                        if x not in resolved:
+                            resolved[x] = get(x)
+                    # we add one here because the internal list starts at floor 1
+                    # so index 0 is floor 1, which we need to correct for here
+                    final[i+1] = [resolved[x] for x in potions]
+            self._cache["potion_logs"] = logs
+
+        return self._cache["potion_logs"]
 
     @property
     def potions_use(self) -> PotionRewards:
@@ -1413,6 +1479,39 @@ class FileParser(ABC):
             cdata = CardData(card, [])
             yield (cdata.name, floor)
 
+    @property
+    def _floor_events(self) -> collections.defaultdict[int, FloorEvents]:
+        """What happened on every floor, gathered in one pass over the run. For internal use only."""
+        if "floor_events" not in self._cache:
+            table: collections.defaultdict[int, FloorEvents] = collections.defaultdict(FloorEvents)
+            picked, skipped = self.card_choices
+            skipped_relics, skipped_potions = self.skipped_rewards
+            by_floor = {
+                "picked": picked,
+                "skipped": skipped,
+                "relics": self.relics_obtained,
+                "potions": self.potions,
+                "skipped_relics": skipped_relics,
+                "skipped_potions": skipped_potions,
+                "bought": self.get_purchases(),
+                "shop": self.get_shop_contents(),
+            }
+            for key in self._potion_mapping:
+                by_floor[f"potions_{key}"] = self._handle_potions(key)
+            for name, values in by_floor.items():
+                for floor, value in values.items():
+                    setattr(table[floor], name, value)
+
+            for card, floor in self.removals:
+                table[floor].removals.append(card)
+            for name, key in (("events", "event_choices"), ("campfire", "campfire_choices"), ("damage", "damage_taken")):
+                for d in self._data[self.prefix + key]:
+                    getattr(table[d["floor"]], name).append(d)
+
+            self._cache["floor_events"] = table
+
+        return self._cache["floor_events"]
+
     def master_deck_as_html(self):
         """Return the cards from the deck suitable for the website."""
         return self._cards_as_html(self.get_cards())
@@ -1485,33 +1584,24 @@ class FileParser(ABC):
 
     @property
     def relics_obtained(self) -> RelicRewards:
-        res = collections.defaultdict(list)
-        for relic in self._data[self.prefix + "relics_obtained"]:
-            res[relic["floor"]].append(get(relic["key"]))
+        """The relics obtained on each floor, cached. Nodes copy their own floor out of it."""
+        if "relics_obtained" not in self._cache:
+            res = collections.defaultdict(list)
+            for relic in self._data[self.prefix + "relics_obtained"]:
+                res[relic["floor"]].append(get(relic["key"]))
+            self._cache["relics_obtained"] = res
 
-        return res
+        return self._cache["relics_obtained"]
 
     @property
     def seed(self) -> str:
         """The seed being used for the pRNG in this run."""
-        c = "0123456789ABCDEFGHIJKLMNPQRSTUVWXYZ"
-
         try:
             seed = int(self._data["seed"]) # might be stored as a str
         except KeyError:
             seed = int(self._data["seed_played"])
 
-        # this is a bit weird, but lets us convert a negative number, if any, into a positive one
-        num = int.from_bytes(seed.to_bytes(20, "big", signed=True).lstrip(b"\xff"), "big")
-        s = []
-
-        while num:
-            num, i = divmod(num, 35)
-            s.append(c[i])
-
-        s.reverse() # everything's backwards, for some reason... but this works
-
-        return "".join(s)
+        return seed_to_str(seed)
 
     @property
     def is_seeded(self) -> bool:
@@ -1521,10 +1611,11 @@ class FileParser(ABC):
         return self._data["chose_seed"]
 
     @property
-    def path(self) -> list[NodeData]: # note: caching may not be needed
-        """The run's path, cached."""
+    def path(self) -> tuple[NodeData, ...]:
+        """The run's path, built once and cached. It is shared by every caller, so it cannot be changed."""
         if "path" not in self._cache:
-            self._cache["path"] = []
+            path: list[NodeData] = []
+            relic_nodes: dict[Relic, NodeData] = {}
             floor_time: tuple[int, ...]
             if "basemod:mod_saves" in self._data:
                 floor_time = self._data["basemod:mod_saves"].get("FloorExitPlaytimeLog", ())
@@ -1560,9 +1651,26 @@ class FileParser(ABC):
                     node.turns_count = turns_count
                     node.floor_time = t - prev
                 prev = t
-                self._cache["path"].append(node)
+                path.append(node)
+                for relic in node.relics:
+                    relic_nodes[relic] = node # the last node with it, if it was obtained again
+            self._cache["path"] = tuple(path)
+            self._cache["relic_nodes"] = relic_nodes
+
+        return self._cache["path"]
 
-        return list(self._cache["path"])
+    @property
+    def _relic_nodes(self) -> dict[Relic, NodeData]:
+        """The node where each relic was obtained, built along with the path."""
+        self.path # builds it if needed
+        return self._cache["relic_nodes"]
+
+    @property
+    def _floors(self) -> dict[int, NodeData]:
+        """The nodes of the path, by floor."""
+        if "floors" not in self._cache:
+            self._cache["floors"] = {node.floor: node for node in reversed(self.path)} # the first node wins
+        return self._cache["floors"]
 
     @property
     def modifiers(self) -> list[str]:
@@ -1588,12 +1696,9 @@ class FileParser(ABC):
     def get_floor(self, floor: int) -> BaseNode | None:
         if floor == 0:
             return self.neow_bonus
-        for node in self.path:
-            if node.floor == floor:
-                return node
-        return None
+        return self._floors.get(floor)
 
-def _get_nodes(parser: FileParser, maybe_cached: list[NodeData] | None) -> Generator[tuple[NodeData, bool], None, None]: #PRIV#
+def _get_nodes(parser: FileParser, maybe_cached: Sequence[NodeData] | None) -> Generator[tuple[NodeData, bool], None, None]: #PRIV#
     """Get the map nodes. This should only ever be called from 'FileParser.path' to get the cache."""
     prefix = parser.prefix
     on_map = parser._data[prefix + "path_taken"]
@@ -1603,7 +1708,7 @@ def _get_nodes(parser: FileParser, maybe_cached: list[NodeData] | None) -> Gener
     # (e.g. the last time we saw it, we were in-combat, and now we're out of it)
     # this is also used for run files for which we had the savefile
     if maybe_cached:
-        maybe_cached.pop()
+        maybe_cached = list(maybe_cached[:-1])
     nodes = []
     error = False
     visited = parser._data[prefix + "path_per_floor"]
@@ -1716,6 +1821,8 @@ class KeysObtained:
 class RelicData:
     """Contain information for Spire relics."""
 
+    __slots__ = ("parser", "relic", "_description")
+
     def __init__(self, parser: FileParser, relic: str):
         self.parser = parser
         self.relic: Relic = get(relic)
@@ -1730,14 +1837,11 @@ class RelicData:
     def description(self) -> str:
         if self._description is None:
             desc = []
-            obtained: BaseNode = self.parser.neow_bonus
-            node = None
-            for node in self.parser.path:
-                if self.relic in node.relics:
-                    obtained = node
+            path = self.parser.path
+            obtained: BaseNode = self.parser._relic_nodes.get(self.relic, self.parser.neow_bonus)
             desc.append(f"Obtained on floor {obtained.floor}")
-            if node is not None:
-                desc.extend(self.get_details(obtained, node)) # node will be the last node
+            if path:
+                desc.extend(self.get_details(obtained, path[-1]))
             self._description = "\n".join(desc)
         return self._description
 
@@ -1839,6 +1943,8 @@ class RelicData:
         return self.relic.name
 
 class CardData: # TODO: metadata + scaling cards (for savefile)
+    __slots__ = ("orig", "_cards_list", "single", "card", "meta", "upgrades")
+
     def __init__(self, card: str | SingleCard, cards_list: Iterable[str], meta: int = 0):
         self.orig = card
         if isinstance(card, str):
@@ -1913,6 +2019,8 @@ class NodeData(BaseNode):
 
     """
 
+    __slots__ = ("floor", "current_hp", "max_hp", "gold", "_description")
+
     map_icon = "" #: The map icon as present under the static/icons/ folder
 
     def __init__(self, parser: FileParser, floor: int, *extra): # TODO: Keep track of the deck per node
@@ -1928,7 +2036,7 @@ class NodeData(BaseNode):
             # if this assignment fails too, just let it
             self._set_hp_gold(floor - 1)
 
-        self._cache = {}
+        self._description: str | None = None
 
     def _set_hp_gold(self, floor: int) -> bool:
         """Set the gold as well as current and max HP for this node.
@@ -1950,9 +2058,9 @@ class NodeData(BaseNode):
         return True
 
     def description(self) -> str:
-        if "description" not in self._cache:
-            self._cache["description"] = super().description()
-        return self._cache["description"]
+        if self._description is None:
+            self._description = super().description()
+        return self._description
 
     def get_description(self, to_append: dict[int, list[str]]):
         if self.potions:
@@ -1998,14 +2106,18 @@ class NodeData(BaseNode):
 class EncounterBase(NodeData):
     """A base data class for Spire node encounters."""
 
+    __slots__ = ()
+
     def __init__(self, parser: FileParser, floor: int, *extra):
         super().__init__(parser, floor, *extra)
-        for damage in parser._data[parser.prefix + "damage_taken"]: #PRIV#
-            if damage["floor"] == floor:
-                break
-        else:
+        if not parser._floor_events[floor].damage:
             raise ValueError("no fight result yet")
-        self._damage = damage
+
+    @property
+    def _damage(self) -> dict[str, Any]:
+        # read from the floor table rather than stored per node, so that
+        # EventFight can combine this with Event's slot layout
+        return self.parser._floor_events[self.floor].damage[0]
 
     def get_description(self, to_append: dict[int, list[str]]):
         if self.name != self.fought:
@@ -2038,14 +2150,17 @@ class EncounterBase(NodeData):
 class NormalEncounter(EncounterBase):
     room_type = "Enemy"
     map_icon = "fight_normal.png"
+    __slots__ = ()
 
 class EventEncounter(EncounterBase):
     room_type = "Unknown (Enemy)"
     map_icon = "event_fight.png"
+    __slots__ = ()
 
 class Treasure(NodeData):
     room_type = "Treasure"
     map_icon = "treasure_chest.png"
+    __slots__ = ("key_relic", "blue_key")
 
     key_relic: Optional[Relic] #: The relic that was skipped for the Sapphire Key on this floor, if any.
     blue_key: bool #: Whether we acquired the Sapphire Key on this floor.
@@ -2071,10 +2186,12 @@ class Treasure(NodeData):
 class EventTreasure(Treasure):
     room_type = "Unknown (Treasure)"
     map_icon = "event_chest.png"
+    __slots__ = ()
 
 class EliteEncounter(EncounterBase):
     room_type = "Elite"
     map_icon = "fight_elite.png"
+    __slots__ = ("has_key",)
 
     def __init__(self, parser: FileParser, floor: int, *extra):
         super().__init__(parser, floor, *extra)
@@ -2091,12 +2208,11 @@ class EliteEncounter(EncounterBase):
 class EventElite(EliteEncounter):
     room_type = "Unknown (Elite)"
     map_icon = "event.png"
+    __slots__ = ()
 
 def event_node(parser: FileParser, floor: int, *extra) -> BaseNode:
-    events = []
-    for event in parser._data[parser.prefix + "event_choices"]: #PRIV#
-        if event["floor"] == floor:
-            events.append(event)
+    happened = parser._floor_events[floor]
+    events = list(happened.events)
     if not events:
         return EmptyEvent(parser, floor, *extra)
     if events[0]["event_name"] == "Colosseum":
@@ -2107,9 +2223,8 @@ def event_node(parser: FileParser, floor: int, *extra) -> BaseNode:
                 if a != b: # I'm not quite sure how this happens, but sometimes an event will be in twice?
                     return AmbiguousEvent(parser, floor, events, *extra)
     event = events[0]
-    for dmg in parser._data[parser.prefix + "damage_taken"]:
-        if dmg["floor"] == floor: # not passing dmg in, as EncounterBase fills it in
-            return EventFight(parser, floor, event, *extra)
+    if happened.damage: # not passing it in, as EncounterBase fills it in
+        return EventFight(parser, floor, event, *extra)
     return Event(parser, floor, event, *extra)
 
 event_node.end_of_act = False
@@ -2117,6 +2232,7 @@ event_node.end_of_act = False
 class EmptyEvent(NodeData):
     room_type = "Unknown (Bugged)"
     map_icon = "event.png"
+    __slots__ = ()
 
     def get_description(self, to_append: dict[int, list[str]]):
         to_append[100].append(
@@ -2129,6 +2245,7 @@ class EmptyEvent(NodeData):
 class AmbiguousEvent(NodeData):
     room_type = "Unknown (Ambiguous)"
     map_icon = "event.png"
+    __slots__ = ("_events",)
 
     def __init__(self, parser: FileParser, floor: int, events: list[dict[str, Any]], *extra):
         super().__init__(parser, floor, *extra)
@@ -2144,6 +2261,7 @@ class AmbiguousEvent(NodeData):
 class Event(NodeData):
     room_type = "Unknown"
     map_icon = "event.png"
+    __slots__ = ("_event",)
 
     def __init__(self, parser: FileParser, floor: int, event: dict[str, Any], *extra):
         super().__init__(parser, floor, *extra)
@@ -2268,7 +2386,11 @@ class EventFight(Event, EncounterBase):
 
     """
 
+    __slots__ = ()
+
 class Colosseum(Event):
+    __slots__ = ("_damages",)
+
     def __init__(self, parser: FileParser, floor: int, events: list[dict[str, Any]], *extra):
         event = {
             "damage_healed": 0,
@@ -2309,6 +2431,7 @@ class Colosseum(Event):
 class Merchant(NodeData):
     room_type = "Merchant"
     map_icon = "shop.png"
+    __slots__ = ("contents", "bought", "purged")
 
     contents: ShopContents #: The non-purchased contents of the shop.
     bought: ShopContents #: All purchased goods from this shop.
@@ -2318,12 +2441,10 @@ class Merchant(NodeData):
 
     def __init__(self, parser: FileParser, floor: int, *extra):
         super().__init__(parser, floor, *extra)
-        self.contents = parser.get_shop_contents()[floor]
-        self.bought = parser.get_purchases()[floor]
-        self.purged = []
-        for card, floor in self.parser.removals:
-            if floor == self.floor:
-                self.purged.append(card)
+        happened = parser._floor_events[floor]
+        self.contents = happened.shop
+        self.bought = happened.bought
+        self.purged = list(happened.removals)
 
     def get_description(self, to_append: dict[int, list[str]]):
         if self.purged:
@@ -2358,10 +2479,12 @@ class Merchant(NodeData):
 class EventMerchant(Merchant):
     room_type = "Unknown (Merchant)"
     map_icon = "event_shop.png"
+    __slots__ = ()
 
 class Courier(NodeData):
     room_type = "Courier (Spire with Friends)"
     map_icon = "event.png"
+    __slots__ = ()
 
     def get_description(self, to_append: dict[int, list[str]]):
         to_append[99].append("This is a Courier node. I don't know how to deal with it.")
@@ -2369,6 +2492,7 @@ class Courier(NodeData):
 class Empty(NodeData):
     room_type = "Empty (Spire with Friends)"
     map_icon = "event.png"
+    __slots__ = ()
 
     def get_description(self, to_append: dict[int, list[str]]) :
         to_append[99].append("This is an empty node. Nothing happened here.")
@@ -2376,6 +2500,7 @@ class Empty(NodeData):
 class SWF(NodeData):
     room_type = "Unknown Node (Spire with Friends)"
     map_icon = "event.png"
+    __slots__ = ()
 
     def get_description(self, to_append: dict[int, list[str]]):
         to_append[99].append("This is some Spire with Friends stuff. I don't know how to deal with it.")
@@ -2383,15 +2508,15 @@ class SWF(NodeData):
 class Campfire(NodeData):
     room_type = "Rest Site"
     map_icon = "rest.png"
+    __slots__ = ("_key", "_data")
 
     def __init__(self, parser: FileParser, floor: int, *extra):
         super().__init__(parser, floor, *extra)
         self._key = None
         self._data = None
-        for rest in parser._data[parser.prefix + "campfire_choices"]:
-            if rest["floor"] == floor:
-                self._key = rest["key"]
-                self._data = rest.get("data")
+        for rest in parser._floor_events[floor].campfire: # the last one, if there are several
+            self._key = rest["key"]
+            self._data = rest.get("data")
 
     def get_description(self, to_append: dict[int, list[str]]) -> str:
         to_append[6].append(self.action)
@@ -2418,11 +2543,13 @@ class Campfire(NodeData):
 class Boss(EncounterBase):
     room_type = "Boss"
     map_icon = "boss_node.png"
+    __slots__ = ()
 
 class BossChest(NodeData):
     room_type = "Boss Chest"
     map_icon = "boss_chest.png"
     end_of_act = True
+    __slots__ = ("_picked", "_skipped")
 
     def __init__(self, parser: FileParser, floor: int, *extra):
         super().__init__(parser, floor, *extra)
@@ -2451,10 +2578,12 @@ class Act4Transition(NodeData):
     room_type = "Transition into Act 4"
     map_icon = "event.png"
     end_of_act = True
+    __slots__ = ()
 
 class Victory(NodeData):
     room_type = "Victory!"
     map_icon = "event.png"
+    __slots__ = ("_score", "_data")
 
     def __init__(self, parser: FileParser, floor: int, *extra):
         super().__init__(parser, floor, *extra)
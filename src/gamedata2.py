@@ -364,6 +364,8 @@ class Badge:
 class RelicData:
     """View relics and their information."""
 
+    __slots__ = ("floor", "relic", "props", "_parser")
+
     def __init__(self, data: dict[str, str], parser: FileParser):
         self.floor: int = data["floor_added_to_deck"] # works for both run and save
         self.relic = get(data["id"])
@@ -405,6 +407,8 @@ class RelicData:
         return f"Not implemented ({self.__class__.__name__}.{name})"
 
 class CardData:
+    __slots__ = ("orig", "_cards_list", "single", "card", "upgrades", "enhancement", "amount")
+
     def __init__(self, card: str | SingleCard, cards_list: list[str]):
         self.orig = card
         if isinstance(card, str):
@@ -473,6 +477,17 @@ class CardData:
         return self.name
 
 class PathNode:
+    __slots__ = (
+        "parser", "_data", "floor", "act_name", "turns_taken", "name", "room_type",
+        "gold", "gold_gained", "gold_lost", "gold_spent", "gold_stolen", "damage_taken",
+        "hp_healed", "current_hp", "max_hp", "max_hp_gained", "max_hp_lost",
+        "rest_site_choices", "picked", "skipped", "cards_obtained", "cards_removed",
+        "cards_transformed", "cards_upgraded", "cards_enchanted", "relics",
+        "relics_lost", "skipped_relics", "potions", "used_potions",
+        "potions_from_alchemize", "potions_from_entropic", "discarded_potions",
+        "skipped_potions",
+    )
+
     def __init__(self, parser: FileParser, data: dict, floor: int, act_name: str = None):
         self.parser = parser
         self._data = data
@@ -171,13 +171,15 @@ class Enchantment(Base):
         super().__init__(data)
 
 class SingleCard:
-    enchantment: Enchantment | None = None
-    amount: int = 0
+    __slots__ = ("card", "upgrades", "floor_added", "properties", "enchantment", "amount")
+
     def __init__(self, card: Card, upgrades: int = 0, floor: int | None = None, enchantment: dict | None = None, properties: dict | None = None):
         self.card = card
         self.upgrades = upgrades
         self.floor_added = floor # if None, we simply don't have the info
         self.properties = properties
+        self.enchantment: Enchantment | None = None
+        self.amount: int = 0
         if enchantment is not None:
             self.enchantment = get(enchantment["id"])
             self.amount = enchantment["amount"]
@@ -1,28 +1,42 @@
 from __future__ import annotations
 
-from typing import Any, NamedTuple, TYPE_CHECKING
-
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from itertools import repeat
+from types import MappingProxyType
+from copy import copy
+from typing import Any, Callable, Iterator, Mapping, NamedTuple, TYPE_CHECKING
+
+import threading
+import sys
 import datetime
+import bisect
+import asyncio
 import json
 import time
 import os
 
 from aiohttp.web import Request, Response, HTTPNotFound, HTTPForbidden, HTTPNotImplemented, HTTPBadRequest
+from multidict import MultiMapping
+from yarl import URL
 
 import aiohttp_jinja2
 
 from response_objects.run_single import RunResponse
 from response_objects.profiles import ProfilesResponse
 
-from src.cache.run_stats import update_all_run_stats
-from src.cache.cache_helpers import RunLinkedListNode
-from src.cache.mastered import update_mastery_stats
-from src.cache.streaks import update_streak_collections
+from src.cache.run_stats import update_run_stats, publish_run_stats
+from src.cache.cache_helpers import MasteryStats, PickRates, RunLinkedListNode, RunIndex, RunSet, RunStats, StreakCache, StreakTable, TermIndex, make_term, read_run_header
+from src.cache.mastered import update_mastery_stats, count_mastery_stats, publish_mastery_stats, _mastery_stats
+from src.cache.streaks import update_streak_collections, publish_streak_collections
+from src.cache.pick_rates import update_pick_rates, publish_pick_rates
 from src.sts_profile import get_profile
 from src.gamedata2 import FileParser as FP2
-from src.gamedata import FileParser, KeysObtained, _enemies
+from src.gamedata import FileParser, KeysObtained, _enemies, seed_to_str
+from src.nameinternal import query
 from src.webpage import router
 from src.logger import logger
+from src.config import config
 from src.events import add_listener
 from src.utils import convert_class_to_obj, get_req_data, catch_error
 from src.activemods import ActiveMods, ActiveMod, ACTIVEMODS_KEY
@@ -30,35 +44,159 @@ from src.activemods import ActiveMods, ActiveMod, ACTIVEMODS_KEY
 if TYPE_CHECKING:
     from src.archive import VOD
 
-__all__ = ["get_latest_run", "get_parser", "RunParser", "StreakInfo"]
+__all__ = ["get_latest_run", "get_parser", "find_runs", "profile_key", "RunParser", "StreakInfo"]
 
 _cache: dict[str, RunParser | Run2Parser] = {}
 _ts_cache: dict[int, RunParser | Run2Parser] = {}
+_names: dict[str, RunParser | Run2Parser] = {}
+_missing: set[str] = set() # names that we know don't exist (yet)
+# (profile, character, victory): latest run, with None meaning any
+# the (None, None, None) key holds the latest run across all profiles
+_latest: dict[tuple[int | None, str | None, bool | None], RunParser | Run2Parser] = {}
+
+_MAX_MISSING = 1000
 
 def get_latest_run(character: str | None, victory: bool | None) -> RunParser:
-    _update_cache()
-    if not _ts_cache:
+    """Return the latest run from the profile that was played last.
+
+    Either argument may be None to match any character or outcome."""
+    newest = _view.latest.get((None, None, None))
+    if newest is None:
         return None
-    latest = _ts_cache[max(_ts_cache)]
-    is_character_specific = False
-    if character is not None:
-        is_character_specific = True
-        while latest.character != character:
-            latest = latest.matched.prev
-
-    if victory is not None:
-        if victory:
-            while not latest.won:
-                latest = latest.matched.get_run(is_prev=True, is_character_specific=is_character_specific)
+    return _view.latest.get((profile_key(newest), character, victory))
+
+class RunSummary(NamedTuple):
+    """The fields needed to list, link, count and look up a run without loading its file."""
+    epoch: int
+    character: str # the character ID for Spire 1, and the display name for Spire 2
+    won: bool
+    ascension: int
+    floor: int
+    score: int
+    playtime: int
+    killed_by: str | None
+    modifiers: list[str]
+    terms: list[str] # what the inverted indexes know about, beyond the fields above
+    choices: dict[str, list[int]] # how many times each card was offered, and picked
+
+class _LoadedRuns:
+    """The runs which have their file loaded, least recently used first.
+
+    When the files go over the memory budget, the oldest ones are unloaded,
+    and will be read again the next time they're needed. A handler may be
+    reading a run the handlers can see, so when a thread goes over budget,
+    those are only unloaded later, on the event loop."""
+
+    def __init__(self):
+        self.sizes: OrderedDict[_RunFile, int] = OrderedDict()
+        self.total = 0
+        self.evicted: list[_RunFile] = [] # over budget, waiting for the event loop to unload them
+        # runs are loaded by both the handlers and the maintenance task
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def touch(self, run: _RunFile):
+        with self._lock:
+            if run in self.sizes:
+                self.sizes.move_to_end(run)
+
+    def add(self, run: _RunFile, size: int):
+        with self._lock:
+            self.discard(run)
+            self.sizes[run] = size
+            self.total += size
+            budget = config.server.runs.memory_budget * 1024 * 1024
+            on_loop = threading.current_thread() is threading.main_thread() # the event loop runs there
+            while self.total > budget and len(self.sizes) > 1: # always keep the one we just loaded
+                old, old_size = self.sizes.popitem(last=False)
+                self.total -= old_size
+                if on_loop or old.name not in _view.names: # nobody else can be reading it
+                    old._unload()
+                else:
+                    self.evicted.append(old)
+
+    def take_evicted(self) -> list[_RunFile]:
+        """Return the runs which are waiting to be unloaded, and forget about them."""
+        with self._lock:
+            evicted, self.evicted = self.evicted, []
+            return evicted
+
+    def unload(self, runs: list[_RunFile]):
+        """Unload the runs, unless they were loaded again since. This must run on the event loop."""
+        with self._lock:
+            for run in runs:
+                if run not in self.sizes:
+                    run._unload()
+
+    def discard(self, run: _RunFile):
+        with self._lock:
+            size = self.sizes.pop(run, None)
+            if size is not None:
+                self.total -= size
+
+    def clear(self):
+        with self._lock:
+            self.sizes.clear()
+            self.total = 0
+            self.evicted.clear()
+
+_loaded = _LoadedRuns()
+
+class _RunFile:
+    """Shared logic for run files, whose data may only be loaded when needed.
+
+    Runs restored from the on-disk snapshot only have their summary, and
+    will read the file the first time something accesses the data. Only
+    the summary is needed to list, link and count runs, so the full data
+    can be dropped again when too many files are loaded."""
+
+    folder: str = ""            #: The folder under data/ where these runs are.
+    _header_keys: tuple[str, ...] = ()
+
+    filename: str
+    _profile: int
+    _payload: dict[str, Any] | None
+
+    @property
+    def _data(self) -> dict[str, Any]:
+        if self._payload is None:
+            with open(self._filepath, "rb") as f:
+                raw = f.read()
+            self._payload = json.loads(raw)
+            _loaded.add(self, len(raw))
         else:
-            while latest.won:
-                latest = latest.matched.get_run(is_prev=True, is_character_specific=is_character_specific)
+            _loaded.touch(self)
+        return self._payload
+
+    @_data.setter
+    def _data(self, value: dict[str, Any] | None):
+        self._payload = value
 
-    return latest
+    def _unload(self):
+        """Drop the file data, keeping only the summary."""
+        self._payload = None
+
+    @property
+    def _filepath(self) -> str:
+        """The path to the run file."""
+        return os.path.join("data", self.folder, str(self._profile), self.filename)
 
-class RunParser(FileParser):
+    @property
+    def character_streak(self) -> StreakInfo:
+        return _get_streak(self, is_character_streak=True)
+
+    @property
+    def rotating_streak(self) -> StreakInfo:
+        return _get_streak(self, is_character_streak=False)
+
+class RunParser(_RunFile, FileParser):
     done = True
-    def __init__(self, filename: str, profile: int, data: dict[str, Any]):
+    folder = "runs"
+    # what the summary is built from
+    _header_keys = ("timestamp", "character_chosen", "victory", "ascension_level", "floor_reached", "score", "playtime", "killed_by", "daily_mods", "relics", "card_choices", "neow_bonus", "seed_played")
+    def __init__(self, filename: str, profile: int, data: dict[str, Any] | None, *, summary: RunSummary | None = None):
         if filename in _cache:
             raise RuntimeError(f"Created duplicate run parser with name {filename}")
         super().__init__(data)
@@ -66,15 +204,64 @@ class RunParser(FileParser):
         self.name, _, ext = filename.partition(".")
         self.matched = RunLinkedListNode()
         self.vod: VOD = None
-        self._character = data["character_chosen"]
+        if summary is None:
+            killer = data.get("killed_by")
+            summary = RunSummary(
+                epoch=data["timestamp"],
+                character=data["character_chosen"],
+                won=data["victory"],
+                ascension=data["ascension_level"],
+                floor=int(data["floor_reached"]),
+                score=int(data["score"]),
+                playtime=data["playtime"],
+                killed_by=_enemies.get(killer, killer),
+                modifiers=data.get("daily_mods", []),
+                terms=self._index_terms(data),
+                choices=self._card_choices(data),
+            )
+        self.summary = summary
+        self._character = summary.character
         self._profile = profile
-        self._character_streak = None
-        self._rotating_streak = None
         self._activemods = None
 
     def __repr__(self):
         return f"Run<{self.display_name}> / {self.name}"
 
+    @staticmethod
+    def _index_terms(data: dict[str, Any]) -> list[str]:
+        """Return the relics, picked cards, Neow bonus and seed of the run, as index terms."""
+        terms = {make_term("relic", x) for x in data.get("relics", ())}
+        for choice in data.get("card_choices", ()):
+            picked: str = choice.get("picked", "SKIP")
+            if picked not in ("SKIP", "Singing Bowl"):
+                terms.add(make_term("card", picked.partition("+")[0]))
+        if data.get("neow_bonus"):
+            terms.add(make_term("neow", data["neow_bonus"]))
+        if "seed_played" in data:
+            terms.add(make_term("seed", seed_to_str(int(data["seed_played"]))))
+        return sorted(terms)
+
+    @staticmethod
+    def _card_choices(data: dict[str, Any]) -> dict[str, list[int]]:
+        """Return how many times each card was offered and picked, without upgrades."""
+        choices: dict[str, list[int]] = {}
+        for choice in data.get("card_choices", ()):
+            picked: str = choice.get("picked", "SKIP")
+            if picked not in ("SKIP", "Singing Bowl"):
+                counts = choices.setdefault(sys.intern(picked.partition("+")[0]), [0, 0])
+                counts[0] += 1
+                counts[1] += 1
+            for card in choice.get("not_picked", ()):
+                choices.setdefault(sys.intern(card.partition("+")[0]), [0, 0])[0] += 1
+        return choices
+
+    def _unload(self):
+        super()._unload()
+        # everything in there is built from the data
+        self._cache = {"self": self}
+        self._graph_cache.clear()
+        self._activemods = None
+
     @property
     def has_archive_link(self) -> bool:
         """Whether we have a (timestamped or not) link to an archive video."""
@@ -102,7 +289,7 @@ class RunParser(FileParser):
     @property
     def epoch(self) -> int:
         """Time in seconds since Jan 1, 1970."""
-        return self._data["timestamp"]
+        return self.summary.epoch
 
     @property
     def timestamp(self) -> datetime.datetime:
@@ -144,7 +331,7 @@ class RunParser(FileParser):
 
     @property
     def won(self) -> bool:
-        return self._data["victory"]
+        return self.summary.won
 
     @property
     def verb(self) -> str:
@@ -152,15 +339,26 @@ class RunParser(FileParser):
 
     @property
     def killed_by(self) -> str | None:
-        killer = self._data.get("killed_by")
-        return _enemies.get(killer, killer)
+        return self.summary.killed_by
 
     @property
     def floor_reached(self) -> int:
-        return int(self._data["floor_reached"])
+        return self.summary.floor
 
     floor = floor_reached
 
+    @property
+    def ascension_level(self) -> int:
+        return self.summary.ascension
+
+    @property
+    def playtime(self) -> int:
+        return self.summary.playtime
+
+    @property
+    def modifiers(self) -> list[str]:
+        return self.summary.modifiers
+
     @property
     def acts_beaten(self) -> int:
         """Return how many acts were beaten."""
@@ -172,7 +370,7 @@ class RunParser(FileParser):
 
     @property
     def score(self) -> int:
-        return int(self._data["score"])
+        return self.summary.score
 
     @property
     def score_breakdown(self) -> list[str]:
@@ -180,63 +378,13 @@ class RunParser(FileParser):
 
     @property
     def run_length(self) -> str:
-        seconds = self._data["playtime"]
+        seconds = self.playtime
         minutes, seconds = divmod(seconds, 60)
         hours, minutes = divmod(minutes, 60)
         if hours:
             return f"{hours}:{minutes:>02}:{seconds:>02}"
         return f"{minutes:>02}:{seconds:>02}"
 
-    @property
-    def character_streak(self) -> StreakInfo:
-        streak = self._character_streak
-        if streak is None:
-            streak = self._get_streak(is_character_streak=True)
-            if not streak.is_ongoing:
-                self._character_streak = streak
-        return streak
-
-    @property
-    def rotating_streak(self) -> StreakInfo:
-        streak = self._rotating_streak
-        if streak is None:
-            streak = self._get_streak(is_character_streak=False)
-            if not streak.is_ongoing:
-                self._rotating_streak = streak
-        return streak
-
-    def _get_streak(self, *, is_character_streak: bool) -> StreakInfo:
-        if self.won:
-            streak_total = 1
-            position_in_streak = 1
-            is_ongoing = True
-
-            def loop_cached_runs(*, is_prev: bool):
-                nonlocal streak_total, position_in_streak, is_ongoing
-                current_run: RunParser = self.matched.get_run(is_prev=is_prev, is_character_specific=is_character_streak)
-                if current_run is not None:
-                    last_char = self.character
-                    while current_run.won:
-                        # If rotating, only iterate if not same char
-                        if is_character_streak or current_run.character != last_char:
-                            streak_total += 1
-                            # only iterate the position if the Win came before the current run
-                            if is_prev:
-                                position_in_streak += 1
-
-                        if (run := current_run.matched.get_run(is_prev=is_prev, is_character_specific=is_character_streak)) is not None:
-                            last_char = current_run.character
-                            current_run = run
-                        else:
-                            break
-                    does_upcoming_loss_exist = not is_prev and not current_run.won
-                    if does_upcoming_loss_exist:
-                        is_ongoing = False
-            loop_cached_runs(is_prev=True)
-            loop_cached_runs(is_prev=False)
-            return StreakInfo(streak_total, position_in_streak, is_ongoing)
-        return StreakInfo(0, 0, False)
-
     @property
     def has_activemods(self) -> bool:
         return ACTIVEMODS_KEY in self._data
@@ -255,29 +403,104 @@ class RunParser(FileParser):
     def mods(self) -> list[ActiveMod]:
         return self.activemods.all_mods
 
-class Run2Parser(FP2):
+class Run2Parser(_RunFile, FP2):
     done = True
-    def __init__(self, filename: str, profile: int, data: dict):
+    folder = "runs2"
+    # what the summary is built from
+    _header_keys = ("start_time", "run_time", "players", "win", "ascension", "map_point_history", "acts", "killed_by_encounter", "killed_by_event", "modifiers", "seed")
+    def __init__(self, filename: str, profile: int, data: dict | None, *, summary: RunSummary | None = None):
         super().__init__(data)
         self.matched = RunLinkedListNode()
         self.filename = filename
         self.name, _, ext = filename.partition(".")
         self.vod: VOD = None
         self._profile = profile
-        self._character_streak = None
-        self._rotating_streak = None
+        self._index_forced = False
+        if summary is None:
+            summary = RunSummary(
+                epoch=data["start_time"] + data["run_time"],
+                character=self.get_main_player().character,
+                won=data["win"],
+                ascension=data["ascension"],
+                # this is the length of the path, without needing to build it
+                floor=sum(len(act) for act, _ in zip(data.get("map_point_history", ()), data["acts"])),
+                score=0,
+                playtime=data["run_time"],
+                killed_by=self._get_killed_by(data),
+                modifiers=data["modifiers"],
+                terms=self._index_terms(data),
+                choices=self._card_choices(data),
+            )
+        self.summary = summary
 
     def __repr__(self):
         return f"Run2<{self.display_name}>"
 
+    def _index_terms(self, data: dict[str, Any]) -> list[str]:
+        """Return the relics, picked cards, first Ancient relic and seed of the run, as index terms."""
+        player = self.get_main_player()
+        terms = {make_term("relic", x["id"].partition(".")[2]) for x in player._data["relics"]}
+        for act, nodes in enumerate(data.get("map_point_history", ())):
+            for floor, node in enumerate(nodes):
+                for stats in node.get("player_stats", ()):
+                    if stats.get("player_id") != player.id:
+                        continue
+                    for choice in stats.get("card_choices", ()):
+                        if choice.get("was_picked"):
+                            terms.add(make_term("card", choice["card"]["id"].partition(".")[2]))
+                    if act == floor == 0: # this is Neow
+                        for choice in stats.get("relic_choices", ()):
+                            if choice.get("was_picked"):
+                                terms.add(make_term("neow", choice["choice"].partition(".")[2]))
+        if data.get("seed"):
+            terms.add(make_term("seed", data["seed"]))
+        return sorted(terms)
+
+    def _card_choices(self, data: dict[str, Any]) -> dict[str, list[int]]:
+        """Return how many times each card was offered to the main player, and picked."""
+        player = self.get_main_player()
+        choices: dict[str, list[int]] = {}
+        for nodes in data.get("map_point_history", ()):
+            for node in nodes:
+                for stats in node.get("player_stats", ()):
+                    if stats.get("player_id") != player.id:
+                        continue
+                    for choice in stats.get("card_choices", ()):
+                        counts = choices.setdefault(sys.intern(choice["card"]["id"].partition(".")[2]), [0, 0])
+                        counts[0] += 1
+                        if choice.get("was_picked"):
+                            counts[1] += 1
+        return choices
+
+    def set_index(self, index: int | None):
+        super().set_index(index)
+        self._index_forced = (index is not None)
+
     @property
     def floor_reached(self):
-        return len(self.path)
+        return self.summary.floor
+
+    @property
+    def epoch(self) -> int:
+        """Time in seconds since Jan 1, 1970."""
+        return self.summary.epoch
+
+    @property
+    def ascension_level(self) -> int:
+        return self.summary.ascension
+
+    @property
+    def modifiers(self):
+        return self.summary.modifiers
 
     @property
     def killed_by(self) -> str | None:
-        key1: str = self._data["killed_by_encounter"]
-        key2: str = self._data["killed_by_event"]
+        return self.summary.killed_by
+
+    @staticmethod
+    def _get_killed_by(data: dict) -> str | None:
+        key1: str = data["killed_by_encounter"]
+        key2: str = data["killed_by_event"]
         res = None
         for key in (key1, key2):
             ktype, _, spec = key.partition(".")
@@ -305,7 +528,7 @@ class Run2Parser(FP2):
 
     @property
     def run_length(self) -> str:
-        seconds = self._data["run_time"]
+        seconds = self.summary.playtime
         minutes, seconds = divmod(seconds, 60)
         hours, minutes = divmod(minutes, 60)
         if hours:
@@ -318,7 +541,9 @@ class Run2Parser(FP2):
 
     @property
     def character(self):
-        return self.get_main_player().character
+        if self._index_forced: # the summary only knows about the streamer
+            return self.get_main_player().character
+        return self.summary.character
 
     @property
     def display_name(self) -> str:
@@ -326,63 +551,12 @@ class Run2Parser(FP2):
 
     @property
     def won(self) -> bool:
-        return self._data["win"]
+        return self.summary.won
 
     @property
     def verb(self) -> str:
         return "victory" if self.won else "loss"
 
-    @property
-    def character_streak(self) -> StreakInfo:
-        streak = self._character_streak
-        if streak is None:
-            streak = self._get_streak(is_character_streak=True)
-            if not streak.is_ongoing:
-                self._character_streak = streak
-        return streak
-
-    @property
-    def rotating_streak(self) -> StreakInfo:
-        streak = self._rotating_streak
-        if streak is None:
-            streak = self._get_streak(is_character_streak=False)
-            if not streak.is_ongoing:
-                self._rotating_streak = streak
-        return streak
-
-    def _get_streak(self, *, is_character_streak: bool) -> StreakInfo:
-        if self.won:
-            streak_total = 1
-            position_in_streak = 1
-            is_ongoing = True
-
-            def loop_cached_runs(*, is_prev: bool):
-                nonlocal streak_total, position_in_streak, is_ongoing
-                current_run: Run2Parser = self.matched.get_run(is_prev=is_prev, is_character_specific=is_character_streak)
-                if current_run is not None:
-                    last_char = self.character
-                    while current_run.won:
-                        if current_run.ascension_level == 10:
-                            # If rotating, only iterate if not same char
-                            if is_character_streak or current_run.character != last_char:
-                                streak_total += 1
-                                # only iterate the position if the Win came before the current run
-                                if is_prev:
-                                    position_in_streak += 1
-
-                        if (run := current_run.matched.get_run(is_prev=is_prev, is_character_specific=is_character_streak)) is not None:
-                            last_char = current_run.character
-                            current_run = run
-                        else:
-                            break
-                    does_upcoming_loss_exist = not is_prev and not current_run.won
-                    if does_upcoming_loss_exist:
-                        is_ongoing = False
-            loop_cached_runs(is_prev=True)
-            loop_cached_runs(is_prev=False)
-            return StreakInfo(streak_total, position_in_streak, is_ongoing)
-        return StreakInfo(0, 0, False)
-
 class StreakInfo(NamedTuple):
     """Contain run streak information."""
     streak: int
@@ -395,69 +569,587 @@ async def _setup_cache():
         os.makedirs(os.path.join("data", "runs", str(i)), exist_ok=True)
     for i in range(3):
         os.makedirs(os.path.join("data", "runs2", str(i+1)), exist_ok=True)
+    _load_snapshot()
     _update_cache()
 
-def _update_cache():
+async def Runs_startup():
+    """Keep the run cache up to date, away from the request handlers.
+
+    This owns the run index; it wakes up when a run is received, when a
+    handler asks for a run it doesn't know about, and on a regular tick
+    to pick up files that got there some other way."""
+    global _maintenance_running
+    _maintenance_running = True
+    logger.info(f"Starting run cache maintenance. Will refresh every {config.server.runs.refresh_interval}s.")
+    try:
+        while True:
+            try:
+                await _update_masteries()
+            except Exception:
+                logger.exception("Could not count the masteries")
+            try:
+                await asyncio.wait_for(_wake.wait(), config.server.runs.refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+            _wake.clear()
+            waiters = _waiters[:]
+            _waiters.clear()
+            try:
+                update = await asyncio.to_thread(_prepare_update)
+                if update is not None:
+                    _apply(update) # back on the event loop, so the handlers see all of it at once
+            except Exception:
+                logger.exception("Could not update the run cache")
+            for fut in waiters:
+                if not fut.done():
+                    fut.set_result(None)
+    finally:
+        _maintenance_running = False
+
+async def _update_masteries():
+    """Count the runs that were queued for the masteries.
+
+    This needs their files, so it happens in a thread, after the update
+    that queued them, and nobody waits on it."""
+    counted = await asyncio.to_thread(count_mastery_stats)
+    if counted:
+        publish_mastery_stats(counted)
+    _loaded.unload(_loaded.take_evicted()) # the files it read may have gone over budget
+
+def _request_update():
+    """Wake up the maintenance task, without waiting for it."""
+    _wake.set()
+
+async def _wait_for_update():
+    """Ask for the run cache to be updated, and wait until it is."""
+    if not _maintenance_running: # nothing will do it for us
+        _update_cache()
+        return
+    fut = asyncio.get_running_loop().create_future()
+    _waiters.append(fut)
+    _wake.set()
+    await fut
+
+class _FolderState:
+    """What we already indexed from a single profile folder."""
+
+    def __init__(self):
+        self.mtime: int | None = None
+        self.files: dict[str, tuple[int, int]] = {} # filename: (size, mtime)
+
+_SNAPSHOT_FILE = os.path.join("data", "run_index.jsonl")
+_SNAPSHOT_VERSION = 3
+_MIN_PARALLEL_FILES = 64 # below this, starting the workers costs more than it saves
+
+_folders: dict[str, _FolderState] = {}
+_profile_runs: dict[int, RunIndex] = {}
+_snapshot: dict[str, dict[str, dict[str, Any]]] = {} # folder: {filename: record}, only used at boot
+_snapshot_size: int | None = None # how many records the snapshot file has, None if it needs to be written from scratch
+_stats_loaded = False
+
+class _CacheView(NamedTuple):
+    """What the handlers see of the run cache.
+
+    This is never modified; the maintenance task builds a new one and swaps
+    it in after every update, so handlers always see a consistent state."""
+    profiles: Mapping[int, RunIndex]
+    latest: Mapping[tuple[int | None, str | None, bool | None], RunParser | Run2Parser]
+    names: Mapping[str, RunParser | Run2Parser]
+    terms: TermIndex
+
+class _ProfileStats(NamedTuple):
+    """The statistics of a profile, counted from one of its indexes."""
+    index: RunIndex
+    run_stats: RunStats
+    mastery: MasteryStats
+    streaks: StreakCache
+    pick_rates: PickRates
+
+class _Update(NamedTuple):
+    """Everything an update changed, built away from the handlers.
+
+    It's applied on the event loop in one go, so that the handlers never
+    see a new run without its links and statistics, or the other way around."""
+    added: list[RunParser | Run2Parser]
+    view: _CacheView
+    links: dict[RunParser | Run2Parser, RunLinkedListNode]
+    stats: dict[int, _ProfileStats]
+    evicted: list[RunParser | Run2Parser] # over the memory budget, but the handlers may be reading them
+
+_view = _CacheView(MappingProxyType({}), MappingProxyType({}), MappingProxyType({}), TermIndex())
+_terms = TermIndex()
+_dirty: set[int] = set() # profiles which changed since the view was built
+# the new links of runs, which are given to them when the update is applied
+# handlers may be reading the links the runs already have, so those are never changed in place
+_relinked: dict[RunParser | Run2Parser, RunLinkedListNode] = {}
+_stale: set[str] = set() # folders to scan even if they look unchanged
+_counted: dict[int, tuple[int, RunParser | Run2Parser]] = {} # how many runs of each profile the stats have, and the newest
+
+_wake = asyncio.Event()
+_waiters: list[asyncio.Future] = []
+_maintenance_running = False
+
+def profile_key(parser: RunParser | Run2Parser) -> int:
+    """Return the profile index this run belongs to (Spire 2 is offset by 10)."""
+    if parser.game_version == 2:
+        return parser._profile + 10
+    return parser._profile
+
+def _links(parser: RunParser | Run2Parser) -> RunLinkedListNode:
+    """Return the links of the run, with the changes of the update being built."""
+    return _relinked.get(parser, parser.matched)
+
+def _relink(parser: RunParser | Run2Parser) -> RunLinkedListNode:
+    """Return links of the run which can be changed, without changing the ones handlers see."""
+    links = _relinked.get(parser)
+    if links is None:
+        links = _relinked[parser] = copy(parser.matched)
+    return links
+
+def _find_neighbour(runs: RunIndex, i: int, step: int, matches: Callable[[RunParser | Run2Parser], bool]) -> RunParser | Run2Parser | None:
+    i += step
+    while 0 <= i < len(runs):
+        if matches(runs[i]):
+            return runs[i]
+        i += step
+    return None
+
+def _link_run(parser: RunParser | Run2Parser, runs: RunIndex, i: int):
+    """Splice the run at index i of its profile's sorted runs into the linked lists."""
+    chains: list[tuple[str, Callable[[RunParser | Run2Parser], bool]]] = [
+        ("", lambda x: True),
+        ("_char", lambda x: x.character == parser.character),
+    ]
+    if parser.won:
+        chains.append(("_win", lambda x: x.won))
+    else:
+        chains.append(("_loss", lambda x: not x.won))
+
+    # characters rotate, so this only ever needs to step over a handful of runs
+    for suffix, matches in chains:
+        before = _find_neighbour(runs, i, -1, matches)
+        after = _find_neighbour(runs, i, 1, matches)
+        links = _relink(parser)
+        setattr(links, f"prev{suffix}", before)
+        setattr(links, f"next{suffix}", after)
+        if before is not None:
+            setattr(_relink(before), f"next{suffix}", parser)
+        if after is not None:
+            setattr(_relink(after), f"prev{suffix}", parser)
+
+def _adds_to_streak(run: RunParser | Run2Parser) -> bool:
+    """Whether a win counts towards the streak of the runs around it."""
+    # FIXME: Spire 2 streaks only count A10 for now
+    return run.game_version == 1 or run.ascension_level == 10
+
+def _set_streak_block(table: StreakTable, block: list[tuple[int, RunParser | Run2Parser]], *, rotating: bool, ongoing: bool):
+    """Store the streak of every run in a block of consecutive wins.
+
+    The block is a list of (position, run), in order. For rotating streaks,
+    a win only adds to the streak if the character changed."""
+    last = len(block) - 1
+    # a win before a run counts if it's a different character than the one after it
+    # a win after a run counts if it's a different character than the one before it
+    def counts(i: int, j: int) -> bool:
+        return _adds_to_streak(block[i][1]) and (not rotating or block[i][1].character != block[j][1].character)
+
+    before = 0
+    after = sum(counts(i, i - 1) for i in range(1, last + 1))
+    for i, (pos, run) in enumerate(block):
+        if i:
+            after -= counts(i, i - 1)
+        table.set(pos, 1 + before + after, 1 + before, ongoing)
+        if i < last:
+            before += counts(i, i + 1)
+
+def _compute_streaks(runs: RunIndex):
+    """Compute the streaks of every run in a profile in a single pass."""
+    blocks: dict[str | None, list[tuple[int, RunParser | Run2Parser]]] = {} # None is the rotating streak
+    for i, run in enumerate(runs):
+        for key in (None, run.character):
+            table = runs.rotating if key is None else runs.character
+            if run.won:
+                blocks.setdefault(key, []).append((i, run))
+                continue
+            table.set(i, 0, 0, False)
+            if (block := blocks.pop(key, None)) is not None:
+                _set_streak_block(table, block, rotating=key is None, ongoing=False)
+
+    for key, block in blocks.items(): # nothing came after these
+        _set_streak_block(runs.rotating if key is None else runs.character, block, rotating=key is None, ongoing=True)
+
+def _update_streaks(parser: RunParser | Run2Parser, runs: RunIndex):
+    """Recompute the streaks around a run that was just linked in.
+
+    Only the wins directly around the new run can change."""
+    for suffix, table in (("", runs.rotating), ("_char", runs.character)):
+        before = []
+        run = getattr(_links(parser), f"prev{suffix}")
+        while run is not None and run.won:
+            before.append(run)
+            run = getattr(_links(run), f"prev{suffix}")
+        before.reverse()
+        after = []
+        run = getattr(_links(parser), f"next{suffix}")
+        while run is not None and run.won:
+            after.append(run)
+            run = getattr(_links(run), f"next{suffix}")
+        ongoing = run is None
+
+        if parser.won:
+            blocks = [(before + [parser] + after, ongoing)]
+        else:
+            table.set(runs.index(parser), 0, 0, False)
+            blocks = [(before, False), (after, ongoing)]
+        for block, is_ongoing in blocks:
+            if block:
+                _set_streak_block(table, [(runs.index(x), x) for x in block], rotating=not suffix, ongoing=is_ongoing)
+
+def _get_streak(run: RunParser | Run2Parser, *, is_character_streak: bool) -> StreakInfo:
+    runs = _view.profiles.get(profile_key(run))
+    try:
+        i = runs.index(run)
+    except (AttributeError, ValueError): # not in the cache, so it doesn't have neighbours
+        if run.won:
+            return StreakInfo(1, 1, True)
+        return StreakInfo(0, 0, False)
+
+    if is_character_streak:
+        return StreakInfo(*runs.character.get(i))
+    return StreakInfo(*runs.rotating.get(i))
+
+def _add_to_caches(parser: RunParser | Run2Parser):
+    _cache[parser.filename] = parser
+    _ts_cache[parser.epoch] = parser
+    _names[parser.name] = parser
+    _missing.discard(parser.name)
+    if parser._payload is not None: # it was just parsed, and can be unloaded later
+        _loaded.add(parser, os.stat(parser._filepath).st_size)
+    profile = profile_key(parser)
+    _dirty.add(profile)
+    keys = [(None, None, None)]
+    for character in (None, parser.character):
+        for victory in (None, parser.won):
+            keys.append((profile, character, victory))
+    for key in keys:
+        latest = _latest.get(key)
+        if latest is None or latest.epoch <= parser.epoch:
+            _latest[key] = parser
+    _terms.add(parser, _run_terms(parser))
+
+def _run_terms(parser: RunParser | Run2Parser) -> Iterator[str]:
+    yield make_term("profile", profile_key(parser))
+    yield make_term("character", parser.character)
+    yield make_term("won", int(parser.won))
+    if parser.summary.killed_by:
+        yield make_term("killed_by", parser.summary.killed_by)
+    yield from parser.summary.terms
+
+def find_runs(*, profile: int | None = None, character: str | None = None, won: bool | None = None, **terms: str | None) -> RunSet:
+    """Return the runs which match every given filter.
+
+    The other keyword arguments are the kinds of terms: relic, card (picked),
+    killed_by, neow and seed. Relics and cards are matched by their internal
+    name. Filters left to None match anything."""
+    index = _view.terms
+    bits = index.everything()
+    if profile is not None:
+        terms["profile"] = profile
+    if character is not None:
+        terms["character"] = character
+    if won is not None:
+        terms["won"] = int(won)
+    for kind, value in terms.items():
+        if value is not None:
+            bits &= index.get(make_term(kind, value))
+    return RunSet(index, bits)
+
+def _ingest(parser: RunParser | Run2Parser, *, update_streaks: bool = True):
+    """Add a freshly-parsed run to the caches and link it with its neighbours."""
+    _add_to_caches(parser)
+    runs = _profile_runs.setdefault(profile_key(parser), RunIndex())
+    _link_run(parser, runs, runs.insert(parser))
+    if update_streaks:
+        _update_streaks(parser, runs)
+
+def _restore(restored: list[tuple[RunParser | Run2Parser, dict[str, str]]]):
+    """Add runs from the snapshot to the caches, with their neighbours as they were saved."""
+    restored.sort(key=lambda x: x[0].epoch)
+    for parser, links in restored:
+        _add_to_caches(parser)
+        _profile_runs.setdefault(profile_key(parser), RunIndex()).insert(parser)
+    for parser, links in restored:
+        for attr, name in links.items():
+            setattr(parser.matched, attr, _cache[name])
+
+def _refresh_folder(path: str, cls: type[RunParser | Run2Parser], profile: int) -> list[RunParser | Run2Parser]:
+    """Index the runs that arrived in a profile folder since we last looked."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return []
+
+    state = _folders.setdefault(path, _FolderState())
+    if state.mtime == mtime: # nothing was added or removed
+        return []
+
+    with os.scandir(path) as it:
+        entries = {entry.name: entry for entry in it if entry.is_file()}
+
+    records = _snapshot.pop(path, {})
+    restored: list[tuple[RunParser | Run2Parser, dict[str, str]]] = []
+    to_parse: list[str] = []
+    added: list[RunParser | Run2Parser] = []
+    for file in sorted(entries.keys() - state.files.keys()):
+        st = entries[file].stat()
+        state.files[file] = (st.st_size, st.st_mtime_ns)
+        if file in _cache: # /sync/run already ingests its own runs
+            added.append(_cache[file])
+            continue
+        record = records.get(file)
+        if record is not None and (record["size"], record["mtime"]) == state.files[file]:
+            try:
+                parser = cls(file, profile, None, summary=RunSummary(**record["summary"]))
+            except TypeError: # the summary fields changed
+                pass
+            else:
+                restored.append((parser, record["links"]))
+                continue
+        to_parse.append(file)
+
+    parsed: list[RunParser | Run2Parser] = []
+    for parser in _parse_runs(cls, path, to_parse, profile):
+        if parser._payload is not None: # keep the memory in check while parsing a large folder
+            _loaded.add(parser, state.files[parser.filename][0])
+        parsed.append(parser)
+
+    if len(restored) == len(records): # the saved links are all still valid
+        _restore(restored)
+    else: # something was modified or removed; link them again from scratch
+        parsed.extend(x[0] for x in restored)
+        restored.clear()
+    parsed.sort(key=lambda x: x.epoch)
+    # a run that was just received only changes the streaks of the wins around it
+    incremental = len(parsed) == 1 and not restored
+    for parser in parsed:
+        _ingest(parser, update_streaks=incremental)
+
+    state.mtime = mtime
+    new = [x[0] for x in restored] + parsed
+    if new and not incremental: # a single pass over the profile is cheaper than updating around every run
+        _compute_streaks(_profile_runs[profile_key(new[0])])
+    added.extend(new)
+    return added
+
+def _parse_runs(cls: type[RunParser | Run2Parser], path: str, files: list[str], profile: int) -> Iterator[RunParser | Run2Parser]:
+    """Read and parse run files, in order.
+
+    With enough files, they are decoded in worker processes, which only
+    send back what the summary needs; the rest is loaded when used. Linking
+    the runs together is left to the caller, on the main thread."""
+    workers = config.server.runs.ingest_workers
+    if workers < 2 or len(files) < _MIN_PARALLEL_FILES:
+        for file in files:
+            with open(os.path.join(path, file), "rb") as f:
+                yield cls(file, profile, json.loads(f.read()))
+        return
+
+    paths = [os.path.join(path, file) for file in files]
+    with ProcessPoolExecutor(workers) as pool:
+        headers = pool.map(read_run_header, paths, repeat(cls._header_keys), chunksize=32)
+        for file, header in zip(files, headers):
+            parser = cls(file, profile, header)
+            parser._unload() # this isn't the full data
+            yield parser
+
+def _load_snapshot():
+    """Load the saved run index, if it exists and is usable.
+
+    The file has a header line, then a line for each run record. When a
+    run changes, its new record is added at the end, and the last one wins."""
+    global _snapshot_size
+    _snapshot_size = None
+    records: dict[str, dict[str, dict[str, Any]]] = {}
+    count = 0
+    try:
+        with open(_SNAPSHOT_FILE) as f:
+            if json.loads(f.readline()).get("version") != _SNAPSHOT_VERSION:
+                return
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError: # cut short while being written; everything after this is lost
+                    count = None
+                    break
+                records.setdefault(record.pop("folder"), {})[record.pop("file")] = record
+                count += 1
+    except (OSError, ValueError):
+        return
+    _snapshot.clear()
+    _snapshot.update(records)
+    _snapshot_size = count
+
+def _snapshot_record(parser: RunParser | Run2Parser) -> str | None:
+    path = os.path.dirname(parser._filepath)
+    state = _folders.get(path)
+    if state is None or parser.filename not in state.files:
+        return None
+    size, mtime = state.files[parser.filename]
+    return json.dumps({
+        "folder": path,
+        "file": parser.filename,
+        "size": size,
+        "mtime": mtime,
+        "summary": parser.summary._asdict(),
+        "links": {k: v.filename for k, v in vars(_links(parser)).items() if v is not None},
+    })
+
+def _write_snapshot(changed: list[RunParser | Run2Parser]):
+    """Save the runs which changed to disk, so that the next startup doesn't need to parse every run.
+
+    Their records are added to the end of the file, so this only costs as
+    much as what changed. Once the file has more old records than current
+    ones, it's written again from scratch."""
+    global _snapshot_size
+    if _snapshot_size is not None and _snapshot_size <= 2 * len(_cache):
+        lines = [x for x in map(_snapshot_record, changed) if x is not None]
+        with open(_SNAPSHOT_FILE, "a") as f:
+            f.writelines(f"{x}\n" for x in lines)
+        _snapshot_size += len(lines)
+        return
+
+    lines = [x for x in map(_snapshot_record, _cache.values()) if x is not None]
+    tmp = f"{_SNAPSHOT_FILE}.tmp"
+    with open(tmp, "w") as f:
+        f.write(f"{json.dumps({'version': _SNAPSHOT_VERSION})}\n")
+        f.writelines(f"{x}\n" for x in lines)
+    os.replace(tmp, _SNAPSHOT_FILE)
+    _snapshot_size = len(lines)
+
+def _build_view() -> _CacheView:
+    """Return a new view of the current state, for the handlers."""
+    profiles = dict(_view.profiles)
+    for key in _dirty:
+        profiles[key] = _profile_runs[key].copy()
+    _dirty.clear()
+    return _CacheView(MappingProxyType(profiles), MappingProxyType(dict(_latest)), MappingProxyType(dict(_names)), _terms.copy())
+
+def _apply_links(links: dict[RunParser | Run2Parser, RunLinkedListNode]):
+    for parser, node in links.items():
+        parser.matched = node
+
+def _get_run_index(profile: int) -> RunIndex | None:
+    return _view.profiles.get(profile)
+
+def get_all_runs() -> Iterator[RunParser | Run2Parser]:
+    """Iterate over every run, from every profile."""
+    for runs in _view.profiles.values():
+        yield from runs
+
+def _reset_cache():
+    """Forget about every run, as if the server just started."""
+    global _stats_loaded, _view, _wake, _terms, _snapshot_size
+    _cache.clear()
+    _ts_cache.clear()
+    _names.clear()
+    _missing.clear()
+    _latest.clear()
+    _loaded.clear()
+    _folders.clear()
+    _profile_runs.clear()
+    _snapshot.clear()
+    _snapshot_size = None
+    _dirty.clear()
+    _relinked.clear()
+    _stale.clear()
+    _counted.clear()
+    _mastery_stats.clear() # these are kept when runs come in out of order, so forget them too
+    _view = _CacheView(MappingProxyType({}), MappingProxyType({}), MappingProxyType({}), TermIndex())
+    _terms = TermIndex()
+    _wake = asyncio.Event()
+    _waiters.clear()
+    _stats_loaded = False
+
+def _count_stats(profiles: Mapping[int, RunIndex]) -> dict[int, _ProfileStats]:
+    """Count the statistics of every profile which changed, into new objects.
+
+    Runs usually come in newest last, so each new run is added to copies of
+    the run stats, masteries, streaks and pick rates of its profile. If one
+    came in between runs which were already counted, the streaks of the
+    runs after it changed, so the stats of that profile are counted again."""
+    counted = {}
+    for key, index in profiles.items():
+        if not len(index):
+            continue
+        count, last = _counted.get(key, (0, None))
+        if count == len(index) and index.runs[-1] is last:
+            continue # nothing new
+        start = 0
+        if count and count < len(index) and index.runs[count - 1] is last:
+            start = count
+        counted[key] = _ProfileStats(
+            index,
+            update_run_stats(key, index, start),
+            update_mastery_stats(key, index, start),
+            update_streak_collections(key, index, start),
+            update_pick_rates(key, index, start),
+        )
+    return counted
+
+def _prepare_update() -> _Update | None:
+    """Pick up new run files from disk, and build everything that changes with them.
+
+    Nothing the handlers can see is changed here, so this can run in a
+    thread. Return None if there was nothing new."""
     start = time.time()
-    for i in range(2):
-        _pf = "runs"
-        cls = RunParser
-        if i == 1:
-            _pf = "runs2"
-            cls = Run2Parser
-        for path, folders, files in os.walk(os.path.join("data", _pf)):
-            for folder in folders:
-                profile = int(folder)
-                _cur_cache: dict[int, RunParser | Run2Parser] = {}
-                for p1, d1, f1 in os.walk(os.path.join(path, folder)):
-                    for file in f1:
-                        if file in _cache:
-                            parser = _cache[file]
-                        else:
-                            with open(os.path.join(p1, file)) as f:
-                                _cache[file] = parser = cls(file, profile, json.load(f))
-                                _ts_cache[parser.epoch] = parser
-                        _cur_cache[parser.epoch] = parser
-
-                prev = None
-                prev_char: dict[str, RunParser | Run2Parser | None] = {}
-                prev_win = None
-                prev_loss = None
-
-                for t in sorted(_cur_cache):
-                    cur = _cur_cache[t]
-                    if prev is not None:
-                        if cur.matched.prev is None:
-                            prev.matched.next = cur
-                            cur.matched.prev = prev
-                        if cur.character not in prev_char:
-                            prev_char[cur.character] = None
-                        if cur.matched.prev_char is None and (c := prev_char[cur.character]) is not None:
-                            c.matched.next_char = cur
-                            cur.matched.prev_char = c
-                        prev_char[cur.character] = cur
-                        if cur.won:
-                            if cur.matched.prev_win is None and prev_win is not None:
-                                prev_win.matched.next_win = cur
-                                cur.matched.prev_win = prev_win
-                            prev_win = cur
-                        else:
-                            if cur.matched.prev_loss is None and prev_loss is not None:
-                                prev_loss.matched.next_loss = cur
-                                cur.matched.prev_loss = prev_loss
-                            prev_loss = cur
-                    prev = cur
-
-    update_all_run_stats()
-    update_mastery_stats()
-    update_streak_collections()
-
-    # I don't actually know how long this cache updating is going to take...
-    # I think it's as optimized as I could make it while still being safe,
-    # but it's possible it still takes some time. I'm not going to focus on
-    # that for now, but logging the update time everytime, in case it turns
-    # out to be a bottleneck. We only want to actually update new runs.
-    logger.info(f"Updated run parser cache in {time.time() - start}s")
+    added = []
+    while _stale:
+        path = _stale.pop()
+        if path in _folders:
+            _folders[path].mtime = None
+    for cls in (RunParser, Run2Parser):
+        base = os.path.join("data", cls.folder)
+        try:
+            folders = sorted(x.name for x in os.scandir(base) if x.is_dir())
+        except OSError:
+            continue
+        for folder in folders:
+            added.extend(_refresh_folder(os.path.join(base, folder), cls, int(folder)))
+
+    if not added and _stats_loaded:
+        return None # nothing new, don't bother
+
+    view = _build_view() # the stats are built from the new view
+    stats = _count_stats(view.profiles)
+    if _relinked: # the runs which were just linked are the only ones whose record changed
+        _write_snapshot(list(_relinked))
+    links = dict(_relinked)
+    _relinked.clear()
+
+    logger.info(f"Updated run parser cache with {len(added)} new runs in {time.time() - start}s")
+    return _Update(added, view, links, stats, _loaded.take_evicted())
+
+def _apply(update: _Update):
+    """Make an update visible to the handlers. This must run on the event loop."""
+    global _view, _stats_loaded
+    _apply_links(update.links)
+    _view = update.view
+    publish_run_stats({key: x.run_stats for key, x in update.stats.items()})
+    publish_mastery_stats({key: x.mastery for key, x in update.stats.items()})
+    publish_streak_collections({key: x.streaks for key, x in update.stats.items()})
+    publish_pick_rates({key: x.pick_rates for key, x in update.stats.items()})
+    for key, x in update.stats.items():
+        _counted[key] = (len(x.index), x.index.runs[-1])
+    _loaded.unload(update.evicted)
+    _stats_loaded = True
+
+def _update_cache() -> list[RunParser | Run2Parser]:
+    """Pick up new run files from disk, and return the runs that were added."""
+    update = _prepare_update()
+    if update is None:
+        return []
+    _apply(update)
+    return update.added
 
 @router.get("/runs")
 @catch_error
@@ -478,15 +1170,12 @@ async def pick_profile(req: Request):
     return convert_class_to_obj(ProfilesResponse(profiles))
 
 def get_parser(name) -> RunParser | Run2Parser | None:
-    parser = _cache.get(f"{name}.run") # most common case
-    if parser is None:
-        _update_cache()
-        parser = _cache.get(f"{name}.run") # try again, just in case
-        if parser is None: # okay, iterate through everything
-            for run_parser in _cache.values():
-                if run_parser.name == name:
-                    parser = run_parser
-                    break
+    parser = _view.names.get(name)
+    if parser is None and name not in _missing:
+        if len(_missing) >= _MAX_MISSING: # don't let random URLs fill up the memory
+            _missing.clear()
+        _missing.add(name)
+        _request_update() # it might be on the disk already; it'll be there next time
 
     return parser
 
@@ -542,48 +1231,102 @@ async def run_chart(req: Request) -> Response:
 
     return parser.graph(req)
 
-#@router.get("/compare/view")
+_COMPARE_PAGE_SIZE = 50
+_COMPARE_MAX_PAGE_SIZE = 200
+
+def _internal_name(name: str, kind: str) -> str:
+    """Return the internal name of a card or relic, so it can be given by name as well."""
+    info = query(name)
+    if info is not None and info.cls_name == kind:
+        return info.internal
+    return name
+
+def _compare_runs(params: MultiMapping[str], url: URL) -> dict[str, Any]:
+    """Filter the runs from the indexes, and return the context for one page of results.
+
+    The page starts after the run at 'cursor' (newest first), given as the
+    time it finished and its name, so that runs which finished at the same
+    time aren't skipped. The summary is over every matching run, not only
+    the current page."""
+    try:
+        start = int(params.get("start", 0))
+        end = int(params.get("end", time.time()))
+        score = int(params.get("score", 0))
+        limit = int(params.get("limit", _COMPARE_PAGE_SIZE))
+        cursor = params.get("cursor")
+        if cursor is not None:
+            epoch, _, name = cursor.partition(":")
+            cursor = (-int(epoch), name)
+        profile = params.get("profile")
+        if profile is not None:
+            profile = int(profile)
+    except ValueError:
+        raise HTTPForbidden(reason="'start', 'end', 'score', 'limit', 'cursor' and 'profile' params must be integers if present")
+    limit = max(1, min(limit, _COMPARE_MAX_PAGE_SIZE))
+
+    chars = params.getall("character", [])
+    victory = _falsey(params.get("victory"))
+    loss = _falsey(params.get("loss"))
+    relics = params.getall("relic", [])
+    cards = params.getall("card", [])
+
+    index = _view.terms
+    bits = index.everything()
+    if profile is not None:
+        bits &= index.get(make_term("profile", profile))
+    if chars:
+        bits &= index.any_of(make_term("character", char.capitalize()) for char in chars)
+    if not victory:
+        bits &= ~index.get(make_term("won", 1))
+    if not loss:
+        bits &= ~index.get(make_term("won", 0))
+    for relic in relics:
+        bits &= index.get(make_term("relic", _internal_name(relic, "relic")))
+    for card in cards:
+        bits &= index.get(make_term("card", _internal_name(card, "card")))
+
+    ids = RunSet(index, bits).select(start=start, end=end, min_score=score)
+    count = len(ids)
+    wins = sum(index.won[i] for i in ids)
+
+    pos = 0
+    if cursor is not None: # skip everything up to and including the cursor
+        pos = bisect.bisect_right(ids, cursor, key=lambda i: (-index.epochs[i], index.runs[i].name))
+    page = ids[pos:pos+limit]
+    next_url = None
+    if pos + limit < count:
+        last = index.runs[page[-1]]
+        next_url = str(url.update_query(cursor=f"{last.epoch}:{last.name}"))
+
+    return {
+        "runs": [index.runs[i] for i in page],
+        "count": count,
+        "wins": wins,
+        "winrate": wins / count if count else 0.0,
+        "average_floor": sum(index.floors[i] for i in ids) / count if count else 0.0,
+        "average_score": sum(index.scores[i] for i in ids) / count if count else 0.0,
+        "first": str(url.without_query_params("cursor")) if cursor is not None else None,
+        "next": next_url,
+    }
+
+@router.get("/compare/view")
 @catch_error
 @aiohttp_jinja2.template("compare_single.jinja2")
 async def compare_runs(req: Request):
-    context = {}
-    try:
-        start = int(req.query.get("start", 0))
-        end = int(req.query.get("end", time.time()))
-        score = int(req.query.get("score", 0))
-    except ValueError:
-        raise HTTPForbidden(reason="'start', 'end', 'score' params must be integers if present")
-
-    chars = req.query.getall("character", [])
-    victory = _truthy(req.query.get("victory"))
-    loss = _falsey(req.query.get("loss"))
-    relics = req.query.getall("relic", [])
-    cards = req.query.getall("card", [])
-
-    return context
+    return _compare_runs(req.query, req.rel_url)
 
 @router.post("/sync/run")
 @catch_error
 async def receive_run(req: Request) -> Response:
     content, name, profile, version = await get_req_data(req, "run", "name", "profile", "version")
 
-    if version == "1":
-        with open(os.path.join("data", "runs", profile, name), "w") as f:
-            f.write(content)
-        data = json.loads(content)
-        if name not in _cache:
-            _cache[name] = parser = RunParser(name, int(profile), data)
-            _ts_cache[parser.epoch] = parser
-            _update_cache()
-
-    elif version == "2":
-        with open(os.path.join("data", "runs2", profile, name), "w") as f:
+    cls = {"1": RunParser, "2": Run2Parser}.get(version)
+    if cls is not None:
+        path = os.path.join("data", cls.folder, profile)
+        with open(os.path.join(path, name), "w") as f:
             f.write(content)
-        data = json.loads(content)
-        if name not in _cache:
-            _cache[name] = parser = Run2Parser(name, int(profile), data)
-            _ts_cache[parser.epoch] = parser
-            _update_cache()
+        _stale.add(path) # in case the folder's modification time doesn't change
+        await _wait_for_update()
 
     logger.debug(f"Received run history file. Updated data. Transaction time: {time.time() - float(req.query['start'])}s")
 
@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Callable
 
 import datetime
 import base64
@@ -65,10 +65,19 @@ class Savefile(FileParser):
         self._last = time.time()
         self._matches = False
         self._activemods = None
-        
+        self._generation = 0 # goes up every time the data is updated
+        self._memo: dict[str, tuple[int, Any]] = {}
+
     def __str__(self):
         return "SAVEFILE"
 
+    def _memoized(self, name: str, compute: Callable[[], Any]) -> Any:
+        """Return the result of compute, only calling it again once the data was updated."""
+        found = self._memo.get(name)
+        if found is None or found[0] != self._generation:
+            found = self._memo[name] = (self._generation, compute())
+        return found[1]
+
     def update_data(self, data: dict[str, Any] | None, character: str, has_run: str):
         """Update all the data for the current run.
 
@@ -89,6 +98,7 @@ class Savefile(FileParser):
                 self._matches = True
 
         self._data = data
+        self._generation += 1
         self._graph_cache.clear()
         if not character:
             self._last = time.time()
@@ -100,6 +110,11 @@ class Savefile(FileParser):
             self._character = character
             if "path" in self._cache:
                 self._cache["old_path"] = self._cache.pop("path")
+            self._cache.pop("floors", None)
+            self._cache.pop("relic_nodes", None)
+            self._cache.pop("relics_obtained", None)
+            self._cache.pop("floor_events", None)
+            self._cache.pop("potion_logs", None)
             self._cache.pop("relics", None) # because N'loth and Boss relic starter upgrade, we need to regen it everytime
 
     @property
@@ -201,18 +216,21 @@ class Savefile(FileParser):
     def current_gold(self) -> int:
         return self._data["gold"]
 
+    @property
+    def _relic_ids(self) -> frozenset[str]:
+        """The relics we have, by internal name, to check if we have one."""
+        return self._memoized("relic_ids", lambda: frozenset(self._data["relics"]))
+
     @property
     def current_purge(self) -> int:
+        relics = self._relic_ids
+        if "Smiling Mask" in relics:
+            return 50
         base = self._data["purgeCost"]
-        membership = False
-        for relic in self.relics:
-            if relic.name == "Smiling Mask":
-                return 50
-            if relic.name == "Membership Card":
-                base = self._data["purgeCost"] * 0.5
-                membership = True
-            if relic.name == "The Courier" and not membership:
-                base *= 0.8
+        if "Membership Card" in relics: # doesn't stack with The Courier
+            base *= 0.5
+        elif "The Courier" in relics:
+            base *= 0.8
 
         return math.ceil(base)
 
@@ -225,11 +243,11 @@ class Savefile(FileParser):
         m = 1.0
         if self.ascension_level >= 16:
             m += 0.1
-        for relic in self.relics:
-            if relic.name == "Membership Card":
-                m *= 0.5
-            if relic.name == "The Courier":
-                m *= 0.8
+        relics = self._relic_ids
+        if "Membership Card" in relics:
+            m *= 0.5
+        if "The Courier" in relics:
+            m *= 0.8
         cards = [50*m, 75*m, 150*m] # 10% range
         colorless = [90*m, 180*m] # 10%
         relics = [150*m, 250*m, 300*m] # 5%
@@ -255,26 +273,29 @@ class Savefile(FileParser):
 
     @property
     def potion_chance(self) -> int:
-        for relic in self.relics:
-            if relic.name == "White Beast Statue":
-                return 100
-            if relic.name == "Sozu":
-                return 0
+        relics = self._relic_ids
+        if "White Beast Statue" in relics or "Sozu" in relics:
+            for relic in self._data["relics"]: # with both, the one obtained first wins
+                if relic == "White Beast Statue":
+                    return 100
+                if relic == "Sozu":
+                    return 0
         return self._data["potion_chance"] + 40
 
     @property
     def rare_chance(self) -> tuple[float, float, float]:
         base = self._data["card_random_seed_randomizer"]
+        relics = self._relic_ids
         regular = 3
-        if "Busted Crown" in self._data["relics"]:
+        if "Busted Crown" in relics:
             regular -= 2
-        if "Question Card" in self._data["relics"]:
+        if "Question Card" in relics:
             regular += 1
         elites = regular
-        if "Prayer Wheel" in self._data["relics"]:
+        if "Prayer Wheel" in relics:
             regular *= 2
         mult = 1
-        if "Nloth\u0027s Gift" in self._data["relics"]:
+        if "Nloth\u0027s Gift" in relics:
             mult = 3
         # NOTE: This formula is... not very good. I'm not sure that the base is what
         # gets added to the 3% chance, but I'm rolling with it for now. As for that
@@ -304,9 +325,9 @@ class Savefile(FileParser):
                         continue
                 case "Peace Pipe" | "Girya" | "Shovel":
                     if floor > 48 or ((
-                            "Peace Pipe" in self._data["relics"],
-                            "Shovel" in self._data["relics"],
-                            "Girya" in self._data["relics"],
+                            "Peace Pipe" in self._relic_ids,
+                            "Shovel" in self._relic_ids,
+                            "Girya" in self._relic_ids,
                             ).count(True) > 1):
                         continue
             ret.append(relic)
@@ -315,11 +336,12 @@ class Savefile(FileParser):
     def available_relic(self, relic: Relic) -> bool:
         """Return True if the relic can be acquired still this run."""
         if relic.tier in ("Common", "Uncommon", "Shop"):
-            return relic.internal in self._data[f"{relic.tier.lower()}_relics"]
+            key = f"{relic.tier.lower()}_relics"
+            return relic.internal in self._memoized(key, lambda: frozenset(self._data[key]))
         if relic.tier != "Rare": # just in case
             raise ValueError("Relic rarity can only be Common, Uncommon, Rare, or Shop.")
 
-        return relic.internal in self._available_rare_relics
+        return relic.internal in self._memoized("rare_relics", lambda: frozenset(self._available_rare_relics))
 
     @property
     def upcoming_boss(self) -> str:
@@ -353,35 +375,16 @@ class Savefile(FileParser):
 
     @property
     def score(self) -> int:
-        return sum(bonus.score_bonus for bonus in self._get_score_bonuses())
+        return self._memoized("score", lambda: sum(bonus.score_bonus for bonus in self._get_score_bonuses()))
 
     @property
     def score_breakdown(self) -> list[str]:
-        return [bonus.full_display for bonus in self._get_score_bonuses() 
-                        if bonus.should_show or bonus.score_bonus != 0]
+        return list(self._memoized("score_breakdown", lambda: [
+            bonus.full_display for bonus in self._get_score_bonuses()
+                if bonus.should_show or bonus.score_bonus != 0]))
 
     def _get_score_bonuses(self) -> list[_s.Score]:
-        score_bonuses: list[_s.Score] = []
-        score_bonuses.append(_s.get_floors_climbed_bonus(self))
-        score_bonuses.append(_s.get_enemies_killed_bonus(self))
-        score_bonuses.append(_s.get_act1_elites_killed_bonus(self))
-        score_bonuses.append(_s.get_act2_elites_killed_bonus(self))
-        score_bonuses.append(_s.get_act3_elites_killed_bonus(self))
-        score_bonuses.append(_s.get_champions_bonus(self))
-        score_bonuses.append(_s.get_bosses_slain_bonus(self))
-        score_bonuses.append(_s.get_perfect_bosses_bonus(self))
-        score_bonuses.append(_s.get_overkill_bonus(self))
-        score_bonuses.append(_s.get_combo_bonus(self))
-        score_bonuses.append(_s.get_ascension_score_bonus(self))
-        score_bonuses.append(_s.get_collector_bonus(self))
-        score_bonuses.append(_s.get_deck_bonus(self))
-        score_bonuses.append(_s.get_mystery_machine_bonus(self))
-        score_bonuses.append(_s.get_shiny_bonus(self))
-        score_bonuses.append(_s.get_max_hp_bonus(self))
-        score_bonuses.append(_s.get_gold_bonus(self))
-        score_bonuses.append(_s.get_curses_bonus(self))
-        score_bonuses.append(_s.get_poopy_bonus(self))
-        return score_bonuses
+        return self._memoized("score_bonuses", lambda: _s.get_score_bonuses(self))
 
     @property
     def monsters_killed(self) -> int:
@@ -462,6 +465,7 @@ class Save2(FP2):
 
     def __init__(self):
         super().__init__(None)
+        self._pools: dict[str, frozenset[str]] = {} # the relics still in each grab bag
 
     @property
     def profile(self):
@@ -508,13 +512,17 @@ class Save2(FP2):
         if relic.tier not in ("Common", "Uncommon", "Rare", "Shop"):
             raise ValueError(f"Relic tier is {relic.tier}, not supported.")
 
-        base = self._data["shared_relic_grab_bag"]["relic_id_lists"]
-        pool = base[relic.tier.lower()]
+        tier = relic.tier.lower()
+        pool = self._pools.get(tier)
+        if pool is None:
+            base = self._data["shared_relic_grab_bag"]["relic_id_lists"]
+            pool = self._pools[tier] = frozenset(base[tier])
         name = f"RELIC.{relic.internal}"
         return name in pool
 
     def update_data(self, data: dict):
         self._data = data
+        self._pools.clear()
 
 _save2 = Save2()
 
@@ -27,7 +27,10 @@ class Score:
     def full_display(self) -> str:
         return f'{self._format_string}: {self.score_bonus}'
 
-def get_ascension_score_bonus(save: Savefile) -> Score:
+def get_ascension_score_bonus(save: Savefile, base: list[Score] | None = None) -> Score:
+    """Get a percentage of the base bonuses for each Ascension level.
+
+    The base bonuses may be given, if they were already computed."""
     score = 0
     if save.ascension_level > 0:
         # Only applies to the score from the following bonuses:
@@ -40,21 +43,17 @@ def get_ascension_score_bonus(save: Savefile) -> Score:
         # Beyond Perfect
         # Overkill
         # C-c-c-combo.
-        bonuses_total = sum(bonus.score_bonus for bonus in [
-            get_floors_climbed_bonus(save),
-            get_enemies_killed_bonus(save),
-            get_act1_elites_killed_bonus(save),
-            get_act2_elites_killed_bonus(save),
-            get_act3_elites_killed_bonus(save),
-            get_champions_bonus(save),
-            get_bosses_slain_bonus(save),
-            get_perfect_bosses_bonus(save),
-            get_overkill_bonus(save),
-            get_combo_bonus(save)
-        ])
+        if base is None:
+            base = [bonus(save) for bonus in _BASE_BONUSES]
+        bonuses_total = sum(bonus.score_bonus for bonus in base)
         score = round(bonuses_total * 0.05 * save.ascension_level)
     return Score("Ascension", save.ascension_level, score, should_show=save.ascension_level > 0)
 
+def get_score_bonuses(save: Savefile) -> list[Score]:
+    """Compute every score bonus, in display order, computing each of them only once."""
+    base = [bonus(save) for bonus in _BASE_BONUSES]
+    return base + [get_ascension_score_bonus(save, base)] + [bonus(save) for bonus in _OTHER_BONUSES]
+
 def get_floors_climbed_bonus(save: Savefile) -> Score:
     """Get 5 points for each floor climbed."""
     return Score("Floors Climbed", save.current_floor, 5 * (save.current_floor), should_show=True)
@@ -197,3 +196,29 @@ def get_poopy_bonus(save: Savefile) -> Score:
     if "Spirit Poop" in relics:
         score = -1
     return Score("Poopy", score=score)
+
+# the bonuses which the Ascension bonus is a percentage of
+_BASE_BONUSES = (
+    get_floors_climbed_bonus,
+    get_enemies_killed_bonus,
+    get_act1_elites_killed_bonus,
+    get_act2_elites_killed_bonus,
+    get_act3_elites_killed_bonus,
+    get_champions_bonus,
+    get_bosses_slain_bonus,
+    get_perfect_bosses_bonus,
+    get_overkill_bonus,
+    get_combo_bonus,
+)
+
+# and the ones shown after the Ascension bonus
+_OTHER_BONUSES = (
+    get_collector_bonus,
+    get_deck_bonus,
+    get_mystery_machine_bonus,
+    get_shiny_bonus,
+    get_max_hp_bonus,
+    get_gold_bonus,
+    get_curses_bonus,
+    get_poopy_bonus,
+)
@@ -56,9 +56,10 @@ from src.cache.run_stats import (
     update_range,
 )
 
-from src.cache.mastered import get_current_masteries, get_mastered
-from src.nameinternal import get, query, Base, Card, Relic, RelicSet, _internal_cache
-from src.sts_profile import get_profile, get_current_profile
+from src.cache.mastered import get_current_masteries, get_mastered, get_unmastered
+from src.cache.pick_rates import get_pick_rates
+from src.nameinternal import get, query, Base, Card, Relic, RelicSet
+from src.sts_profile import get_profile, get_current_profile, parse_profile_key
 from src.webpage import router, playlists
 from src.wrapper import wrapper
 from src.monster import query as mt_query, get_savefile as get_mt_save, MonsterSave
@@ -80,7 +81,7 @@ from src.utils import (
 
 from src.disc import DiscordCommand
 from src.save import get_savefile, Savefile
-from src.runs import get_latest_run, RunParser
+from src.runs import get_latest_run, find_runs, RunParser, profile_key
 from src.gamedata import RelicData, Treasure, Event
 
 from src.typehints import ContextType, CommandType, SaveType
@@ -2755,39 +2756,62 @@ async def set_run_stats_by_date(ctx: ContextType, date_string: str):
     await ctx.reply("Run stats have been updated for the given range")
 
 
+_BAD_PROFILE = "Invalid profile. Use p0, p1 or p2 for Spire 1, and p11, p12 or p13 for Spire 2"
+
+
+def _split_profile(args: tuple[str, ...]) -> tuple[int | None, tuple[str, ...]]:
+    """Take a profile selector, such as "p11", off the front of the arguments.
+
+    Raise ValueError if it doesn't name a profile."""
+    if args and args[0][:1] in ("p", "P") and args[0][1:].isdigit():
+        return parse_profile_key(args[0]), args[1:]
+    return None, args
+
+
 @command("kills", "wins")
-async def calculate_wins_cmd(ctx: ContextType, date_string: Optional[str] = None):
-    """Display the cumulative number of wins for an optional date range."""
+async def calculate_wins_cmd(ctx: ContextType, *args: str):
+    """Display the cumulative number of wins for an optional profile and date range."""
     #msg = "A20 Heart kills ({0.date_range_string}): Total: {1.all_character_count} - Ironclad: {1.ironclad_count} - Silent: {1.silent_count} - Defect: {1.defect_count} - Watcher: {1.watcher_count}"
     msg = "Baalor's A10 kills ({0.date_range_string}) | Total: {1.all_character_count} - Ironclad: {1.character_counts[Ironclad]} - Silent: {1.character_counts[Silent]} - Regent: {1.character_counts[Regent]} - Necrobinder: {1.character_counts[Necrobinder]} - Defect: {1.character_counts[Defect]}"
-    await _send_standard_run_stats_message(ctx, msg, "all_wins", date_string)
+    await _send_standard_run_stats_message(ctx, msg, "all_wins", *args)
 
 
 @command("losses")
-async def calculate_losses_cmd(ctx: ContextType, date_string: Optional[str] = None):
-    """Display the cumulative number of losses for an optional date range."""
+async def calculate_losses_cmd(ctx: ContextType, *args: str):
+    """Display the cumulative number of losses for an optional profile and date range."""
     #msg = "A20 Heart losses ({0.date_range_string}): Total: {1.all_character_count} - Ironclad: {1.ironclad_count} - Silent: {1.silent_count} - Defect: {1.defect_count} - Watcher: {1.watcher_count}"
     msg = "Baalor's A10 losses ({0.date_range_string}) | Total: {1.all_character_count} - Ironclad: {1.character_counts[Ironclad]} - Silent: {1.character_counts[Silent]} - Regent: {1.character_counts[Regent]} - Necrobinder: {1.character_counts[Necrobinder]} - Defect: {1.character_counts[Defect]}"
-    await _send_standard_run_stats_message(ctx, msg, "all_losses", date_string)
+    await _send_standard_run_stats_message(ctx, msg, "all_losses", *args)
+
+
+async def _get_run_stats_from_args(ctx: ContextType, args: tuple[str, ...], *, all_time: bool = False):
+    """Return the run stats for an optional profile selector and date range, or None if they were wrong."""
+    try:
+        profile, args = _split_profile(args)
+    except ValueError:
+        await ctx.reply(_BAD_PROFILE)
+        return None
+    if not args:
+        if all_time:
+            return get_all_run_stats(profile)
+        return get_run_stats_by_date(profile=profile)
+    try:
+        return get_run_stats_by_date_string(args[0], profile=profile)
+    except ValueError:
+        await ctx.reply(
+            "Invalid date string or start date was after end date. Use YYYY/MM/DD-YYYY/MM/DD (MM and DD optional), YYYY/MM/DD+ (no end date), YYYY/MM/DD- (no start date)"
+        )
+    except TypeError:
+        await ctx.reply("Start date is after end date")
+    return None
 
 
 async def _send_standard_run_stats_message(
-    ctx: ContextType, msg: str, prop_name: str, date_string: Optional[str] = None
+    ctx: ContextType, msg: str, prop_name: str, *args: str
 ):
-    run_stats = None
-    if date_string is None:
-        run_stats = get_run_stats_by_date()
-    else:
-        try:
-            run_stats = get_run_stats_by_date_string(date_string)
-        except ValueError:
-            await ctx.reply(
-                "Invalid date string or start date was after end date. Use YYYY/MM/DD-YYYY/MM/DD (MM and DD optional), YYYY/MM/DD+ (no end date), YYYY/MM/DD- (no start date)"
-            )
-            return
-        except TypeError:
-            await ctx.reply("Start date is after end date")
-            return
+    run_stats = await _get_run_stats_from_args(ctx, args)
+    if run_stats is None:
+        return
     await ctx.reply(msg.format(run_stats, getattr(run_stats, prop_name)))
 
 
@@ -2825,11 +2849,16 @@ async def streak_display(ctx: ContextType, new: str):
 
 
 @command("streak")
-async def calculate_streak_cmd(ctx: ContextType):
-    """Display Baalor's current streak for Ascension 20 Heart kills."""
+async def calculate_streak_cmd(ctx: ContextType, *args: str):
+    """Display Baalor's current streak for Ascension 20 Heart kills, on an optional profile."""
     if not _display:
         _get_set_display()
-    run_stats = get_all_run_stats()
+    try:
+        profile, _ = _split_profile(args)
+    except ValueError:
+        await ctx.reply(_BAD_PROFILE)
+        return
+    run_stats = get_all_run_stats(profile)
     msg = []
     for i, l in enumerate(_display):
         if l:
@@ -2845,24 +2874,13 @@ async def calculate_streak_cmd(ctx: ContextType):
 
 
 @command("pb")
-async def calculate_pb_cmd(ctx: ContextType, date_string: Optional[str] = None):
-    """Display Baalor's Personal Best streaks for Ascension 20 Heart kills for an optional date range."""
+async def calculate_pb_cmd(ctx: ContextType, *args: str):
+    """Display Baalor's Personal Best streaks for Ascension 20 Heart kills for an optional profile and date range."""
     #msg = "Baalor's PB A20H Streaks ({0.date_range_string}) | Rotating: {1.all_character_count} - Ironclad: {1.ironclad_count} - Silent: {1.silent_count} - Defect: {1.defect_count} - Watcher: {1.watcher_count}"
     msg = "Baalor's PB A10 Streaks ({0.date_range_string}) | Rotating: {1.all_character_count} - Ironclad: {1.character_counts[Ironclad]} - Silent: {1.character_counts[Silent]} - Regent: {1.character_counts[Regent]} - Necrobinder: {1.character_counts[Necrobinder]} - Defect: {1.character_counts[Defect]}"
-    run_stats = None
-    if date_string is None:
-        run_stats = get_all_run_stats()
-    else:
-        try:
-            run_stats = get_run_stats_by_date_string(date_string)
-        except ValueError:
-            await ctx.reply(
-                "Invalid date string or start date was after end date. Use YYYY/MM/DD-YYYY/MM/DD (MM and DD optional), YYYY/MM/DD+ (no end date), YYYY/MM/DD- (no start date)"
-            )
-            return
-        except TypeError:
-            await ctx.reply("Start date is after end date")
-            return
+    run_stats = await _get_run_stats_from_args(ctx, args, all_time=True)
+    if run_stats is None:
+        return
     await ctx.reply(msg.format(run_stats, run_stats.pb))
 
 
@@ -3017,22 +3035,11 @@ async def wongo_points(ctx: ContextType):
     await ctx.reply(f"We have {wongo:,} Wongo points.")
 
 @command("winrate")
-async def calculate_winrate_cmd(ctx: ContextType, date_string: Optional[str] = None):
-    """Display the winrate for Baalor's A20 Heart kills for an optional date range."""
-    run_stats = None
-    if date_string is None:
-        run_stats = get_run_stats_by_date()
-    else:
-        try:
-            run_stats = get_run_stats_by_date_string(date_string)
-        except ValueError:
-            await ctx.reply(
-                "Invalid date string or start date was after end date. Use YYYY/MM/DD-YYYY/MM/DD (MM and DD optional), YYYY/MM/DD+ (no end date), YYYY/MM/DD- (no start date)"
-            )
-            return
-        except TypeError:
-            await ctx.reply("Start date is after end date")
-            return
+async def calculate_winrate_cmd(ctx: ContextType, *args: str):
+    """Display the winrate for Baalor's A20 Heart kills for an optional profile and date range."""
+    run_stats = await _get_run_stats_from_args(ctx, args)
+    if run_stats is None:
+        return
     wins = [run_stats.all_wins.all_character_count] + [run_stats.all_wins.character_counts[c] for c in Character]
     losses = [run_stats.all_losses.all_character_count] + [run_stats.all_losses.character_counts[c] for c in Character]
     rate = [0 if (a + b == 0) else a / (a + b) for a, b in zip(wins, losses)]
@@ -3048,23 +3055,7 @@ async def unmastered(ctx: ContextType, save: SaveType):
         await ctx.reply(save._cache["unmastered"])
         return
 
-    cards = get_mastered().mastered_cards
-
-    final = []
-
-    for value in _internal_cache.values():
-        if value.cls_name != "card":
-            continue
-        value: Card
-        if value.mod is not None:
-            continue
-        if (
-            value.type == "Status" or value.rarity == "Special"
-        ):  # all "special" ones are already mastered
-            continue
-
-        if value.name not in cards:
-            final.append(value.name)
+    final = get_unmastered(save.game_version if save is not None else None)
 
     msg = ""
     if len(final) > 1:
@@ -3082,8 +3073,7 @@ async def unmastered(ctx: ContextType, save: SaveType):
 
 @command("mastered")
 async def mastered_stuff(ctx: ContextType, *card: str):
-    """Tell us whether a certain card or relic is mastered."""
-    mastery_stats = get_mastered()
+    """Tell us whether a certain card or relic is mastered, on an optional profile."""
     # total = (75 * 4) + 39 + 13 # 178 relics
     # chars = {"Red": "Ironclad", "Green": "Silent", "Blue": "Defect", "Purple": "Watcher"}
     # d = defaultdict(dict)
@@ -3093,6 +3083,12 @@ async def mastered_stuff(ctx: ContextType, *card: str):
 
     # msg = ["Current mastery progression:"]
 
+    try:
+        profile, card = _split_profile(card)
+    except ValueError:
+        await ctx.reply(_BAD_PROFILE)
+        return
+
     info = query("".join(card))
     if info is None:
         await ctx.reply(f"Could not find card or relic {' '.join(card)}.")
@@ -3102,6 +3098,11 @@ async def mastered_stuff(ctx: ContextType, *card: str):
         await ctx.reply("We do not attempt to master modded content.")
         return
 
+    if profile is not None and (profile >= 10) != (info.v == 2):
+        await ctx.reply(f"The {info.cls_name} {info.name} is not from the game of this profile.")
+        return
+
+    mastery_stats = get_mastered(info.v, profile=profile)
     match info.cls_name:
         case "card":
             d = mastery_stats.mastered_cards
@@ -3119,6 +3120,120 @@ async def mastered_stuff(ctx: ContextType, *card: str):
         await ctx.reply(f"The {info.cls_name} {info.name} is NOT mastered.")
 
 
+@command("runswith", "withrelic", "withcard")
+async def runs_with(ctx: ContextType, *item: str):
+    """Tell us how often we won after picking a certain card or taking a certain relic, on an optional profile."""
+    try:
+        profile, item = _split_profile(item)
+    except ValueError:
+        await ctx.reply(_BAD_PROFILE)
+        return
+
+    info = query(" ".join(item))
+    if info is None:
+        await ctx.reply(f"Could not find card or relic {' '.join(item)}.")
+        return
+
+    if profile is not None and (profile >= 10) != (info.v == 2):
+        await ctx.reply(f"The {info.cls_name} {info.name} is not from the game of this profile.")
+        return
+
+    match info.cls_name:
+        case "card":
+            verb = "picked"
+        case "relic":
+            verb = "taken"
+        case _:
+            await ctx.reply("Only cards or relics may be looked up.")
+            return
+
+    latest = get_latest_run(None, None)
+    if profile is None and latest is not None and latest.game_version == info.v:
+        profile = profile_key(latest) # only the profile we're currently playing on
+    found = find_runs(profile=profile, **{info.cls_name: info.internal})
+    newest = found.newest()
+    if newest is None:
+        await ctx.reply(f"The {info.cls_name} {info.name} was never {verb} in a run.")
+        return
+
+    await ctx.reply(
+        f"The {info.cls_name} {info.name} was {verb} in {len(found)} runs, winning {found.wins} of them ({found.winrate:.2%}). "
+        f"Latest run: {config.server.url}/runs/{newest.name}"
+    )
+
+
+def _rates_profile(profile: int | None, info) -> int:
+    """Return the profile to count in, if none was given.
+
+    That is the profile of the latest run if it's from the same game as the
+    item, and the first profile of that game otherwise."""
+    if profile is None:
+        latest = get_latest_run(None, None)
+        if latest is not None and latest.game_version == info.v:
+            return profile_key(latest)
+        return 11 if info.v == 2 else 0
+    return profile
+
+
+@command("pickrate")
+async def pick_rate(ctx: ContextType, *item: str):
+    """Tell us how often a card was picked when it was offered, on an optional profile."""
+    try:
+        profile, item = _split_profile(item)
+    except ValueError:
+        await ctx.reply(_BAD_PROFILE)
+        return
+
+    info = query(" ".join(item))
+    if info is None or info.cls_name != "card":
+        await ctx.reply(f"Could not find card {' '.join(item)}.")
+        return
+
+    if profile is not None and (profile >= 10) != (info.v == 2):
+        await ctx.reply(f"The {info.cls_name} {info.name} is not from the game of this profile.")
+        return
+
+    counts = get_pick_rates(_rates_profile(profile, info)).cards.get(info.internal)
+    if not counts["offered"]:
+        await ctx.reply(f"The card {info.name} was never offered in a run.")
+        return
+
+    msg = f"The card {info.name} was offered {counts['offered']} times, and picked {counts['picked']} times ({counts['picked'] / counts['offered']:.2%})."
+    if counts["picked"]:
+        msg += f" {counts['won']} of the picks were in a winning run ({counts['won'] / counts['picked']:.2%})."
+    await ctx.reply(msg)
+
+
+@command("relicrate")
+async def relic_rate(ctx: ContextType, *item: str):
+    """Tell us how often we won with a certain relic, compared to every run, on an optional profile."""
+    try:
+        profile, item = _split_profile(item)
+    except ValueError:
+        await ctx.reply(_BAD_PROFILE)
+        return
+
+    info = query(" ".join(item))
+    if info is None or info.cls_name != "relic":
+        await ctx.reply(f"Could not find relic {' '.join(item)}.")
+        return
+
+    if profile is not None and (profile >= 10) != (info.v == 2):
+        await ctx.reply(f"The {info.cls_name} {info.name} is not from the game of this profile.")
+        return
+
+    rates = get_pick_rates(_rates_profile(profile, info))
+    counts = rates.relics.get(info.internal)
+    if not counts["obtained"]:
+        await ctx.reply(f"The relic {info.name} was never obtained in a run.")
+        return
+
+    await ctx.reply(
+        f"The relic {info.name} was obtained in {counts['obtained']} runs out of {rates.runs}, winning {counts['won']} of them "
+        f"({counts['won'] / counts['obtained']:.2%}, against {rates.wins / rates.runs:.2%} overall)."
+    )
+
+
 @with_savefile("candidates")
 async def current_mastery_check(ctx: ContextType, save: SaveType):
     """Output what cards in the current run can be mastered if won."""
@@ -10,7 +10,6 @@ import os
 import io
 
 from aiohttp.web import Request, Response, HTTPForbidden, HTTPNotFound
-from itertools import islice
 from datetime import datetime
 
 import aiohttp_jinja2
@@ -20,11 +19,12 @@ from src.webpage import router
 from src.logger import logger
 from src.events import add_listener
 from src.utils import get_req_data, catch_error
+from src.cache.cache_helpers import RunIndex
 
 if TYPE_CHECKING: # circular imports otherwise
     from src.runs import RunParser
 
-__all__ = ["get_profile", "get_current_profile"]
+__all__ = ["get_profile", "get_current_profile", "parse_profile_key"]
 
 _profiles: dict[int, Profile] = {}
 _slots: dict[str, str] = {}
@@ -32,6 +32,9 @@ _slots: dict[str, str] = {}
 # TODO: track this depending on which game was last played (save/run files)
 _SPIRE_2 = True
 
+# every profile there can be; Spire 2 profiles are offset by 10
+_PROFILE_KEYS = (0, 1, 2, 11, 12, 13)
+
 def get_profile(x: int, v: int) -> Profile:
     if v == 1:
         return _profiles.get(x, None)
@@ -39,6 +42,18 @@ def get_profile(x: int, v: int) -> Profile:
         return _profiles.get(x + 10, None)
     raise ValueError(v)
 
+def parse_profile_key(value: str) -> int:
+    """Turn a profile selector, such as "p0" or "11", into a profile key.
+
+    The keys are the same as in the URLs, so Spire 2 profiles are offset by 10.
+    Raise ValueError if it doesn't name a profile."""
+    if value[:1] in ("p", "P"):
+        value = value[1:]
+    key = int(value)
+    if key not in _PROFILE_KEYS:
+        raise ValueError(f"There is no profile {key}")
+    return key
+
 def get_current_profile() -> Profile:
     slot = int(_slots["DEFAULT_SLOT"])
     if _SPIRE_2: # basically always true, for now
@@ -120,27 +135,29 @@ class Profile:
         except KeyError:
             return 0
 
+    @property
+    def run_index(self) -> RunIndex:
+        """The sorted index of all runs from this profile."""
+        from src.runs import _get_run_index
+        index = _get_run_index(self.profile_index)
+        if index is None:
+            return RunIndex()
+        return index
+
     @property
     def runs(self) -> Generator[RunParser, None, None]:
         """Return all runs from the matching profile, newest first."""
-        from src.runs import _ts_cache
-        l = list(_ts_cache)
-        l.sort()
-        l.reverse()
-        for ts in l:
-            if _ts_cache[ts].profile is self:
-                yield _ts_cache[ts]
+        yield from reversed(self.run_index.runs)
 
     def paged_runs(self, page):
         page -= 1 # UI serves the page number one-indexed, we want zero-indexed
         start = page * self.RUNS_PER_PAGE
         end = start + self.RUNS_PER_PAGE
-        print(page, start, end)
-        return islice(self.runs, start, end)
+        return self.run_index.newest(start, end)
 
     @property
     def pages(self):
-        return math.floor(sum(1 for _ in self.runs) / self.RUNS_PER_PAGE) + 1
+        return math.floor(len(self.run_index) / self.RUNS_PER_PAGE) + 1
 
 @router.get("/profile/{profile}/runs")
 @router.get("/profile/{profile}/runs/{page}")
@@ -149,9 +166,6 @@ class Profile:
 async def runs_page(req: Request):
     profile = profile_from_request(req)
 
-    from src.runs import _update_cache
-    _update_cache()
-
     try:
         page = int(req.match_info.get("page", 1))
         if page < 1:
@@ -170,8 +184,6 @@ async def runs_page(req: Request):
 @aiohttp_jinja2.template("runs_timestamp.jinja2")
 async def runs_by_timestamp(req: Request):
     profile = profile_from_request(req)
-    from src.runs import _update_cache
-    _update_cache()
     try:
         timestamp = req.match_info.get("timestamp", "")
         start, _, end = timestamp.partition("..")
@@ -179,15 +191,9 @@ async def runs_by_timestamp(req: Request):
         end = int(end) if end else time.time()
     except ValueError:
         raise HTTPForbidden(reason="Timestamp must be integers if given.")
-    has_runs = False
 
-    runs = []
-    for run in profile.runs:
-        if start <= run.timestamp.timestamp() <= end:
-            runs.append(run)
-            has_runs = True
-
-    if not has_runs:
+    runs = profile.run_index.between(start, end)
+    if not runs:
         raise HTTPForbidden(reason="No run file matches the given range.")
 
     return {
@@ -202,8 +208,6 @@ async def runs_by_timestamp(req: Request):
 @catch_error
 async def runs_as_zipfile(req: Request) -> Response:
     profile = profile_from_request(req)
-    from src.runs import _update_cache
-    _update_cache()
     try:
         timestamp = req.match_info.get("timestamp", "")
         if timestamp not in ("all", "runs"):
@@ -215,20 +219,14 @@ async def runs_as_zipfile(req: Request) -> Response:
             end = time.time()
     except ValueError:
         raise HTTPForbidden(reason="Timestamp must be integers if given.")
-    has_file = False
+    runs = profile.run_index.between(start, end)
+    if not runs:
+        raise HTTPForbidden(reason="No run file matches the given range.")
 
     with io.BytesIO() as zfile:
         with zipfile.ZipFile(zfile, mode="w") as archive:
-            rf = "runs"
-            if profile.profile_index > 10:
-                rf = "runs2"
-            for run in profile.runs:
-                if start <= run.timestamp.timestamp() <= end:
-                    archive.write(f"data/{rf}/{profile.index_safe}/{run.filename}")
-                    has_file = True
-
-        if not has_file:
-            raise HTTPForbidden(reason="No run file matches the given range.")
+            for run in runs:
+                archive.write(run._filepath)
         return Response(body=zfile.getvalue(), content_type="application/zip")
 
 @router.post("/sync/profile")
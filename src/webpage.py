@@ -80,11 +80,22 @@ class ChallengeCharacter:
         self.losses = losses
         self.streak = streak
 
+def _profile_from_query(req: web.Request) -> int | None:
+    """Return the profile picked with ?profile=, if any."""
+    from src.sts_profile import parse_profile_key # circular imports otherwise
+    value = req.query.get("profile")
+    if value is None:
+        return None
+    try:
+        return parse_profile_key(value)
+    except ValueError:
+        raise web.HTTPNotFound()
+
 @router.get("/400")
 @aiohttp_jinja2.template("400.jinja2")
 async def challenge(req: web.Request):
     from src.cache.run_stats import get_all_run_stats, Character # TODO: Fix circular imports with router
-    run_stats = get_all_run_stats()
+    run_stats = get_all_run_stats(_profile_from_query(req))
     kills = [run_stats.all_wins.character_counts[Character.IRONCLAD], run_stats.all_wins.character_counts[Character.SILENT], run_stats.all_wins.character_counts[Character.DEFECT], run_stats.all_wins.character_counts[Character.WATCHER]]
     losses = [run_stats.all_losses.character_counts[Character.IRONCLAD], run_stats.all_losses.character_counts[Character.SILENT], run_stats.all_losses.character_counts[Character.DEFECT], run_stats.all_losses.character_counts[Character.WATCHER]]
     streak = [run_stats.streaks.character_counts[Character.IRONCLAD], run_stats.streaks.character_counts[Character.SILENT], run_stats.streaks.character_counts[Character.DEFECT], run_stats.streaks.character_counts[Character.WATCHER]]
@@ -121,12 +132,10 @@ async def challenge(req: web.Request):
 @router.get("/streaking")
 @aiohttp_jinja2.template("streaking.jinja2")
 async def streaking(req: web.Request):
-    from src.cache.streaks import _streak_collections
-    from src.runs import _update_cache
-    _update_cache()
+    from src.cache.streaks import get_streak_collections
 
     return {
-        "streaks": _streak_collections.containers,
+        "streaks": get_streak_collections(_profile_from_query(req)).containers,
     }
 
 @router.get("/youtube")
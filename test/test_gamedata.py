@@ -1792,6 +1792,40 @@ class TestSavefile(TestCase):
         self.assertEqual(s.current_gold, 85)
         self.assertEqual(sm.current_gold, 77)
 
+    def test_score(self):
+        self.assertEqual(sm.score, 1466)
+        bonuses = sm._get_score_bonuses()
+        self.assertEqual(len(bonuses), 19)
+        self.assertEqual(bonuses[10].score_bonus, 708) # Ascension
+        self.assertIs(sm._get_score_bonuses(), bonuses) # not computed again
+
+    def test_score_update(self):
+        save = Savefile(_debug=True)
+        with (base / "save_matched.json").open() as f:
+            data = json.load(f)
+        save.update_data(data, "IRONCLAD", "false")
+        bonuses = save._get_score_bonuses()
+        save.update_data(data, "IRONCLAD", "false")
+        self.assertIsNot(save._get_score_bonuses(), bonuses)
+        self.assertEqual(save.score, sm.score)
+
+    def test_relic_helpers(self):
+        self.assertEqual(sm.current_purge, 125)
+        self.assertEqual(sm.potion_chance, 50)
+        self.assertEqual(sm._relic_ids, frozenset(sm._data["relics"]))
+        self.assertIs(sm._relic_ids, sm._relic_ids) # not built again
+
+    def test_potion_chance_order(self):
+        save = Savefile(_debug=True)
+        with (base / "save_matched.json").open() as f:
+            data = json.load(f)
+        data["relics"] = data["relics"] + ["White Beast Statue", "Sozu"]
+        save.update_data(data, "IRONCLAD", "false")
+        self.assertEqual(save.potion_chance, 100)
+        data["relics"] = data["relics"][:-2] + ["Sozu", "White Beast Statue"]
+        save.update_data(data, "IRONCLAD", "false")
+        self.assertEqual(save.potion_chance, 0)
+
 class TestRunParser(TestCase):
     def test_won(self):
         self.assertTrue(wa.won)
@@ -1828,6 +1862,13 @@ class TestRelicData(TestCase):
             self.assertEqual(s_relic.description(), f"Obtained on floor {floor}{details}")
             self.assertEqual(s_relic.relic, r_relic.relic)
 
+    def test_obtained_nodes(self):
+        for relic in rm.relics:
+            nodes = [node for node in rm.path if relic.relic in node.relics]
+            self.assertIs(rm._relic_nodes.get(relic.relic), nodes[-1] if nodes else None)
+        rm.neow_bonus.relics.append(None) # nodes hand out copies
+        self.assertNotIn(None, rm.neow_bonus.relics)
+
 class TestPath(TestCase):
     def test_length(self):
         self.assertEqual(len(s.path), 45)
@@ -1840,6 +1881,37 @@ class TestPath(TestCase):
         self.assertEqual(streamer.path[8].floor, 9)
         self.assertEqual(streamer.path[9].floor, 11)
 
+    def test_cached(self):
+        self.assertIs(wa.path, wa.path)
+        self.assertIsInstance(wa.path, tuple)
+
+    def test_slots(self):
+        # nodes, relics and cards are kept around for every run, so they shouldn't carry a __dict__
+        for parser in (s, wa, r2):
+            for item in (*parser.path, *parser.relics, *parser.get_cards()):
+                self.assertNotIn("__dict__", dir(type(item)))
+
+    def test_get_floor(self):
+        self.assertIs(wa.get_floor(0), wa.neow_bonus)
+        for node in wa.path:
+            self.assertIs(wa.get_floor(node.floor), node)
+        self.assertIsNone(streamer.get_floor(10)) # skipped by the boss pick
+
+    def test_floor_events(self):
+        events = wa._floor_events
+        self.assertIs(wa._floor_events, events) # gathered once
+        picked, skipped = wa.card_choices
+        for node in wa.path:
+            self.assertEqual(node.picked, picked[node.floor])
+            self.assertEqual(node.skipped, skipped[node.floor])
+            self.assertEqual(node.used_potions, wa.potions_use[node.floor])
+
+    def test_potion_logs(self):
+        self.assertIs(s.potions_use, s.potions_use) # decoded once
+        self.assertEqual(set(s._potion_logs), set(s._potion_mapping))
+        with self.assertRaises(ValueError):
+            s._handle_potions("thrown")
+
     def test_current_hp(self):
         self.assertEqual([x.current_hp for x in s.path], s.current_hp_counts[1:])
         self.assertEqual([x.current_hp for x in wa.path][:-1], wa.current_hp_counts[1:])
@@ -0,0 +1,884 @@
+from unittest import TestCase, IsolatedAsyncioTestCase, skipIf
+from unittest.mock import patch
+from datetime import datetime, UTC
+
+import tempfile
+import random
+import asyncio
+import pathlib
+import shutil
+import json
+import os
+
+from aiohttp.web import HTTPForbidden, HTTPNotImplemented
+from multidict import MultiDict
+from yarl import URL
+
+from src import server # this needs to be imported before the runs, to avoid circular imports
+from src import runs
+from src import analytics
+from src.config import config
+from src.cache.cache_helpers import MasteryStats, PickRates, RunStats, StreakCache, char_name
+from src.cache import mastered
+from src.cache import cache_helpers
+from src.cache.run_stats import _load_run_stats
+from src.cache import run_stats
+from src.cache import streaks
+from src.cache.pick_rates import get_pick_rates
+
+base = pathlib.Path.cwd() / "test" / "static"
+
+with (base / "run_matched.json").open() as f:
+    _template = json.load(f)
+
+_chars = ("IRONCLAD", "THE_SILENT", "DEFECT", "WATCHER")
+
+class RunCacheTestCase(TestCase):
+    """Run the run cache in a temporary data folder."""
+
+    def setUp(self):
+        runs._reset_cache()
+        self._orig = os.getcwd()
+        self._tmp = tempfile.mkdtemp()
+        os.chdir(self._tmp)
+        os.makedirs(os.path.join("data", "runs", "0"))
+
+    def tearDown(self):
+        os.chdir(self._orig)
+        shutil.rmtree(self._tmp)
+        runs._reset_cache()
+
+    def write_run(self, timestamp: int, character: str, victory: bool, profile: int = 0) -> str:
+        data = dict(_template)
+        data["timestamp"] = timestamp
+        data["character_chosen"] = character
+        data["victory"] = victory
+        name = f"{timestamp}.run"
+        with open(os.path.join("data", "runs", str(profile), name), "w") as f:
+            json.dump(data, f)
+        return name
+
+    def assert_linked(self, profile: int = 0):
+        lst = runs._profile_runs[profile]
+        self.assertEqual([x.epoch for x in lst], sorted(x.epoch for x in lst))
+        for i, run in enumerate(lst):
+            before = lst[:i]
+            before.reverse()
+            self.assertIs(run.matched.prev, lst[i-1] if i else None)
+            self.assertIs(run.matched.next, lst[i+1] if i + 1 < len(lst) else None)
+            self.assertIs(run.matched.prev_char, next((x for x in before if x.character == run.character), None))
+            self.assertIs(run.matched.next_char, next((x for x in lst[i+1:] if x.character == run.character), None))
+            if run.won:
+                self.assertIs(run.matched.prev_win, next((x for x in before if x.won), None))
+                self.assertIs(run.matched.next_win, next((x for x in lst[i+1:] if x.won), None))
+            else:
+                self.assertIs(run.matched.prev_loss, next((x for x in before if not x.won), None))
+                self.assertIs(run.matched.next_loss, next((x for x in lst[i+1:] if not x.won), None))
+
+class TestIncrementalCache(RunCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(12):
+            self.write_run(1_700_000_000 + i * 1000, _chars[i % 4], i % 3 != 0)
+
+    def test_initial_load(self):
+        added = runs._update_cache()
+        self.assertEqual(len(added), 12)
+        self.assert_linked()
+
+    def test_nothing_new(self):
+        runs._update_cache()
+        self.assertEqual(runs._update_cache(), [])
+
+    def test_only_new_runs(self):
+        runs._update_cache()
+        first = dict(runs._cache)
+        name = self.write_run(1_700_100_000, "DEFECT", True)
+        # force the folder to look changed, in case the filesystem mtime is too coarse
+        runs._folders[os.path.join("data", "runs", "0")].mtime = None
+        added = runs._update_cache()
+        self.assertEqual([x.filename for x in added], [name])
+        for filename, parser in first.items():
+            self.assertIs(runs._cache[filename], parser)
+        self.assert_linked()
+
+    def test_applied_at_once(self):
+        runs._update_cache()
+        last = runs.get_latest_run(None, None)
+        links = last.matched
+        name = self.write_run(1_700_100_000, "DEFECT", True)
+        runs._folders[os.path.join("data", "runs", "0")].mtime = None
+        update = runs._prepare_update()
+        # nothing the handlers can see changed yet
+        self.assertIs(last.matched, links)
+        self.assertIsNone(links.next)
+        self.assertIs(runs.get_latest_run(None, None), last)
+        runs._apply(update)
+        self.assertIsNone(links.next) # the old links are replaced, not changed
+        self.assertEqual(last.matched.next.filename, name)
+        self.assertEqual(runs.get_latest_run(None, None).filename, name)
+        self.assert_linked()
+
+    def test_out_of_order(self):
+        runs._update_cache()
+        self.write_run(1_700_000_500, "WATCHER", False)
+        self.write_run(1_699_000_000, "IRONCLAD", True)
+        runs._folders[os.path.join("data", "runs", "0")].mtime = None
+        self.assertEqual(len(runs._update_cache()), 2)
+        self.assert_linked()
+
+class TestParallelIngest(RunCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(20):
+            self.write_run(1_700_000_000 + i * 1000, _chars[i % 4], i % 3 != 0)
+        self._workers = config.server.runs.ingest_workers
+        self._min_files = runs._MIN_PARALLEL_FILES
+        runs._MIN_PARALLEL_FILES = 2
+
+    def tearDown(self):
+        config.server.runs.ingest_workers = self._workers
+        runs._MIN_PARALLEL_FILES = self._min_files
+        super().tearDown()
+
+    def ingest(self, workers: int) -> list[tuple]:
+        runs._reset_cache()
+        config.server.runs.ingest_workers = workers
+        self.assertEqual(len(runs._update_cache()), 20)
+        self.assert_linked()
+        return [(x.filename, x.rotating_streak, x.character_streak) for x in runs._profile_runs[0]]
+
+    def test_same_result(self):
+        self.assertEqual(self.ingest(2), self.ingest(0))
+
+    def test_header_only(self):
+        self.ingest(2)
+        run = runs._profile_runs[0][0]
+        self.assertTrue(run._payload is None)
+        self.assertEqual(run.score, run._data["score"])
+
+class TestSnapshot(RunCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(8):
+            self.write_run(1_700_000_000 + i * 1000, _chars[i % 4], i % 3 != 0)
+        runs._update_cache()
+        self.links = self.get_links()
+        runs._reset_cache()
+
+    def get_links(self):
+        res = {}
+        for run in runs._profile_runs[0]:
+            res[run.filename] = {k: (v.filename if v else None) for k, v in vars(run.matched).items()}
+        return res
+
+    def test_restore(self):
+        runs._load_snapshot()
+        self.assertEqual(len(runs._update_cache()), 8)
+        self.assertEqual(self.get_links(), self.links)
+        for run in runs._profile_runs[0]:
+            self.assertIsNone(run._payload) # nothing was parsed
+        run = runs._profile_runs[0][0]
+        self.assertEqual(run.character, "Ironclad")
+        self.assertEqual(run._data["timestamp"], run.epoch) # loaded on demand
+        self.assertIsNotNone(run._payload)
+
+    def test_new_run(self):
+        name = self.write_run(1_700_000_500, "WATCHER", True)
+        runs._load_snapshot()
+        runs._update_cache()
+        for run in runs._profile_runs[0]:
+            self.assertEqual(run._payload is None, run.filename != name)
+        self.assert_linked()
+
+    def test_append(self):
+        runs._load_snapshot()
+        runs._update_cache()
+        with open(runs._SNAPSHOT_FILE) as f:
+            before = f.readlines()
+        self.write_run(1_700_100_000, "DEFECT", True)
+        runs._folders[os.path.join("data", "runs", "0")].mtime = None
+        runs._update_cache()
+        with open(runs._SNAPSHOT_FILE) as f:
+            after = f.readlines()
+        self.assertEqual(after[:len(before)], before)
+        # the new run, and the runs whose next run, character run and win changed
+        self.assertEqual(len(after), len(before) + 3)
+        links = self.get_links()
+        runs._reset_cache()
+        runs._load_snapshot()
+        runs._update_cache()
+        self.assertEqual(self.get_links(), links)
+        for run in runs._profile_runs[0]:
+            self.assertIsNone(run._payload) # nothing was parsed
+
+    def test_modified_run(self):
+        name = self.write_run(1_700_002_000, "DEFECT", False) # overwrites an Ironclad win
+        runs._load_snapshot()
+        runs._update_cache()
+        self.assertIsNotNone(runs._cache[name]._payload)
+        self.assertEqual(runs._cache[name].character, "Defect")
+        self.assert_linked()
+
+class TestRunIndex(RunCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(7):
+            self.write_run(1_700_000_000 + i * 1000, _chars[i % 4], True)
+        runs._update_cache()
+        self.index = runs._profile_runs[0]
+
+    def test_newest(self):
+        newest = [x.epoch for x in self.index.newest(0, 3)]
+        self.assertEqual(newest, [1_700_006_000, 1_700_005_000, 1_700_004_000])
+        self.assertEqual(len(self.index.newest(6, 9)), 1)
+        self.assertEqual(self.index.newest(10, 20), [])
+
+    def test_between(self):
+        runs = [x.epoch for x in self.index.between(1_700_001_000, 1_700_003_000)]
+        self.assertEqual(runs, [1_700_003_000, 1_700_002_000, 1_700_001_000])
+        self.assertEqual(self.index.between(0, 1_000), [])
+
+class TestRunColumns(RunCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        # spread over two years, and written out of order
+        for i in (5, 0, 9, 3, 7, 1, 8, 2, 6, 4, 10, 11):
+            self.write_run(1_703_980_000 + i * 86400, _chars[i % 4], i % 3 != 0)
+        runs._update_cache()
+        self.index = runs._profile_runs[0]
+
+    def test_aligned(self):
+        columns = self.index.columns
+        for i, run in enumerate(self.index.runs):
+            self.assertEqual(char_name(columns.character[i]), run.character)
+            self.assertEqual(bool(columns.won[i]), run.won)
+            self.assertEqual(columns.floor[i], run.floor_reached)
+            self.assertEqual(columns.score[i], run.score)
+
+    def test_counts(self):
+        lst = self.index.runs
+        for won in (True, False):
+            counts = self.index.columns.count_by_character(2, 10, won=won)
+            expected = {}
+            for run in lst[2:10]:
+                if run.won == won:
+                    expected[run.character] = expected.get(run.character, 0) + 1
+            self.assertEqual({char_name(code): count for code, count in counts.items()}, expected)
+        self.assertEqual(self.index.columns.count(0, len(lst), won=1), sum(x.won for x in lst))
+
+    def test_totals_after_insert(self):
+        self.index.columns.count_by_character(0, len(self.index), won=True) # build the totals
+        name = self.write_run(1_703_900_000, "WATCHER", True)
+        with open(os.path.join("data", "runs", "0", name)) as f:
+            runs._ingest(runs.RunParser(name, 0, json.load(f)))
+        counts = self.index.columns.count_by_character(0, 5, won=True)
+        expected = {}
+        for run in self.index.runs[:5]:
+            if run.won:
+                expected[run.character] = expected.get(run.character, 0) + 1
+        self.assertEqual({char_name(code): count for code, count in counts.items()}, expected)
+
+    def test_range_cache(self):
+        run_stats._range_stats.clear()
+        start, end = datetime(2024, 1, 1, tzinfo=UTC), datetime(2024, 12, 31, tzinfo=UTC)
+        with patch.object(run_stats, "_get_stats_index", return_value=self.index):
+            stats = run_stats.get_run_stats_by_date(start, end)
+            self.assertIs(run_stats.get_run_stats_by_date(start, end), stats)
+        with patch.object(run_stats, "_get_stats_index", return_value=self.index.copy()):
+            self.assertIsNot(run_stats.get_run_stats_by_date(start, end), stats)
+        self.assertEqual(stats.all_wins.all_character_count, sum(x.won for x in self.index.runs if x.timestamp.year == 2024))
+
+    def test_run_stats(self):
+        stats = RunStats()
+        _load_run_stats(stats, self.index, None, None)
+        expected = RunStats()
+        for run in self.index.runs:
+            expected.check_pb(run)
+            if run.won:
+                expected.add_win(run.character, run.timestamp)
+            else:
+                expected.add_loss(run.character, run.timestamp)
+        for attr in ("all_wins", "all_losses", "pb"):
+            self.assertEqual(str(getattr(stats, attr)), str(getattr(expected, attr)), attr)
+        self.assertEqual(stats.year_wins.keys(), expected.year_wins.keys())
+        for year, stat in expected.year_wins.items():
+            self.assertEqual(str(stats.year_wins[year]), str(stat))
+        for year, stat in expected.year_losses.items():
+            self.assertEqual(str(stats.year_losses[year]), str(stat))
+
+def _describe_stats(stats: RunStats) -> tuple:
+    return (
+        str(stats.all_wins), str(stats.all_losses), str(stats.pb), str(stats.streaks),
+        {year: str(x) for year, x in stats.year_wins.items() if x.all_character_count},
+        {year: str(x) for year, x in stats.year_losses.items() if x.all_character_count},
+    )
+
+class TestProfileStats(RunCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join("data", "runs", "1"))
+        for i in range(12):
+            self.write_run(1_700_000_000 + i * 1000, _chars[i % 4], i % 3 != 0)
+        for i in range(3):
+            self.write_run(1_700_000_500 + i * 1000, "WATCHER", True, profile=1)
+        runs._update_cache()
+
+    def reload(self, profile: int) -> tuple:
+        stats = RunStats()
+        _load_run_stats(stats, runs._get_run_index(profile), None, None)
+        return _describe_stats(stats)
+
+    def test_profiles(self):
+        first, second = run_stats.get_all_run_stats(0), run_stats.get_all_run_stats(1)
+        self.assertEqual(first.all_wins.all_character_count, 8)
+        self.assertEqual(second.all_wins.all_character_count, 3)
+        self.assertEqual(second.streaks.character_counts["Watcher"], 3)
+        self.assertEqual(second.all_losses.all_character_count, 0)
+        self.assertEqual(run_stats.get_all_run_stats(12).all_wins.all_character_count, 0) # no runs there
+        self.assertEqual(run_stats.get_run_stats_by_date(profile=1).all_wins.all_character_count, 3)
+        self.assertIs(streaks.get_streak_collections(1).containers[0].runs[0], runs._get_run_index(1)[0])
+        self.assertEqual(mastered.get_mastered(profile=1).mastered_relics, {}) # counted later, by the maintenance task
+        mastered.publish_mastery_stats(mastered.count_mastery_stats())
+        self.assertEqual(mastered.get_mastered(profile=1).mastered_relics["Vajra"].name, "1700000500")
+        self.assertEqual(mastered.get_mastered(1).mastered_relics["Vajra"].name, "1700001000")
+
+    def test_incremental(self):
+        stats = run_stats.get_all_run_stats(0)
+        seen = _describe_stats(stats)
+        for i in range(12, 16):
+            self.write_run(1_700_000_000 + i * 1000, _chars[i % 4], True)
+            runs._folders[os.path.join("data", "runs", "0")].mtime = None
+            with patch.object(run_stats, "_load_run_stats") as load:
+                runs._update_cache()
+            load.assert_not_called() # not counted again
+            self.assertEqual(_describe_stats(run_stats.get_all_run_stats(0)), self.reload(0))
+        self.assertEqual(_describe_stats(stats), seen) # the published stats are never changed
+        self.assertEqual(run_stats.get_all_run_stats(0).streaks.all_character_count, 6)
+        expected = StreakCache(datetime(2023, 1, 1, tzinfo=UTC))
+        expected.rebuild(runs._get_run_index(0).runs)
+        describe = lambda cache: [(x.winning_streak, [run.name for run in x.runs]) for x in cache.containers]
+        self.assertEqual(describe(streaks.get_streak_collections(0)), describe(expected))
+
+    def test_out_of_order(self):
+        stats = run_stats.get_all_run_stats(0)
+        self.write_run(1_700_002_700, "IRONCLAD", False)
+        runs._folders[os.path.join("data", "runs", "0")].mtime = None
+        runs._update_cache()
+        self.assertIsNot(run_stats.get_all_run_stats(0), stats)
+        self.assertEqual(_describe_stats(run_stats.get_all_run_stats(0)), self.reload(0))
+        self.assertEqual(run_stats.get_all_run_stats(1).all_wins.all_character_count, 3) # untouched
+
+    def test_selector(self):
+        self.assertEqual(server._split_profile(("p11", "2024")), (11, ("2024",)))
+        self.assertEqual(server._split_profile(("Pommel", "Strike")), (None, ("Pommel", "Strike")))
+        with self.assertRaises(ValueError):
+            server._split_profile(("p5",))
+
+class TestMastery(RunCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.stats = MasteryStats()
+        self.newer = self.write_run(1_700_010_000, "IRONCLAD", True)
+        self.write_run(1_700_005_000, "IRONCLAD", False)
+        runs._update_cache()
+        mastered._update_from_index(self.stats, runs._get_run_index(0), 1)
+        mastered._flush(self.stats)
+
+    def test_first_run(self):
+        self.assertEqual(self.stats.seen, {"1700010000"})
+        self.assertEqual(self.stats.mastered_relics["Vajra"].name, "1700010000")
+        self.assertEqual(self.stats.mastered_cards["Defend_R"].name, "1700010000")
+        self.assertNotIn("Bash", self.stats.mastered_cards) # only one copy
+
+    def test_older_run(self):
+        generation = self.stats.generation
+        self.write_run(1_700_000_000, "IRONCLAD", True)
+        runs._folders[os.path.join("data", "runs", "0")].mtime = None
+        runs._update_cache()
+        mastered._update_from_index(self.stats, runs._get_run_index(0), 1)
+        mastered._flush(self.stats)
+        self.assertEqual(self.stats.seen, {"1700010000", "1700000000"})
+        self.assertEqual(self.stats.mastered_relics["Vajra"].name, "1700000000")
+        self.assertEqual(self.stats.generation, generation) # nothing new was mastered
+
+    def test_out_of_order_once(self):
+        mastered.publish_mastery_stats(mastered.count_mastery_stats())
+        self.write_run(1_700_000_000, "IRONCLAD", True)
+        runs._folders[os.path.join("data", "runs", "0")].mtime = None
+        runs._update_cache()
+        with patch.object(mastered, "_update_mastery_stats_from_run", wraps=mastered._update_mastery_stats_from_run) as count:
+            mastered.publish_mastery_stats(mastered.count_mastery_stats())
+        self.assertEqual([x.args[1].name for x in count.call_args_list], ["1700000000"]) # only the new run is parsed
+        self.assertEqual(mastered.get_mastered(profile=0).seen, {"1700010000", "1700000000"})
+        self.assertEqual(mastered.get_mastered(profile=0).mastered_relics["Vajra"].name, "1700000000")
+
+class TestFindRuns(RunCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(12):
+            self.write_run(1_700_000_000 + i * 1000, _chars[i % 4], i % 3 != 0)
+        runs._update_cache()
+
+    def test_terms(self):
+        self.assertEqual(len(runs.find_runs(relic="Vajra")), 12)
+        self.assertEqual(len(runs.find_runs(relic="Not A Relic")), 0)
+        picked = runs.find_runs(card="Feel No Pain", character="Ironclad")
+        self.assertEqual([x.epoch for x in picked], [1_700_008_000, 1_700_004_000, 1_700_000_000])
+        self.assertEqual(picked.wins, 2)
+        self.assertEqual(len(runs.find_runs(card="Sword Boomerang")), 0) # not picked
+        run = runs.get_latest_run(None, None)
+        self.assertEqual(list(runs.find_runs(seed=run.seed.lower())), list(runs.find_runs()))
+        self.assertEqual(len(runs.find_runs(neow=_template["neow_bonus"], won=False)), 4)
+
+    def test_combine(self):
+        wins = runs.find_runs(won=True)
+        silent = runs.find_runs(character="Silent")
+        self.assertEqual(len(wins & silent), 2)
+        self.assertEqual(len(wins | silent), 9)
+        self.assertEqual((wins & silent).newest().epoch, 1_700_005_000)
+
+    def test_restore(self):
+        runs._reset_cache()
+        runs._load_snapshot()
+        runs._update_cache()
+        self.assertIsNone(runs.get_latest_run(None, None)._payload) # nothing was parsed
+        self.assertEqual(len(runs.find_runs(card="Feel No Pain", won=True)), 8)
+
+class TestPickRates(RunCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(12):
+            self.write_run(1_700_000_000 + i * 1000, _chars[i % 4], i % 3 != 0)
+        runs._update_cache()
+
+    def test_counts(self):
+        rates = get_pick_rates(0)
+        self.assertEqual((rates.runs, rates.wins), (12, 8))
+        self.assertEqual(rates.cards.get("Feel No Pain"), {"offered": 12, "picked": 12, "won": 8})
+        self.assertEqual(rates.cards.get("Sword Boomerang"), {"offered": 12, "picked": 0, "won": 0})
+        self.assertEqual(rates.cards.get("Twin Strike")["offered"], 24) # upgrades count as the same card
+        self.assertNotIn("Singing Bowl", rates.cards)
+        self.assertEqual(rates.relics.get("Vajra"), {"obtained": 12, "won": 8})
+        self.assertEqual(rates.relics.get("Not A Relic"), {"obtained": 0, "won": 0})
+        self.assertEqual(get_pick_rates(11).runs, 0) # no runs there
+
+    def test_incremental(self):
+        rates = get_pick_rates(0)
+        self.write_run(1_700_012_000, "IRONCLAD", True)
+        runs._folders[os.path.join("data", "runs", "0")].mtime = None
+        with patch.object(PickRates, "rebuild") as rebuild:
+            runs._update_cache()
+        rebuild.assert_not_called() # not counted again
+        self.assertEqual(get_pick_rates(0).cards.get("Feel No Pain"), {"offered": 13, "picked": 13, "won": 9})
+        self.assertEqual(get_pick_rates(0).relics.get("Vajra"), {"obtained": 13, "won": 9})
+        self.assertEqual(rates.relics.get("Vajra"), {"obtained": 12, "won": 8}) # the published counts are never changed
+
+    def test_restore(self):
+        counts = get_pick_rates(0).cards.get("Combust")
+        runs._reset_cache()
+        runs._load_snapshot()
+        runs._update_cache()
+        self.assertIsNone(runs.get_latest_run(None, None)._payload) # nothing was parsed
+        self.assertEqual(get_pick_rates(0).cards.get("Combust"), counts)
+
+class TestCompareRuns(RunCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(12):
+            self.write_run(1_700_000_000 + i * 1000, _chars[i % 4], i % 3 != 0)
+        runs._update_cache()
+
+    def compare(self, **params):
+        query = MultiDict()
+        for key, value in params.items():
+            for x in (value if isinstance(value, list) else [value]):
+                query.add(key, str(x))
+        url = URL("/compare/view").with_query(query)
+        return runs._compare_runs(url.query, url)
+
+    def test_filters(self):
+        res = self.compare(character=["ironclad", "Silent"], loss="false")
+        self.assertEqual(res["count"], 4)
+        self.assertEqual(res["winrate"], 1.0)
+        self.assertEqual([x.epoch for x in res["runs"]], [1_700_008_000, 1_700_005_000, 1_700_004_000, 1_700_001_000])
+        self.assertEqual(res["average_floor"], _template["floor_reached"])
+        res = self.compare(start=1_700_003_000, end=1_700_006_000, relic="Vajra", card="Feel No Pain")
+        self.assertEqual(res["count"], 4)
+        self.assertEqual(res["wins"], 2)
+        self.assertEqual(self.compare(relic="Not A Relic")["count"], 0)
+        self.assertEqual(self.compare(score=_template["score"] + 1)["count"], 0)
+
+    def test_pages(self):
+        res = self.compare(limit=5)
+        seen = [x.epoch for x in res["runs"]]
+        self.assertIsNone(res["first"])
+        while res["next"] is not None:
+            url = URL(res["next"])
+            res = runs._compare_runs(url.query, url)
+            self.assertEqual(res["count"], 12)
+            self.assertIsNotNone(res["first"])
+            seen.extend(x.epoch for x in res["runs"])
+        self.assertEqual(seen, sorted((x.epoch for x in runs._profile_runs[0]), reverse=True))
+
+    def test_same_time(self):
+        for name in ("1700005000_b.run", "1700005000_c.run"): # finished along with another run
+            shutil.copy(os.path.join("data", "runs", "0", "1700005000.run"), os.path.join("data", "runs", "0", name))
+        runs._folders[os.path.join("data", "runs", "0")].mtime = None
+        runs._update_cache()
+        res = self.compare(limit=7) # the page ends between them
+        seen = [x.name for x in res["runs"]]
+        while res["next"] is not None:
+            url = URL(res["next"])
+            res = runs._compare_runs(url.query, url)
+            seen.extend(x.name for x in res["runs"])
+        self.assertEqual(len(seen), 14)
+        self.assertEqual(set(seen), set(runs._view.names))
+
+    def test_bad_params(self):
+        with self.assertRaises(HTTPForbidden):
+            self.compare(score="high")
+
+class TestAnalytics(RunCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(12):
+            self.write_run(1_700_000_000 + i * 1000, _chars[i % 4], i % 3 != 0)
+        runs._update_cache()
+        analytics._tables.clear()
+        self.run = runs.get_latest_run(None, None)
+
+    def tearDown(self):
+        analytics._tables.clear()
+        super().tearDown()
+
+    def test_floor_values(self):
+        values = analytics._floor_values(self.run)
+        self.assertEqual(list(values["current_hp"]), self.run.current_hp_counts)
+        self.assertEqual(list(values["gold"]), self.run.gold_counts)
+        for node in self.run.path[:-1]:
+            self.assertEqual(values["floor_time"][node.floor], node.floor_time)
+        for node in self.run.path:
+            self.assertEqual(values["card_count"][node.floor], node.card_count)
+        self.assertEqual(len(values["floor_time"]), self.run.path[-1].floor) # the run ended there
+        self.assertEqual(values["act"][1], 1)
+        self.assertEqual(values["act"][self.run.path[-1].floor], 4)
+
+    @skipIf(analytics.np is None, "numpy is not installed")
+    def test_floor_summary(self):
+        asyncio.run(analytics._load_table(0))
+        summary = analytics.floor_summary(0, "current_hp", percentiles=(50,))
+        self.assertEqual(summary["groups"]["all"]["runs"], [12] * len(self.run.current_hp_counts))
+        self.assertEqual(summary["groups"]["wins"]["runs"][0], 8)
+        # apart from Neow, which depends on the character, every run is the same
+        self.assertEqual(summary["groups"]["all"]["mean"][1:], self.run.current_hp_counts[1:])
+        everything = analytics.floor_summary(0, "current_hp", characters=[self.run.character])["groups"]["all"]
+        self.assertEqual(everything["mean"], self.run.current_hp_counts)
+        self.assertEqual(everything["percentiles"]["50"], self.run.current_hp_counts)
+        self.assertEqual(analytics.floor_summary(0, "gold", characters=["Watcher"], split=False)["groups"]["all"]["runs"][0], 3)
+        names = list(cache_helpers._char_names)
+        self.assertEqual(analytics.floor_summary(0, "gold", characters=["Nobody"], split=False)["groups"]["all"]["runs"], [])
+        self.assertEqual(cache_helpers._char_names, names) # not made up as a modded character
+        self.assertEqual(analytics.floor_summary(12, "gold")["groups"]["all"]["floors"], []) # no runs there
+
+    @skipIf(analytics.np is None, "numpy is not installed")
+    def test_act_time(self):
+        asyncio.run(analytics._load_table(0))
+        expected = {}
+        act = 1
+        for node in self.run.path[:-1]:
+            expected[act] = expected.get(act, 0) + node.floor_time
+            if node.end_of_act:
+                act += 1
+        everything = analytics.act_time_summary(0)["groups"]["all"]
+        self.assertEqual(everything["acts"], list(expected))
+        self.assertEqual(everything["mean"], list(expected.values()))
+
+    @skipIf(analytics.np is None, "numpy is not installed")
+    def test_new_runs(self):
+        asyncio.run(analytics._load_table(0))
+        table = analytics._get_table(0)
+        gold = table.array("gold").copy()
+        self.write_run(1_700_100_000, "DEFECT", True)
+        runs._folders[os.path.join("data", "runs", "0")].mtime = None
+        runs._update_cache()
+        with patch.object(analytics, "_floor_values", wraps=analytics._floor_values) as read:
+            asyncio.run(analytics._load_table(0))
+        self.assertEqual(read.call_count, 1) # only the new run was read
+        new = analytics._get_table(0)
+        self.assertIsNot(new, table)
+        self.assertEqual(len(new.array("gold")), 13)
+        analytics.np.testing.assert_array_equal(new.array("gold"), analytics._pack([new.rows[x.name]["gold"] for x in new.index.runs]))
+        analytics.np.testing.assert_array_equal(table.array("gold"), gold) # the old table didn't change
+
+    def test_no_numpy(self):
+        with patch.object(analytics, "np", None):
+            with self.assertRaises(HTTPNotImplemented):
+                analytics.floor_summary(0, "gold")
+
+class TestLatestRun(RunCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(12):
+            self.write_run(1_700_000_000 + i * 1000, _chars[i % 4], i % 3 != 0)
+        runs._update_cache()
+
+    def test_latest(self):
+        self.assertEqual(runs.get_latest_run(None, None).epoch, 1_700_011_000)
+        self.assertEqual(runs.get_latest_run(None, False).epoch, 1_700_009_000)
+        self.assertEqual(runs.get_latest_run("Ironclad", None).epoch, 1_700_008_000)
+        self.assertEqual(runs.get_latest_run("Ironclad", False).epoch, 1_700_000_000)
+        self.assertEqual(runs.get_latest_run("Defect", True).epoch, 1_700_010_000)
+        self.assertIsNone(runs.get_latest_run("Necrobinder", None))
+
+    def test_older_run(self):
+        self.write_run(1_600_000_000, "WATCHER", True)
+        runs._folders[os.path.join("data", "runs", "0")].mtime = None
+        runs._update_cache()
+        self.assertEqual(runs.get_latest_run("Watcher", True).epoch, 1_700_011_000)
+
+def _naive_streak(lst: list, i: int, character_specific: bool) -> tuple[int, int, bool]:
+    """Walk out from the run, the way streaks used to be computed."""
+    run = lst[i]
+    if not run.won:
+        return (0, 0, False)
+    chain = [x for x in lst if not character_specific or x.character == run.character]
+    i = chain.index(run)
+    streak = position = 1
+    last = run.character
+    for x in reversed(chain[:i]):
+        if not x.won:
+            break
+        if character_specific or x.character != last:
+            streak += 1
+            position += 1
+        last = x.character
+    ongoing = True
+    last = run.character
+    for x in chain[i+1:]:
+        if not x.won:
+            ongoing = False
+            break
+        if character_specific or x.character != last:
+            streak += 1
+        last = x.character
+    return (streak, position, ongoing)
+
+class TestStreaks(RunCacheTestCase):
+    # wins and losses, with the same character sometimes winning twice in a row
+    pattern = [
+        ("IRONCLAD", True), ("THE_SILENT", True), ("THE_SILENT", True), ("DEFECT", True),
+        ("WATCHER", False), ("IRONCLAD", True), ("THE_SILENT", False), ("DEFECT", True),
+        ("WATCHER", True), ("IRONCLAD", True), ("IRONCLAD", True), ("THE_SILENT", True),
+        ("DEFECT", False), ("WATCHER", True), ("IRONCLAD", True), ("THE_SILENT", True),
+    ]
+
+    def setUp(self):
+        super().setUp()
+        for i, (char, won) in enumerate(self.pattern):
+            self.write_run(1_700_000_000 + i * 1000, char, won)
+
+    def assert_streaks(self):
+        lst = runs._profile_runs[0].runs
+        for i, run in enumerate(lst):
+            self.assertEqual(tuple(run.rotating_streak), _naive_streak(lst, i, False), run)
+            self.assertEqual(tuple(run.character_streak), _naive_streak(lst, i, True), run)
+
+    def test_full(self):
+        runs._update_cache()
+        self.assert_streaks()
+        self.assertEqual(runs._profile_runs[0][-1].rotating_streak, runs.StreakInfo(3, 3, True))
+
+    def test_incremental(self):
+        runs._update_cache()
+        for timestamp, char, won in ((1_700_016_000, "DEFECT", True), (1_700_002_500, "WATCHER", False), (1_700_008_500, "DEFECT", True)):
+            self.write_run(timestamp, char, won)
+            runs._folders[os.path.join("data", "runs", "0")].mtime = None
+            with patch.object(runs, "_compute_streaks") as compute:
+                runs._update_cache()
+            compute.assert_not_called() # only the streaks around the new run were updated
+            self.assert_streaks()
+
+def _naive_streak_containers(lst: list) -> list[tuple[bool, list[str]]]:
+    """Group the runs the way the streak page used to, newest container first."""
+    groups = []
+    seen = []
+    for run in lst:
+        if run.name in seen:
+            continue
+        group = []
+        cur = run
+        while cur and cur.won == run.won:
+            seen.append(cur.name)
+            group.append(cur.name)
+            cur = cur.matched.next_char
+        groups.append((run.won, group))
+    containers = [(False, [])]
+    for won, group in groups:
+        if len(group) < 3 or not won:
+            if containers[0][0]:
+                containers.insert(0, (False, list(group)))
+            else:
+                containers[0][1].extend(group)
+        else:
+            containers.insert(0, (True, list(group)))
+    return containers
+
+class TestStreakCollections(RunCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = random.Random(1)
+        for i in range(80):
+            self.write_run(1_700_000_000 + i * 1000, rng.choice(_chars[:3]), rng.random() < 0.75)
+        runs._update_cache()
+        self.lst = runs._get_run_index(0).runs
+
+    def assert_containers(self, cache: StreakCache):
+        got = [(x.winning_streak, [run.name for run in x.runs]) for x in cache.containers]
+        self.assertEqual(got, _naive_streak_containers(self.lst))
+        self.assertEqual([x.ongoing for x in cache.containers], [True] + [False] * (len(got) - 1))
+        for container in cache.containers:
+            self.assertEqual(container.streak, len([x for x in container.runs if x.won]))
+
+    def test_rebuild(self):
+        cache = StreakCache(datetime(2023, 1, 1, tzinfo=UTC))
+        cache.rebuild(self.lst)
+        self.assert_containers(cache)
+        self.assertTrue(any(x.winning_streak for x in cache.containers))
+
+    def test_incremental(self):
+        cache = StreakCache(datetime(2023, 1, 1, tzinfo=UTC))
+        cache.clear()
+        for run in self.lst:
+            cache.add_run(run)
+        self.assert_containers(cache)
+
+    def test_copy(self):
+        cache = StreakCache(datetime(2023, 1, 1, tzinfo=UTC))
+        cache.rebuild(self.lst[:50])
+        describe = lambda cache: [(x.winning_streak, x.ongoing, [run.name for run in x.display_runs]) for x in cache.containers]
+        before = describe(cache)
+        copied = cache.copy()
+        for run in self.lst[50:]:
+            copied.add_run(run)
+        self.assert_containers(copied)
+        self.assertEqual(describe(cache), before)
+
+    def test_broken_streak(self):
+        cache = StreakCache(datetime(2023, 1, 1, tzinfo=UTC))
+        cache.rebuild(self.lst)
+        for container in cache.containers[1:]:
+            if container.winning_streak:
+                breaker = container.display_runs[-1]
+                self.assertIs(breaker, container.runs[-1].matched.next_char)
+                self.assertEqual(container.length, len(container.runs) + 1)
+
+class TestMemoryBudget(RunCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(4):
+            self.write_run(1_700_000_000 + i * 1000, _chars[i], True)
+        self._budget = config.server.runs.memory_budget
+        size = os.path.getsize(os.path.join("data", "runs", "0", "1700000000.run"))
+        config.server.runs.memory_budget = 1 # this is in megabytes; make it fit two runs
+        self._mb = 1024 * 1024
+        runs._loaded.clear()
+        self.per_mb = self._mb // size
+        runs._update_cache()
+
+    def tearDown(self):
+        config.server.runs.memory_budget = self._budget
+        super().tearDown()
+
+    def test_unloaded(self):
+        self.assertLessEqual(runs._loaded.total, self._mb)
+        self.assertEqual(len(runs._loaded), min(4, self.per_mb))
+
+    def test_reload(self):
+        config.server.runs.memory_budget = 0
+        first, second = runs._profile_runs[0][:2]
+        for run in runs._profile_runs[0]:
+            run._unload()
+        runs._loaded.clear()
+        first.path # load both runs
+        length = len(second.path)
+        self.assertTrue(first._payload is None)
+        self.assertEqual(first._cache, {"self": first})
+        self.assertEqual(len(runs._loaded), 1)
+        self.assertEqual(len(first.path), length) # read again when needed
+        self.assertTrue(second._payload is None)
+        self.assertEqual(first.character, "Ironclad")
+
+    def test_thread(self):
+        config.server.runs.memory_budget = 0
+        first, second = runs._profile_runs[0][:2]
+        for run in runs._profile_runs[0]:
+            run._unload()
+        runs._loaded.clear()
+        length = len(first.path) # a handler is reading it
+        asyncio.run(asyncio.to_thread(lambda: second.path)) # the maintenance task loads another one
+        self.assertIsNotNone(first._payload) # not from under the handler
+        self.assertEqual(len(first.path), length)
+        runs._loaded.unload(runs._loaded.take_evicted())
+        self.assertIsNone(first._payload)
+        self.assertEqual(first._cache, {"self": first})
+        self.assertIsNotNone(second._payload)
+
+class TestGetParser(RunCacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.name = self.write_run(1_700_000_000, "IRONCLAD", True)
+        runs._update_cache()
+
+    def test_by_name(self):
+        self.assertIs(runs.get_parser("1700000000"), runs._cache[self.name])
+
+    def test_missing(self):
+        self.assertIsNone(runs.get_parser("1800000000"))
+        self.assertIn("1800000000", runs._missing)
+        self.write_run(1_800_000_000, "DEFECT", False)
+        runs._folders[os.path.join("data", "runs", "0")].mtime = None
+        runs._update_cache() # a new run arrived, the name is no longer unknown
+        self.assertNotIn("1800000000", runs._missing)
+        self.assertEqual(runs.get_parser("1800000000").character, "Defect")
+
+class TestMaintenance(RunCacheTestCase, IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        for i in range(4):
+            self.write_run(1_700_000_000 + i * 1000, _chars[i], True)
+        runs._update_cache()
+        self.task = asyncio.create_task(runs.Runs_startup())
+        await asyncio.sleep(0) # let it start
+
+    async def asyncTearDown(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+    async def test_wait_for_update(self):
+        view = runs._view
+        self.write_run(1_700_010_000, "DEFECT", False)
+        runs._stale.add(os.path.join("data", "runs", "0"))
+        await runs._wait_for_update()
+        self.assertEqual(runs.get_latest_run(None, None).epoch, 1_700_010_000)
+        self.assertEqual(len(view.profiles[0]), 4) # the old view didn't change
+        self.assertEqual(len(runs._view.profiles[0]), 5)
+
+    async def test_masteries(self):
+        for i in range(100):
+            if "Vajra" in mastered.get_mastered(profile=0).mastered_relics:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(mastered.get_mastered(profile=0).mastered_relics["Vajra"].name, "1700000000")
+
+    async def test_missing_run(self):
+        self.write_run(1_700_010_000, "DEFECT", False)
+        runs._stale.add(os.path.join("data", "runs", "0"))
+        self.assertIsNone(runs.get_parser("1700010000")) # this doesn't wait
+        for i in range(100):
+            if runs.get_parser("1700010000") is not None:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(runs.get_parser("1700010000").character, "Defect")